@@ -1,12 +1,17 @@
 from flask import Flask, render_template
 from flask_login import LoginManager
-from models import db, Student, CareerCounsellor, Administrator
+from models import db
 from config import Config
 from routes import register_blueprints
 from routes.auth import auth_bp
+from services.principal import load_principal, AnonymousPrincipal
+from services.outbox import ensure_worker
+from services.query_guard import init_query_guard
+from services.sql_metrics import init_sql_metrics
 
 app = Flask(__name__)
 app.config.from_object(Config)
+app.logger.setLevel(app.config['LOG_LEVEL'])
 db.init_app(app)
 
 # Register all blueprints
@@ -14,26 +19,26 @@ register_blueprints(app)
 
 app.register_blueprint(auth_bp)
 
+# Query count, database time and slowest statements per endpoint
+init_sql_metrics(app)
+
+# Query count limit per request, enforced in testing
+init_query_guard(app)
+
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'auth.login'
+login_manager.anonymous_user = AnonymousPrincipal
 
 @login_manager.user_loader
 def load_user(user_id):
-    if not user_id or '-' not in user_id:
-        return None
-    user_type, id = user_id.split('-', 1)
-    if not id.isdigit():
-        return None
-    id = int(id)
-    
-    if user_type == 'student':
-        return db.session.get(Student, id)
-    elif user_type == 'counsellor':
-        return db.session.get(CareerCounsellor, id)
-    elif user_type == 'admin':
-        return db.session.get(Administrator, id)
-    return None
+    return load_principal(user_id)
+
+@app.before_request
+def start_outbox_worker():
+    # Started on the first request so scripts importing the app do not run it
+    if app.config.get('OUTBOX_IN_PROCESS_WORKER'):
+        ensure_worker(app)
 
 @app.route('/')
 def index():
@@ -63,7 +63,8 @@ CREATE TABLE grievances (
     response TEXT,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-    FOREIGN KEY (student_id) REFERENCES student(id) ON DELETE CASCADE
+    FOREIGN KEY (student_id) REFERENCES student(id) ON DELETE CASCADE,
+    INDEX ix_grievances_student_created (student_id, created_at)
 );
 
 CREATE TABLE appointment_requests (
@@ -79,7 +80,9 @@ CREATE TABLE appointment_requests (
     created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
     updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (student_id) REFERENCES student(id) ON DELETE CASCADE,
-    FOREIGN KEY (counsellor_id) REFERENCES counsellors(id) ON DELETE CASCADE
+    FOREIGN KEY (counsellor_id) REFERENCES counsellors(id) ON DELETE CASCADE,
+    INDEX ix_appointment_requests_counsellor_status_created (counsellor_id, status, created_at),
+    INDEX ix_appointment_requests_student_created (student_id, created_at)
 );
 
 CREATE TABLE appointments (
@@ -89,13 +92,15 @@ CREATE TABLE appointments (
     appointment_date DATE NOT NULL,
     start_time TIME NOT NULL,
     end_time TIME NOT NULL,
-    appointment_type VARCHAR(100) NOT NULL,
+    appointment_type VARCHAR(100) NULL,
     status ENUM('scheduled', 'completed', 'cancelled', 'rescheduled') DEFAULT 'scheduled',
     mode ENUM('online', 'offline', 'phone') NOT NULL,
     meeting_link VARCHAR(255),
     location VARCHAR(255),
     FOREIGN KEY (student_id) REFERENCES student(id) ON DELETE CASCADE,
-    FOREIGN KEY (counsellor_id) REFERENCES counsellors(id) ON DELETE CASCADE
+    FOREIGN KEY (counsellor_id) REFERENCES counsellors(id) ON DELETE CASCADE,
+    INDEX ix_appointments_counsellor_status_date (counsellor_id, status, appointment_date),
+    INDEX ix_appointments_student_status_date (student_id, status, appointment_date)
 );
 
 CREATE TABLE feedback (
@@ -128,7 +133,47 @@ CREATE TABLE notifications (
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     read_status BOOLEAN DEFAULT FALSE,
     notification_type ENUM('general', 'appointment', 'resource', 'payment', 'grievance', 'appointment_request', 'feedback', 'event') NOT NULL,
-    related_entity_id INT
+    related_entity_id INT,
+    INDEX ix_notifications_user_read_created (user_id, read_status, created_at),
+    INDEX ix_notifications_user_created (user_id, created_at)
+);
+
+CREATE TABLE notification_counters (
+    user_id INT PRIMARY KEY,
+    unread_count INT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE notification_outbox (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    kind VARCHAR(50) NOT NULL,
+    payload TEXT NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    processed_at DATETIME,
+    attempts INT NOT NULL DEFAULT 0,
+    last_error TEXT,
+    INDEX ix_notification_outbox_pending (processed_at, id)
+);
+
+CREATE TABLE notification_outbox_recipients (
+    outbox_id INT NOT NULL,
+    user_id INT NOT NULL,
+    PRIMARY KEY (outbox_id, user_id),
+    FOREIGN KEY (outbox_id) REFERENCES notification_outbox(id) ON DELETE CASCADE
+);
+
+CREATE TABLE background_jobs (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    kind VARCHAR(50) NOT NULL,
+    status ENUM('queued', 'running', 'completed', 'failed') NOT NULL DEFAULT 'queued',
+    progress INT NOT NULL DEFAULT 0,
+    total INT,
+    result TEXT,
+    error TEXT,
+    created_by_id INT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (created_by_id) REFERENCES administrators(id) ON DELETE SET NULL,
+    INDEX ix_background_jobs_status (status, id)
 );
 
 CREATE TABLE messages (
@@ -174,6 +219,7 @@ CREATE TABLE events (
     location VARCHAR(255),
     meeting_link VARCHAR(255),
     capacity INT,
+    registered_count INT NOT NULL DEFAULT 0,
     is_online BOOLEAN DEFAULT TRUE,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (counsellor_id) REFERENCES counsellors(id)
@@ -187,7 +233,18 @@ CREATE TABLE event_registrations (
     reminder_sent BOOLEAN DEFAULT FALSE,
     attendance_status ENUM('registered', 'attended', 'missed') DEFAULT 'registered',
     FOREIGN KEY (event_id) REFERENCES events(event_id) ON DELETE CASCADE,
-    FOREIGN KEY (student_id) REFERENCES student(id) ON DELETE CASCADE
+    FOREIGN KEY (student_id) REFERENCES student(id) ON DELETE CASCADE,
+    UNIQUE KEY uq_event_registrations_event_student (event_id, student_id)
+);
+
+CREATE TABLE event_waitlist (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    event_id INT NOT NULL,
+    student_id INT NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (event_id) REFERENCES events(event_id) ON DELETE CASCADE,
+    FOREIGN KEY (student_id) REFERENCES student(id) ON DELETE CASCADE,
+    UNIQUE KEY uq_event_waitlist_event_student (event_id, student_id)
 );
 
 CREATE TABLE tasks (
@@ -332,6 +389,10 @@ VALUES
 (5, 5),
 (6, 6);
 
+UPDATE events SET registered_count = (
+    SELECT COUNT(*) FROM event_registrations WHERE event_registrations.event_id = events.event_id
+);
+
 INSERT INTO tasks (student_id, title, description, due_date, priority, category, status)
 VALUES
 (1, 'Complete Physics Assignment', 'Finish quantum mechanics problem set.', '2025-06-10', 'High', 'Academic', 'Pending'),
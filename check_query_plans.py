@@ -0,0 +1,122 @@
+import re
+import sys
+
+from flask import url_for
+from sqlalchemy import event
+
+from app import app
+from models import db, Student, CareerCounsellor, Administrator
+
+# GET endpoints whose queries are checked, per role
+ROUTES = {
+    'student': [
+        'student.dashboard',
+        'student.get_notifications',
+        'student.notifications',
+        'student.manage_grievances',
+        'student.view_events',
+        'student.view_appointment_requests',
+        'student.manage_tasks',
+    ],
+    'counsellor': [
+        'counsellor.dashboard',
+        'counsellor.edit_schedule',
+    ],
+    'admin': [
+        'admin.dashboard',
+        'admin.notifications',
+        'admin.list_students',
+        'admin.list_counsellors',
+    ],
+}
+
+# Tables that are read in full on purpose: small reference tables and the
+# dashboard aggregates
+ALLOWED_FULL_SCANS = {
+    'counsellors',
+    'administrators',
+    'events',
+    'career_resources',
+    ('admin.dashboard', 'student'),
+    ('admin.dashboard', 'appointments'),
+    ('admin.dashboard', 'grievances'),
+}
+
+USER_MODELS = {
+    'student': Student,
+    'counsellor': CareerCounsellor,
+    'admin': Administrator,
+}
+
+
+def capture_queries(client, url):
+    """Requests ``url`` and returns the SELECT statements it ran"""
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', _record)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', _record)
+    return response, statements
+
+
+def full_scans(connection, statement, parameters):
+    """Tables the database plans to read in full for ``statement``"""
+    if connection.dialect.name == 'sqlite':
+        rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+        # "SCAN student" reads the table, "SEARCH student USING INDEX ..." does not
+        return {m.group(1) for row in rows for m in [re.match(r'SCAN (?:TABLE )?(\w+)', row[-1])] if m}
+
+    result = connection.exec_driver_sql('EXPLAIN ' + statement, parameters)
+    columns = list(result.keys())
+    return {row[columns.index('table')] for row in result if row[columns.index('type')] == 'ALL'}
+
+
+def check_routes():
+    """
+    EXPLAINs every query issued by ROUTES and returns the unexpected full scans.
+    Meant for MySQL; SQLite does not index foreign keys, so it reports more.
+    """
+    problems = []
+    client = app.test_client()
+
+    for role, endpoints in ROUTES.items():
+        user = USER_MODELS[role].query.first()
+        if user is None:
+            print(f"Skipping {role} routes, no {role} in the database")
+            continue
+        with client.session_transaction() as session:
+            session['_user_id'] = user.get_id()
+            session['_fresh'] = True
+
+        for endpoint in endpoints:
+            with app.test_request_context():
+                url = url_for(endpoint)
+            response, statements = capture_queries(client, url)
+            if response.status_code >= 400:
+                problems.append(f"{endpoint}: {url} returned {response.status_code}")
+                continue
+            with db.engine.connect() as connection:
+                for statement, parameters in statements:
+                    for table in sorted(full_scans(connection, statement, parameters)):
+                        if table in ALLOWED_FULL_SCANS or (endpoint, table) in ALLOWED_FULL_SCANS:
+                            continue
+                        problems.append(f"{endpoint}: full scan of {table}\n    {' '.join(statement.split())}")
+
+    return problems
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        problems = check_routes()
+    for problem in problems:
+        print(problem)
+    if problems:
+        print(f"{len(problems)} unexpected full table scan(s)")
+        sys.exit(1)
+    print("No unexpected full table scans")
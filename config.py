@@ -6,3 +6,34 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     UPLOAD_FOLDER = os.path.join(os.getcwd(), 'uploads')
     ALLOWED_EXTENSIONS = {'pdf', 'doc', 'docx', 'jpg', 'jpeg', 'png'}
+    ADMIN_STATS_CACHE_TTL = 30  # seconds
+    MATCHING_INDEX_TTL = 300  # seconds before counsellor loads are recounted
+    COUNSELLOR_CAPACITY = 100  # max students per counsellor for bulk imports and offboarding
+    USER_CACHE_TTL = 60  # seconds a logged in user's profile is served from memory
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:600000'  # existing hashes are upgraded on login
+    PASSWORD_HASH_POOL = 'thread'  # 'thread' or 'process'
+    PASSWORD_HASH_WORKERS = None  # hashing workers, None = one per core, 0 = hash inline
+    PASSWORD_HASH_TIMEOUT = 10  # seconds to wait for a free hashing slot
+    NOTIFICATION_STREAM_HEARTBEAT = 25  # seconds between keepalive comments
+    NOTIFICATION_STREAM_TIMEOUT = 300  # seconds before a stream is closed and the browser reconnects
+    AVAILABILITY_INDEX_TTL = 60  # seconds before the free/busy index is rebuilt from the database
+    AVAILABILITY_HORIZON_DAYS = 90  # how far ahead availability searches look
+    OUTBOX_IN_PROCESS_WORKER = True  # expand queued notifications on a thread of each web process
+    OUTBOX_POLL_INTERVAL = 5  # seconds between outbox checks when idle
+    BACKGROUND_JOB_WORKERS = 2  # threads per process running admin background jobs
+    PURGE_ASYNC_THRESHOLD = 5000  # student records above which deletion runs as a background job
+    EVENT_LISTING_TTL = 60  # seconds the upcoming events list is shared before it is reloaded
+    DASHBOARD_LOADER_WORKERS = 4  # threads per process loading dashboard sections, shared by all requests, 0 = load inline
+    MAX_QUERIES_PER_REQUEST = 25  # requests running more queries fail while TESTING is on
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')  # app logger level, DEBUG shows the route traces
+    SLOW_QUERY_THRESHOLD_MS = 200  # statements taking longer go to the sql.slow log, None = off
+    DOCUMENT_ACCEL_REDIRECT = None  # internal nginx location serving UPLOAD_FOLDER, e.g. '/protected-uploads', None = send from Flask
+    DOCUMENT_MAX_SIZE = 100 * 1024 * 1024  # bytes per document, None = no limit
+    DOCUMENT_QUOTA_BYTES = 500 * 1024 * 1024  # document storage per student, None = no quota
+    DOCUMENT_UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024  # bytes per chunk of a resumable upload
+    DOCUMENT_UPLOAD_TTL = 24 * 60 * 60  # seconds an unfinished upload is kept after its last chunk
+    THUMBNAIL_WORKERS = 2  # threads per process rendering document thumbnails
+    THUMBNAIL_SIZE = 320  # longest side of a thumbnail in pixels
+    THUMBNAIL_TIMEOUT = 30  # seconds a PDF first page may take to render
+    STORAGE_GC_GRACE_SECONDS = 60 * 60  # unreferenced files younger than this are left for uploads still in flight
+    STORAGE_GC_QUARANTINE_DAYS = 7  # days orphaned files stay in UPLOAD_FOLDER/quarantine, 0 = delete straight away
@@ -1,6 +1,7 @@
 from app import app
 from models import db, CareerCounsellor, Administrator
 from datetime import datetime
+from migrate import migrate
 
 
 def initialize_counsellors():
@@ -120,4 +121,6 @@ if __name__ == "__main__":
         db.create_all()
         initialize_counsellors()
         init_db()
+        # create_all() already built the current schema
+        migrate(fake=True)
         print("Database tables created and counsellors initialized!")
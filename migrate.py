@@ -0,0 +1,66 @@
+import os
+import sys
+from datetime import datetime
+
+from sqlalchemy import text
+
+from app import app
+from models import db
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+
+def available_migrations():
+    """(version, path) for every migrations/NNNN_name.sql file, oldest first"""
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        if filename.endswith('.sql'):
+            migrations.append((filename[:-len('.sql')], os.path.join(MIGRATIONS_DIR, filename)))
+    return migrations
+
+
+def split_statements(sql):
+    lines = [line for line in sql.splitlines() if not line.strip().startswith('--')]
+    return [statement.strip() for statement in '\n'.join(lines).split(';') if statement.strip()]
+
+
+def applied_migrations(connection):
+    connection.execute(text(
+        'CREATE TABLE IF NOT EXISTS schema_migrations ('
+        'version VARCHAR(100) PRIMARY KEY, applied_at DATETIME NOT NULL)'
+    ))
+    return {row[0] for row in connection.execute(text('SELECT version FROM schema_migrations'))}
+
+
+def migrate(fake=False):
+    """
+    Applies pending migrations in version order, one transaction each.
+    MySQL commits DDL implicitly, so a migration that fails half way has to
+    be finished by hand before running this again.
+    With ``fake`` the pending versions are only recorded, for databases
+    created from cc.sql or db.create_all() that already have the schema.
+    """
+    with db.engine.begin() as connection:
+        applied = applied_migrations(connection)
+
+    pending = [(version, path) for version, path in available_migrations() if version not in applied]
+    for version, path in pending:
+        with open(path) as f:
+            statements = split_statements(f.read())
+        with db.engine.begin() as connection:
+            if not fake:
+                for statement in statements:
+                    connection.execute(text(statement))
+            connection.execute(
+                text('INSERT INTO schema_migrations (version, applied_at) VALUES (:version, :applied_at)'),
+                {'version': version, 'applied_at': datetime.utcnow()}
+            )
+        print(f"{'Recorded' if fake else 'Applied'} {version}")
+
+    if not pending:
+        print("Database is up to date")
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        migrate(fake='--fake' in sys.argv[1:])
@@ -0,0 +1,5 @@
+-- Materialized unread notification counts, built lazily per user
+CREATE TABLE notification_counters (
+    user_id INT PRIMARY KEY,
+    unread_count INT NOT NULL DEFAULT 0
+);
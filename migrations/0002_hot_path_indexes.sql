@@ -0,0 +1,9 @@
+-- Composite indexes for the dashboard, notification and request lookups
+CREATE INDEX ix_appointments_counsellor_status_date ON appointments (counsellor_id, status, appointment_date);
+CREATE INDEX ix_appointments_student_status_date ON appointments (student_id, status, appointment_date);
+CREATE INDEX ix_notifications_user_read_created ON notifications (user_id, read_status, created_at);
+CREATE INDEX ix_notifications_user_created ON notifications (user_id, created_at);
+CREATE INDEX ix_event_registrations_event_student ON event_registrations (event_id, student_id);
+CREATE INDEX ix_appointment_requests_counsellor_status_created ON appointment_requests (counsellor_id, status, created_at);
+CREATE INDEX ix_appointment_requests_student_created ON appointment_requests (student_id, created_at);
+CREATE INDEX ix_grievances_student_created ON grievances (student_id, created_at);
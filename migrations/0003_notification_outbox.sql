@@ -0,0 +1,11 @@
+-- Notification fan-outs recorded with the business write, expanded by the outbox worker
+CREATE TABLE notification_outbox (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    kind VARCHAR(50) NOT NULL,
+    payload TEXT NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    processed_at DATETIME,
+    attempts INT NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+CREATE INDEX ix_notification_outbox_pending ON notification_outbox (processed_at, id);
@@ -0,0 +1,14 @@
+-- Status and progress of admin jobs run in the background
+CREATE TABLE background_jobs (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    kind VARCHAR(50) NOT NULL,
+    status ENUM('queued', 'running', 'completed', 'failed') NOT NULL DEFAULT 'queued',
+    progress INT NOT NULL DEFAULT 0,
+    total INT,
+    result TEXT,
+    error TEXT,
+    created_by_id INT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (created_by_id) REFERENCES administrators(id) ON DELETE SET NULL
+);
@@ -0,0 +1,2 @@
+-- Lets the admin dashboard find jobs still in progress
+CREATE INDEX ix_background_jobs_status ON background_jobs (status, id);
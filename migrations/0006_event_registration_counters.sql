@@ -0,0 +1,25 @@
+-- Seat counters, one registration per student and event, and waitlists
+ALTER TABLE events ADD COLUMN registered_count INT NOT NULL DEFAULT 0 AFTER capacity;
+
+DELETE duplicate FROM event_registrations duplicate
+JOIN event_registrations kept
+  ON kept.event_id = duplicate.event_id
+ AND kept.student_id = duplicate.student_id
+ AND kept.registration_id < duplicate.registration_id;
+
+CREATE UNIQUE INDEX uq_event_registrations_event_student ON event_registrations (event_id, student_id);
+DROP INDEX ix_event_registrations_event_student ON event_registrations;
+
+UPDATE events SET registered_count = (
+    SELECT COUNT(*) FROM event_registrations WHERE event_registrations.event_id = events.event_id
+);
+
+CREATE TABLE event_waitlist (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    event_id INT NOT NULL,
+    student_id INT NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (event_id) REFERENCES events(event_id) ON DELETE CASCADE,
+    FOREIGN KEY (student_id) REFERENCES student(id) ON DELETE CASCADE,
+    UNIQUE KEY uq_event_waitlist_event_student (event_id, student_id)
+);
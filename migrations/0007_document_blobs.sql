@@ -0,0 +1,13 @@
+-- Uploads stored once per content hash, shared by reference count
+CREATE TABLE document_blobs (
+    sha256 VARCHAR(64) PRIMARY KEY,
+    size BIGINT NOT NULL,
+    ref_count INT NOT NULL DEFAULT 0,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+ALTER TABLE student_documents
+    ADD COLUMN file_name VARCHAR(255) AFTER file_path,
+    ADD COLUMN blob_sha256 VARCHAR(64) AFTER file_name,
+    ADD INDEX ix_student_documents_blob_sha256 (blob_sha256),
+    ADD FOREIGN KEY (blob_sha256) REFERENCES document_blobs(sha256);
@@ -0,0 +1,15 @@
+-- Resumable chunked uploads in progress
+CREATE TABLE document_uploads (
+    id VARCHAR(32) PRIMARY KEY,
+    student_id INT NOT NULL,
+    title VARCHAR(255) NOT NULL,
+    document_type ENUM('transcript', 'resume', 'certificate', 'other') NOT NULL,
+    file_name VARCHAR(255) NOT NULL,
+    size BIGINT NOT NULL,
+    chunk_size INT NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    expires_at DATETIME NOT NULL,
+    FOREIGN KEY (student_id) REFERENCES student(id) ON DELETE CASCADE,
+    INDEX ix_document_uploads_student_id (student_id),
+    INDEX ix_document_uploads_expires_at (expires_at)
+);
@@ -0,0 +1,8 @@
+-- Per-student document storage totals, refreshed by the storage collector
+CREATE TABLE student_storage (
+    student_id INT PRIMARY KEY,
+    document_count INT NOT NULL DEFAULT 0,
+    bytes BIGINT NOT NULL DEFAULT 0,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (student_id) REFERENCES student(id) ON DELETE CASCADE
+);
@@ -0,0 +1,17 @@
+-- appointments.appointment_type, which the model now maps. Databases created
+-- from cc.sql already have the column; others get it added. It is made
+-- nullable either way, as appointments a counsellor schedules directly
+-- have no type.
+SET @add_appointment_type = IF(
+    (SELECT COUNT(*) FROM information_schema.COLUMNS
+      WHERE TABLE_SCHEMA = DATABASE()
+        AND TABLE_NAME = 'appointments'
+        AND COLUMN_NAME = 'appointment_type') = 0,
+    'ALTER TABLE appointments ADD COLUMN appointment_type VARCHAR(100) NULL AFTER end_time',
+    'DO 0'
+);
+PREPARE add_appointment_type FROM @add_appointment_type;
+EXECUTE add_appointment_type;
+DEALLOCATE PREPARE add_appointment_type;
+
+ALTER TABLE appointments MODIFY appointment_type VARCHAR(100) NULL;
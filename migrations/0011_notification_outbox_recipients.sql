@@ -0,0 +1,8 @@
+-- Recipients of an outbox message, filled with INSERT ... SELECT so large
+-- fan-outs neither pass through the request nor overflow the TEXT payload
+CREATE TABLE notification_outbox_recipients (
+    outbox_id INT NOT NULL,
+    user_id INT NOT NULL,
+    PRIMARY KEY (outbox_id, user_id),
+    FOREIGN KEY (outbox_id) REFERENCES notification_outbox(id) ON DELETE CASCADE
+);
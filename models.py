@@ -1,12 +1,14 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from services.passwords import hash_password, verify_password
 from datetime import datetime, date, time
+import json
 
 db = SQLAlchemy()
 
 class CareerCounsellor(db.Model, UserMixin):
     __tablename__ = 'counsellors'
+    role = 'counsellor'  # Matches the prefix used in get_id()
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(100), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
@@ -25,13 +27,26 @@ class CareerCounsellor(db.Model, UserMixin):
         return f"counsellor-{self.id}"
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'email': self.email,
+            'first_name': self.first_name,
+            'last_name': self.last_name,
+            'specialization': self.specialization,
+            'availability_status': self.availability_status,
+            'rating': float(self.rating) if self.rating else None,
+            'date_registered': self.date_registered.strftime('%Y-%m-%d %H:%M:%S') if self.date_registered else None
+        }
 
 class Student(db.Model, UserMixin):
     __tablename__ = 'student'
+    role = 'student'  # Matches the prefix used in get_id()
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(100), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
@@ -49,19 +64,34 @@ class Student(db.Model, UserMixin):
     date_registered = db.Column(db.DateTime, default=datetime.utcnow)
     last_login = db.Column(db.DateTime)
 
-    counsellor = db.relationship('CareerCounsellor', backref=db.backref('students', lazy=True), foreign_keys=[counsellor_id])
+    # Collections such as counsellor.students can hold thousands of rows, so
+    # they raise instead of loading lazily; query them or use selectinload
+    counsellor = db.relationship('CareerCounsellor', backref=db.backref('students', lazy='raise_on_sql'), foreign_keys=[counsellor_id])
 
     def get_id(self):
         return f"student-{self.id}"
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'email': self.email,
+            'first_name': self.first_name,
+            'last_name': self.last_name,
+            'education_level': self.education_level,
+            'is_active': self.is_active,
+            'counsellor_id': self.counsellor_id,
+            'date_registered': self.date_registered.strftime('%Y-%m-%d %H:%M:%S') if self.date_registered else None
+        }
 
 class Administrator(db.Model, UserMixin):
     __tablename__ = 'administrators'
+    role = 'admin'  # Matches the prefix used in get_id()
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(100), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
@@ -82,13 +112,16 @@ class Administrator(db.Model, UserMixin):
         return f"admin-{self.id}"
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
 
 class Grievance(db.Model):
     __tablename__ = 'grievances'
+    __table_args__ = (
+        db.Index('ix_grievances_student_created', 'student_id', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('student.id', ondelete='CASCADE'), nullable=False)
     subject = db.Column(db.String(200), nullable=False)
@@ -98,7 +131,7 @@ class Grievance(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    student = db.relationship('Student', backref='grievances', foreign_keys=[student_id])
+    student = db.relationship('Student', backref=db.backref('grievances', lazy='raise_on_sql'), foreign_keys=[student_id])
 
 class CounsellorAssignmentLog(db.Model):
     __tablename__ = 'counsellor_assignment_logs'
@@ -112,12 +145,18 @@ class CounsellorAssignmentLog(db.Model):
 
 class Appointment(db.Model):
     __tablename__ = 'appointments'
+    __table_args__ = (
+        # Equality columns first so the date range can still use the index
+        db.Index('ix_appointments_counsellor_status_date', 'counsellor_id', 'status', 'appointment_date'),
+        db.Index('ix_appointments_student_status_date', 'student_id', 'status', 'appointment_date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('student.id', ondelete='CASCADE'), nullable=False)
     counsellor_id = db.Column(db.Integer, db.ForeignKey('counsellors.id', ondelete='CASCADE'), nullable=False)
     appointment_date = db.Column(db.Date, nullable=False)
     start_time = db.Column(db.Time, nullable=False)
     end_time = db.Column(db.Time)
+    appointment_type = db.Column(db.String(100))
     status = db.Column(db.Enum('scheduled', 'completed', 'cancelled', 'rescheduled'), default='scheduled')
     mode = db.Column(db.Enum('online', 'offline', 'phone'), nullable=False)
     meeting_link = db.Column(db.String(255))
@@ -127,8 +166,8 @@ class Appointment(db.Model):
     payment_status = db.Column(db.Enum('paid', 'pending', 'not_required'), default='not_required')
 
     # Relationships
-    student = db.relationship('Student', backref=db.backref('appointments', lazy=True))
-    counsellor = db.relationship('CareerCounsellor', backref=db.backref('appointments', lazy=True))
+    student = db.relationship('Student', backref=db.backref('appointments', lazy='raise_on_sql'))
+    counsellor = db.relationship('CareerCounsellor', backref=db.backref('appointments', lazy='raise_on_sql'))
 
     def to_dict(self):
         return {
@@ -188,18 +227,60 @@ class CareerResource(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_public = db.Column(db.Boolean, default=True)
 
+class DocumentBlob(db.Model):
+    """Uploaded file content, stored once per SHA-256 by services/document_store.py"""
+    __tablename__ = 'document_blobs'
+    sha256 = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)  # student_documents rows pointing here
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class StudentDocument(db.Model):
     __tablename__ = 'student_documents'
     document_id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('student.id', ondelete='CASCADE'))
     title = db.Column(db.String(255), nullable=False)
-    file_path = db.Column(db.String(255), nullable=False)
+    file_path = db.Column(db.String(255), nullable=False)  # relative to UPLOAD_FOLDER
+    file_name = db.Column(db.String(255))  # name the file was uploaded with
+    blob_sha256 = db.Column(db.String(64), db.ForeignKey('document_blobs.sha256'), index=True)  # NULL for files saved before the blob store
     document_type = db.Column(db.Enum('transcript', 'resume', 'certificate', 'other'), nullable=False)
     file_type = db.Column(db.String(10), nullable=False, default='other')  # pdf, doc, image, other
     upload_date = db.Column(db.DateTime, default=datetime.utcnow)
 
+class StudentStorage(db.Model):
+    """Documents and bytes stored per student, recounted by services/storage_gc.py"""
+    __tablename__ = 'student_storage'
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id', ondelete='CASCADE'), primary_key=True, autoincrement=False)
+    document_count = db.Column(db.Integer, nullable=False, default=0)
+    bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class DocumentUpload(db.Model):
+    """Resumable upload in progress, its chunks kept on disk by services/chunked_uploads.py"""
+    __tablename__ = 'document_uploads'
+    __table_args__ = (
+        db.Index('ix_document_uploads_expires_at', 'expires_at'),
+    )
+    id = db.Column(db.String(32), primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id', ondelete='CASCADE'), nullable=False, index=True)
+    title = db.Column(db.String(255), nullable=False)
+    document_type = db.Column(db.Enum('transcript', 'resume', 'certificate', 'other'), nullable=False)
+    file_name = db.Column(db.String(255), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    chunk_size = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)  # moved forward by every chunk received
+
+    @property
+    def total_chunks(self):
+        return max(1, -(-self.size // self.chunk_size))
+
 class Notification(db.Model):
     __tablename__ = 'notifications'
+    __table_args__ = (
+        db.Index('ix_notifications_user_read_created', 'user_id', 'read_status', 'created_at'),
+        db.Index('ix_notifications_user_created', 'user_id', 'created_at'),
+    )
     notification_id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('student.id', ondelete='CASCADE'))
     message = db.Column(db.Text, nullable=False)
@@ -218,6 +299,62 @@ class Notification(db.Model):
             'related_entity_id': self.related_entity_id
         }
 
+class NotificationCounter(db.Model):
+    """Materialized unread count per notification recipient, see services/unread_counters.py"""
+    __tablename__ = 'notification_counters'
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    unread_count = db.Column(db.Integer, nullable=False, default=0)
+
+class NotificationOutbox(db.Model):
+    """Pending notification fan-outs, expanded by services/outbox.py"""
+    __tablename__ = 'notification_outbox'
+    __table_args__ = (
+        db.Index('ix_notification_outbox_pending', 'processed_at', 'id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+
+class NotificationOutboxRecipient(db.Model):
+    """Recipients of an outbox message, selected in the database rather than carried in its payload"""
+    __tablename__ = 'notification_outbox_recipients'
+    outbox_id = db.Column(db.Integer, db.ForeignKey('notification_outbox.id', ondelete='CASCADE'), primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+
+class BackgroundJob(db.Model):
+    """Long running admin work, executed by services/jobs.py"""
+    __tablename__ = 'background_jobs'
+    __table_args__ = (
+        db.Index('ix_background_jobs_status', 'status', 'id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.Enum('queued', 'running', 'completed', 'failed'), nullable=False, default='queued')
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer)
+    result = db.Column(db.Text)  # JSON
+    error = db.Column(db.Text)
+    created_by_id = db.Column(db.Integer, db.ForeignKey('administrators.id', ondelete='SET NULL'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'total': self.total,
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None,
+            'updated_at': self.updated_at.strftime('%Y-%m-%d %H:%M:%S') if self.updated_at else None
+        }
+
 class Message(db.Model):
     __tablename__ = 'messages'
     message_id = db.Column(db.Integer, primary_key=True)
@@ -251,6 +388,10 @@ class GoalMilestone(db.Model):
     milestone_title = db.Column(db.String(255))
     due_date = db.Column(db.Date)
     status = db.Column(db.Enum('pending', 'completed'), default='pending')
+    goal = db.relationship('CareerGoal', backref=db.backref(
+        'milestones', lazy=True, order_by='GoalMilestone.milestone_id',
+        cascade='all, delete-orphan', passive_deletes=True
+    ))
 
 class Event(db.Model):
     __tablename__ = 'events'
@@ -265,11 +406,16 @@ class Event(db.Model):
     location = db.Column(db.String(255))
     meeting_link = db.Column(db.String(255))
     capacity = db.Column(db.Integer)
+    # Seats taken, maintained by services/registrations.py
+    registered_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     is_online = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class EventRegistration(db.Model):
     __tablename__ = 'event_registrations'
+    __table_args__ = (
+        db.UniqueConstraint('event_id', 'student_id', name='uq_event_registrations_event_student'),
+    )
     registration_id = db.Column(db.Integer, primary_key=True)
     event_id = db.Column(db.Integer, db.ForeignKey('events.event_id', ondelete='CASCADE'))
     student_id = db.Column(db.Integer, db.ForeignKey('student.id', ondelete='CASCADE'))
@@ -277,6 +423,17 @@ class EventRegistration(db.Model):
     reminder_sent = db.Column(db.Boolean, default=False)
     attendance_status = db.Column(db.Enum('registered', 'attended', 'missed'), default='registered')
 
+class EventWaitlist(db.Model):
+    """Students waiting for a seat at a full event, promoted in id order"""
+    __tablename__ = 'event_waitlist'
+    __table_args__ = (
+        db.UniqueConstraint('event_id', 'student_id', name='uq_event_waitlist_event_student'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.Integer, db.ForeignKey('events.event_id', ondelete='CASCADE'), nullable=False)
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id', ondelete='CASCADE'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class Task(db.Model):
     __tablename__ = 'tasks'
     task_id = db.Column(db.Integer, primary_key=True)
@@ -290,7 +447,7 @@ class Task(db.Model):
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    student = db.relationship('Student', backref=db.backref('tasks', lazy=True))
+    student = db.relationship('Student', backref=db.backref('tasks', lazy='raise_on_sql'))
 
     def to_dict(self):
         return {
@@ -307,6 +464,10 @@ class Task(db.Model):
 
 class AppointmentRequest(db.Model):
     __tablename__ = 'appointment_requests'
+    __table_args__ = (
+        db.Index('ix_appointment_requests_counsellor_status_created', 'counsellor_id', 'status', 'created_at'),
+        db.Index('ix_appointment_requests_student_created', 'student_id', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('student.id', ondelete='CASCADE'), nullable=False)
     counsellor_id = db.Column(db.Integer, db.ForeignKey('counsellors.id', ondelete='CASCADE'), nullable=False)
@@ -320,8 +481,8 @@ class AppointmentRequest(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationships
-    student = db.relationship('Student', backref=db.backref('appointment_requests', lazy=True))
-    counsellor = db.relationship('CareerCounsellor', backref=db.backref('appointment_requests', lazy=True))
+    student = db.relationship('Student', backref=db.backref('appointment_requests', lazy='raise_on_sql'))
+    counsellor = db.relationship('CareerCounsellor', backref=db.backref('appointment_requests', lazy='raise_on_sql'))
 
     def to_dict(self):
         return {
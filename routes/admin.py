@@ -1,17 +1,33 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app
 from flask_login import login_required, current_user
-from models import db, Student, CareerCounsellor, Administrator, Appointment, Event, Grievance, Notification, AppointmentRequest, EventRegistration, CareerGoal, GoalMilestone, StudentDocument, Feedback, CounsellingSession, Message
+from models import db, Student, CareerCounsellor, Administrator, Appointment, Event, Grievance, Notification, AppointmentRequest, EventRegistration, EventWaitlist, CareerGoal, GoalMilestone, StudentDocument, Feedback, CounsellingSession, Message, BackgroundJob, StudentStorage
 from functools import wraps
 from datetime import datetime, timedelta
-from sqlalchemy import desc
+from sqlalchemy import desc, func, or_, select, union
+from services.stats import get_dashboard_stats
+from services.pagination import keyset_page
+from services.student_import import parse_import_file, import_students
+from services.passwords import HashingBusy
+from services.unread_counters import get_unread_count, mark_all_read
+from services.slots import reserve_slot, SlotUnavailable
+from services.outbox import enqueue
+from services.jobs import submit_job
+from services.purge import count_student_history, purge_student, purge_student_job
+from services.offboarding import offboard_counsellor_job
+from services.registrations import cancel_registration
+from services.sql_metrics import endpoint_metrics
+from services.storage_gc import collect_storage_garbage
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
 # Admin-only decorator
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if not current_user.is_authenticated or not current_user.get_id().startswith('admin-'):
+        if current_user.role != 'admin':
             flash('Access denied. Admin privileges required.', 'danger')
             return redirect(url_for('auth.login'))
         return f(*args, **kwargs)
@@ -20,52 +36,62 @@ def admin_required(f):
 @admin_bp.route('/admin/dashboard')
 @login_required
 def dashboard():
-    if not isinstance(current_user, Administrator):
+    if current_user.role != 'admin':
         flash('Unauthorized access', 'danger')
         return redirect(url_for('auth.login'))
 
     # Get statistics
-    stats = {
-        'total_students': Student.query.count(),
-        'active_students': Student.query.filter_by(is_active=True).count(),
-        'inactive_students': Student.query.filter_by(is_active=False).count(),
-        'total_counsellors': CareerCounsellor.query.count(),
-        'active_counsellors': CareerCounsellor.query.filter_by(availability_status=True).count(),
-        'inactive_counsellors': CareerCounsellor.query.filter_by(availability_status=False).count(),
-        'active_sessions': Appointment.query.filter_by(status='scheduled').count(),
-        'pending_grievances': Grievance.query.filter_by(status='Pending').count()
-    }
+    stats = get_dashboard_stats()
 
-    # Get all students with their counsellors
-    all_students = Student.query.options(db.joinedload(Student.counsellor)).order_by(Student.date_registered.desc()).all()
-
-    # Get all counsellors
-    all_counsellors = CareerCounsellor.query.order_by(CareerCounsellor.date_registered.desc()).all()
+    # Student and counsellor lists are fetched page by page from
+    # admin.list_students / admin.list_counsellors by the dashboard itself
 
     # Get active counsellors for replacement selection
     active_counsellors = CareerCounsellor.query.filter_by(availability_status=True).all()
 
     # Get upcoming appointments
-    upcoming_appointments = Appointment.query.filter(
+    upcoming_appointments = Appointment.query.options(
+        db.joinedload(Appointment.student), db.joinedload(Appointment.counsellor)
+    ).filter(
         Appointment.appointment_date >= datetime.now().date(),
         Appointment.status == 'scheduled'
     ).order_by(Appointment.appointment_date, Appointment.start_time).all()
 
     # Get pending appointment requests
-    pending_requests = AppointmentRequest.query.filter_by(status='pending').all()
+    pending_requests = AppointmentRequest.query.options(
+        db.joinedload(AppointmentRequest.student), db.joinedload(AppointmentRequest.counsellor)
+    ).filter_by(status='pending').all()
 
     # Get recent grievances
-    recent_grievances = Grievance.query.order_by(Grievance.created_at.desc()).limit(5).all()
+    recent_grievances = Grievance.query.options(
+        db.joinedload(Grievance.student)
+    ).order_by(Grievance.created_at.desc()).limit(5).all()
 
     # Get upcoming events
     upcoming_events = Event.query.filter(
         Event.event_date >= datetime.now().date()
     ).order_by(Event.event_date, Event.start_time).all()
 
+    # Document storage as last counted by the storage collector, no disk access
+    storage = db.session.query(
+        func.coalesce(func.sum(StudentStorage.bytes), 0).label('bytes'),
+        func.coalesce(func.sum(StudentStorage.document_count), 0).label('documents'),
+        func.max(StudentStorage.updated_at).label('updated_at')
+    ).one()
+    top_storage = db.session.query(
+        StudentStorage.bytes, StudentStorage.document_count, Student.first_name, Student.last_name
+    ).join(Student, Student.id == StudentStorage.student_id).order_by(StudentStorage.bytes.desc()).limit(5).all()
+
+    # Background jobs still in progress, polled by the dashboard
+    active_jobs = BackgroundJob.query.filter(
+        BackgroundJob.status.in_(['queued', 'running'])
+    ).order_by(BackgroundJob.id).all()
+
     return render_template('admin/dashboard.html',
                          stats=stats,
-                         all_students=all_students,
-                         all_counsellors=all_counsellors,
+                         active_jobs=active_jobs,
+                         storage=storage,
+                         top_storage=top_storage,
                          active_counsellors=active_counsellors,
                          upcoming_appointments=upcoming_appointments,
                          pending_requests=pending_requests,
@@ -76,11 +102,144 @@ def dashboard():
 @login_required
 @admin_required
 def manage_users():
-    students = Student.query.all()
-    counsellors = CareerCounsellor.query.all()
+    students, students_cursor = keyset_page(
+        Student.query.options(db.joinedload(Student.counsellor)),
+        Student.date_registered, Student.id, descending=True, limit=PAGE_SIZE
+    )
+    counsellors, counsellors_cursor = keyset_page(
+        CareerCounsellor.query,
+        CareerCounsellor.date_registered, CareerCounsellor.id, descending=True, limit=PAGE_SIZE
+    )
     return render_template('admin/manage_users.html',
                          students=students,
-                         counsellors=counsellors)
+                         students_cursor=students_cursor,
+                         counsellors=counsellors,
+                         counsellors_cursor=counsellors_cursor)
+
+def _page_args(sortable):
+    """Reads the shared limit/cursor/sort/order query parameters of the list endpoints"""
+    limit = min(max(request.args.get('limit', PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    sort = request.args.get('sort', 'date_registered')
+    if sort not in sortable:
+        sort = 'date_registered'
+    descending = request.args.get('order', 'desc') != 'asc'
+    return limit, request.args.get('cursor'), sortable[sort], descending
+
+@admin_bp.route('/api/students')
+@login_required
+@admin_required
+def list_students():
+    limit, cursor, sort_column, descending = _page_args({
+        'date_registered': Student.date_registered,
+        'first_name': Student.first_name,
+        'email': Student.email,
+        'id': Student.id
+    })
+
+    query = Student.query.options(db.joinedload(Student.counsellor))
+
+    search = request.args.get('q', '').strip()
+    if search:
+        # Prefix match so the email/name indexes can still be used; autoescape
+        # keeps % and _ in the search literal
+        query = query.filter(or_(
+            Student.email.startswith(search, autoescape=True),
+            Student.first_name.startswith(search, autoescape=True),
+            Student.last_name.startswith(search, autoescape=True)
+        ))
+
+    status = request.args.get('status')
+    if status == 'active':
+        query = query.filter(Student.is_active.is_(True))
+    elif status == 'inactive':
+        query = query.filter(Student.is_active.is_(False))
+
+    counsellor_id = request.args.get('counsellor_id', type=int)
+    if counsellor_id:
+        query = query.filter(Student.counsellor_id == counsellor_id)
+
+    try:
+        students, next_cursor = keyset_page(query, sort_column, Student.id, descending, cursor, limit)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    items = []
+    for student in students:
+        item = student.to_dict()
+        item['counsellor_name'] = f'{student.counsellor.first_name} {student.counsellor.last_name or ""}'.strip() if student.counsellor else None
+        items.append(item)
+
+    return jsonify({'students': items, 'next_cursor': next_cursor})
+
+@admin_bp.route('/students/import', methods=['POST'])
+@login_required
+@admin_required
+def import_students_file():
+    file = request.files.get('file')
+    if not file or file.filename == '':
+        return jsonify({'success': False, 'message': 'No file provided'}), 400
+
+    try:
+        records = parse_import_file(file)
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({'success': False, 'message': f'Could not read import file: {str(e)}'}), 400
+
+    try:
+        summary = import_students(records, capacity=current_app.config.get('COUNSELLOR_CAPACITY'))
+    except HashingBusy:
+        return jsonify({'success': False, 'message': 'The server is busy hashing passwords, please try again shortly'}), 503
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Import failed: {str(e)}'}), 500
+
+    return jsonify({'success': True, **summary})
+
+@admin_bp.route('/api/counsellors')
+@login_required
+@admin_required
+def list_counsellors():
+    limit, cursor, sort_column, descending = _page_args({
+        'date_registered': CareerCounsellor.date_registered,
+        'first_name': CareerCounsellor.first_name,
+        'email': CareerCounsellor.email,
+        'id': CareerCounsellor.id
+    })
+
+    query = CareerCounsellor.query
+
+    search = request.args.get('q', '').strip()
+    if search:
+        query = query.filter(or_(
+            CareerCounsellor.email.startswith(search, autoescape=True),
+            CareerCounsellor.first_name.startswith(search, autoescape=True),
+            CareerCounsellor.last_name.startswith(search, autoescape=True),
+            CareerCounsellor.specialization.startswith(search, autoescape=True)
+        ))
+
+    status = request.args.get('status')
+    if status == 'active':
+        query = query.filter(CareerCounsellor.availability_status.is_(True))
+    elif status == 'inactive':
+        query = query.filter(CareerCounsellor.availability_status.is_(False))
+
+    try:
+        counsellors, next_cursor = keyset_page(query, sort_column, CareerCounsellor.id, descending, cursor, limit)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    # Student counts for this page only, in one grouped query
+    student_counts = {}
+    if counsellors:
+        student_counts = dict(db.session.query(Student.counsellor_id, func.count(Student.id)).filter(
+            Student.counsellor_id.in_([c.id for c in counsellors])
+        ).group_by(Student.counsellor_id).all())
+
+    items = []
+    for counsellor in counsellors:
+        item = counsellor.to_dict()
+        item['student_count'] = student_counts.get(counsellor.id, 0)
+        items.append(item)
+
+    return jsonify({'counsellors': items, 'next_cursor': next_cursor})
 
 @admin_bp.route('/manage-counsellor/<int:counsellor_id>')
 @login_required
@@ -169,10 +328,7 @@ def notifications():
     per_page = 20
     
     # Get unread notifications count
-    unread_notifications = Notification.query.filter_by(
-        user_id=current_user.id,
-        read_status=False
-    ).count()
+    unread_notifications = get_unread_count(current_user.id)
     
     notifications = Notification.query.filter_by(
         user_id=current_user.id
@@ -209,10 +365,7 @@ def mark_notifications_read():
         notification.read_status = True
     else:
         # Mark all notifications as read
-        Notification.query.filter_by(
-            user_id=current_user.id,
-            read_status=False
-        ).update({'read_status': True})
+        mark_all_read(current_user.id)
     
     db.session.commit()
     return jsonify({'success': True})
@@ -254,14 +407,11 @@ def update_grievance_status(grievance_id):
 @login_required
 @admin_required
 def remove_event_registration(event_id, student_id):
+    Event.query.get_or_404(event_id)
     try:
-        # Find and delete the registration
-        registration = EventRegistration.query.filter_by(
-            event_id=event_id,
-            student_id=student_id
-        ).first_or_404()
-        
-        db.session.delete(registration)
+        # Removing a registration promotes the first student on the waitlist
+        if not cancel_registration(event_id, student_id):
+            return jsonify({'success': False, 'message': 'Registration not found'}), 404
         db.session.commit()
         
         return jsonify({'success': True, 'message': 'Registration removed successfully'})
@@ -269,42 +419,44 @@ def remove_event_registration(event_id, student_id):
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)}), 500
 
+def _purge_in_background(student_id, delete_account):
+    """Runs large purges as a background job, returns the job id or None"""
+    history = count_student_history(student_id, delete_account=delete_account)
+    if sum(history.values()) <= current_app.config.get('PURGE_ASYNC_THRESHOLD', 5000):
+        return None
+    return submit_job(
+        'delete_student' if delete_account else 'deactivate_student',
+        purge_student_job, student_id, delete_account,
+        created_by_id=current_user.id
+    )
+
 @admin_bp.route('/students/<int:student_id>/delete', methods=['DELETE'])
 @login_required
 @admin_required
 def delete_student(student_id):
     try:
         student = Student.query.get_or_404(student_id)
+        student_name = f'{student.first_name} {student.last_name}'
         
-        # Delete related records first
-        # Delete event registrations
-        EventRegistration.query.filter_by(student_id=student_id).delete()
-        
-        # Delete appointments
-        Appointment.query.filter_by(student_id=student_id).delete()
-        
-        # Delete appointment requests
-        AppointmentRequest.query.filter_by(student_id=student_id).delete()
-        
-        # Delete grievances
-        Grievance.query.filter_by(student_id=student_id).delete()
-        
-        # Delete notifications
-        Notification.query.filter_by(user_id=student_id).delete()
-        
-        # Delete career goals and their milestones
-        goals = CareerGoal.query.filter_by(student_id=student_id).all()
-        for goal in goals:
-            GoalMilestone.query.filter_by(goal_id=goal.goal_id).delete()
-        CareerGoal.query.filter_by(student_id=student_id).delete()
-        
-        # Finally, delete the student
-        db.session.delete(student)
+        # Block sign in straight away, large histories are removed in the background
+        student.is_active = False
+        db.session.commit()
+        job_id = _purge_in_background(student_id, delete_account=True)
+        if job_id:
+            return jsonify({
+                'success': True,
+                'message': f'Student {student_name} is being deleted in the background',
+                'job_id': job_id,
+                'status_url': url_for('admin.job_status', job_id=job_id)
+            }), 202
+        
+        deleted = purge_student(student_id, delete_account=True)
         db.session.commit()
         
         return jsonify({
             'success': True, 
-            'message': f'Student {student.first_name} {student.last_name} and all related records have been deleted'
+            'message': f'Student {student_name} and all related records have been deleted',
+            'deleted': deleted
         })
         
     except Exception as e:
@@ -317,217 +469,111 @@ def delete_student(student_id):
 @admin_bp.route('/admin/student/<int:student_id>/toggle-status', methods=['POST'])
 @login_required
 def toggle_student_status(student_id):
-    print(f"[DEBUG] Starting student status toggle for student_id: {student_id}")
-    
-    if not isinstance(current_user, Administrator):
-        print("[DEBUG] Unauthorized access attempt - not an administrator")
+    if current_user.role != 'admin':
         flash('Unauthorized access', 'danger')
         return redirect(url_for('admin.dashboard'))
     
     student = Student.query.get_or_404(student_id)
-    print(f"[DEBUG] Found student: {student.first_name} {student.last_name}, current status: {student.is_active}")
+    student_name = f'{student.first_name} {student.last_name}'
     
     try:
-        # Begin transaction
-        print("[DEBUG] Starting nested transaction")
-        db.session.begin_nested()
-        
         # Toggle student status
         student.is_active = not student.is_active
-        print(f"[DEBUG] Toggled student status to: {student.is_active}")
+        db.session.commit()
         
         if not student.is_active:
-            print("[DEBUG] Deactivating student - starting cleanup process")
-            
-            try:
-                # Delete appointment requests first (no dependencies)
-                requests_deleted = AppointmentRequest.query.filter_by(student_id=student_id).delete()
-                print(f"[DEBUG] Deleted {requests_deleted} appointment requests")
-                
-                # Get all appointments for this student
-                appointments = Appointment.query.filter_by(student_id=student_id).all()
-                appointment_ids = [appointment.id for appointment in appointments]
-                print(f"[DEBUG] Found {len(appointment_ids)} appointments to process")
-                
-                # Get all counselling sessions for these appointments
-                if appointment_ids:
-                    sessions = CounsellingSession.query.filter(
-                        CounsellingSession.appointment_id.in_(appointment_ids)
-                    ).all()
-                    session_ids = [session.session_id for session in sessions]
-                    print(f"[DEBUG] Found {len(session_ids)} counselling sessions to process")
-                    
-                    # Delete feedback first (depends on counselling sessions)
-                    if session_ids:
-                        feedback_deleted = Feedback.query.filter(
-                            Feedback.session_id.in_(session_ids)
-                        ).delete(synchronize_session='fetch')
-                        print(f"[DEBUG] Deleted {feedback_deleted} feedback records linked to sessions")
-                    
-                    # Now safe to delete counselling sessions
-                    sessions_deleted = CounsellingSession.query.filter(
-                        CounsellingSession.appointment_id.in_(appointment_ids)
-                    ).delete(synchronize_session='fetch')
-                    print(f"[DEBUG] Deleted {sessions_deleted} counselling sessions")
-                
-                # Now safe to delete appointments
-                appointments_deleted = Appointment.query.filter_by(student_id=student_id).delete()
-                print(f"[DEBUG] Deleted {appointments_deleted} appointments")
-                
-                # Delete grievances
-                grievances_deleted = Grievance.query.filter_by(student_id=student_id).delete()
-                print(f"[DEBUG] Deleted {grievances_deleted} grievances")
-                
-                # Delete event registrations
-                registrations_deleted = EventRegistration.query.filter_by(student_id=student_id).delete()
-                print(f"[DEBUG] Deleted {registrations_deleted} event registrations")
-                
-                # Delete remaining feedback not linked to sessions
-                remaining_feedback_deleted = Feedback.query.filter_by(student_id=student_id).delete()
-                print(f"[DEBUG] Deleted {remaining_feedback_deleted} remaining feedback records")
-                
-                # Delete career goals and milestones
-                goals = CareerGoal.query.filter_by(student_id=student_id).all()
-                milestones_deleted = 0
-                for goal in goals:
-                    print(f"[DEBUG] Processing goal_id: {goal.goal_id}")
-                    milestones_count = GoalMilestone.query.filter_by(goal_id=goal.goal_id).delete()
-                    milestones_deleted += milestones_count
-                goals_deleted = CareerGoal.query.filter_by(student_id=student_id).delete()
-                print(f"[DEBUG] Deleted {goals_deleted} career goals and {milestones_deleted} milestones")
-                
-                # Delete documents
-                documents_deleted = StudentDocument.query.filter_by(student_id=student_id).delete()
-                print(f"[DEBUG] Deleted {documents_deleted} student documents")
-                
-                # Delete notifications
-                notifications_deleted = Notification.query.filter_by(user_id=student_id).delete()
-                print(f"[DEBUG] Deleted {notifications_deleted} notifications")
-                
-                # Delete messages
-                messages_deleted = Message.query.filter(
-                    (Message.sender_id == student_id) | 
-                    (Message.recipient_id == student_id)
-                ).delete()
-                print(f"[DEBUG] Deleted {messages_deleted} messages")
-                
-                print("[DEBUG] Successfully completed all cleanup operations")
-                
-            except Exception as cleanup_error:
-                print(f"[DEBUG] Error during cleanup: {str(cleanup_error)}")
-                raise
-            
-            flash(f'Student {student.first_name} {student.last_name} has been deactivated and all related records have been removed.', 'success')
+            job_id = _purge_in_background(student_id, delete_account=False)
+            if job_id:
+                flash(f'Student {student_name} has been deactivated. Their records are being removed in the background.', 'success')
+            else:
+                deleted = purge_student(student_id)
+                db.session.commit()
+                flash(f'Student {student_name} has been deactivated and {sum(deleted.values())} related records have been removed.', 'success')
         else:
-            print(f"[DEBUG] Activating student {student.first_name} {student.last_name}")
-            flash(f'Student {student.first_name} {student.last_name} has been activated.', 'success')
-        
-        # Commit all changes
-        print("[DEBUG] Committing all changes")
-        db.session.commit()
-        print("[DEBUG] Successfully committed all changes")
+            flash(f'Student {student_name} has been activated.', 'success')
         
     except Exception as e:
-        print(f"[DEBUG] Error occurred: {str(e)}")
-        print("[DEBUG] Rolling back transaction")
         db.session.rollback()
         flash(f'Error updating student status: {str(e)}', 'danger')
     
-    print("[DEBUG] Redirecting to dashboard")
     return redirect(url_for('admin.dashboard'))
 
+@admin_bp.route('/jobs/<int:job_id>')
+@login_required
+@admin_required
+def job_status(job_id):
+    job = BackgroundJob.query.get_or_404(job_id)
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+@admin_bp.route('/storage/collect', methods=['POST'])
+@login_required
+@admin_required
+def collect_storage():
+    submit_job('storage_gc', collect_storage_garbage, created_by_id=current_user.id)
+    flash('Storage cleanup has started in the background.', 'success')
+    return redirect(url_for('admin.dashboard'))
+
+@admin_bp.route('/metrics')
+@login_required
+@admin_required
+def sql_metrics():
+    endpoints = endpoint_metrics.snapshot()
+    if request.args.get('format') == 'json':
+        return jsonify({'success': True, 'endpoints': endpoints})
+    return render_template('admin/metrics.html',
+                         endpoints=endpoints,
+                         slow_query_threshold=current_app.config.get('SLOW_QUERY_THRESHOLD_MS'),
+                         unread_notifications=get_unread_count(current_user.id))
+
+@admin_bp.route('/metrics/reset', methods=['POST'])
+@login_required
+@admin_required
+def reset_sql_metrics():
+    endpoint_metrics.reset()
+    flash('Query metrics have been reset', 'success')
+    return redirect(url_for('admin.sql_metrics'))
+
 @admin_bp.route('/admin/counsellor/<int:counsellor_id>/toggle-status', methods=['POST'])
 @login_required
 def toggle_counsellor_status(counsellor_id):
-    if not isinstance(current_user, Administrator):
+    if current_user.role != 'admin':
         flash('Unauthorized access', 'danger')
         return redirect(url_for('admin.dashboard'))
     
     counsellor = CareerCounsellor.query.get_or_404(counsellor_id)
+    counsellor_name = f'{counsellor.first_name} {counsellor.last_name}'
     
     try:
-        # Begin transaction
-        db.session.begin_nested()
-        
-        # Toggle counsellor status
-        new_status = not counsellor.availability_status
-        counsellor.availability_status = new_status
-        
-        if not new_status:  # Deactivating counsellor
-            # Get the replacement counsellor ID from form
-            new_counsellor_id = request.form.get('new_counsellor_id')
-            
-            if not new_counsellor_id:
-                flash('Please select a replacement counsellor', 'danger')
-                return redirect(url_for('admin.dashboard'))
-            
-            new_counsellor = CareerCounsellor.query.get(new_counsellor_id)
-            if not new_counsellor or not new_counsellor.availability_status:
+        if counsellor.availability_status:  # Deactivating counsellor
+            # Students are spread over the selected counsellors, or over all active ones
+            target_ids = [int(target_id) for target_id in request.form.getlist('new_counsellor_id') if target_id]
+            active_ids = {target_id for (target_id,) in db.session.query(CareerCounsellor.id).filter(
+                CareerCounsellor.availability_status.is_(True),
+                CareerCounsellor.id != counsellor_id
+            )}
+            if target_ids and not set(target_ids) <= active_ids:
                 flash('Invalid replacement counsellor selected', 'danger')
                 return redirect(url_for('admin.dashboard'))
+            target_ids = target_ids or sorted(active_ids)
+            if not target_ids:
+                flash('There is no active counsellor to take over this counsellor\'s students', 'danger')
+                return redirect(url_for('admin.dashboard'))
             
-            # Count students before reassignment
-            students_count = Student.query.filter_by(counsellor_id=counsellor_id).count()
-            
-            # Reassign all students to the new counsellor
-            update_result = Student.query.filter_by(counsellor_id=counsellor_id).update({'counsellor_id': new_counsellor_id})
-            
-            # Get and reassign future appointments
-            future_appointments = Appointment.query.filter(
-                Appointment.counsellor_id == counsellor_id,
-                Appointment.appointment_date >= datetime.now().date(),
-                Appointment.status == 'scheduled'
-            ).all()
-            
-            for appointment in future_appointments:
-                # Create notification for student
-                notification = Notification(
-                    user_id=appointment.student_id,
-                    message=f'Your appointment on {appointment.appointment_date} has been reassigned to {new_counsellor.first_name} {new_counsellor.last_name} due to counsellor unavailability.',
-                    notification_type='appointment',
-                    related_entity_id=appointment.id
-                )
-                db.session.add(notification)
-                
-                # Update appointment
-                appointment.counsellor_id = new_counsellor_id
-            
-            # Reassign pending appointment requests
-            pending_requests_count = AppointmentRequest.query.filter_by(
-                counsellor_id=counsellor_id,
-                status='pending'
-            ).update({'counsellor_id': new_counsellor_id})
+            # Deactivate first so no new students are matched to them while the job runs
+            counsellor.availability_status = False
+            db.session.commit()
             
-            # Create notifications
-            # For new counsellor
-            new_counsellor_notification = Notification(
-                user_id=new_counsellor_id,
-                message=f'You have been assigned {students_count} students and {len(future_appointments)} appointments from {counsellor.first_name} {counsellor.last_name} who is now unavailable.',
-                notification_type='general',
-                related_entity_id=counsellor_id
+            job_id = submit_job(
+                'offboard_counsellor', offboard_counsellor_job,
+                counsellor_id, target_ids, current_app.config.get('COUNSELLOR_CAPACITY'),
+                created_by_id=current_user.id
             )
-            db.session.add(new_counsellor_notification)
-            
-            # For reassigned students
-            reassigned_students = Student.query.filter_by(counsellor_id=new_counsellor_id).all()
-            for student in reassigned_students:
-                student_notification = Notification(
-                    user_id=student.id,
-                    message=f'Your counsellor has been changed to {new_counsellor.first_name} {new_counsellor.last_name} as your previous counsellor is no longer available.',
-                    notification_type='general',
-                    related_entity_id=new_counsellor_id
-                )
-                db.session.add(student_notification)
-            
-            success_message = f'Counsellor {counsellor.first_name} {counsellor.last_name} has been deactivated. '
-            success_message += f'Transferred {students_count} students, {len(future_appointments)} appointments, '
-            success_message += f'and {pending_requests_count} pending requests to {new_counsellor.first_name} {new_counsellor.last_name}.'
-            flash(success_message, 'success')
+            flash(f'Counsellor {counsellor_name} has been deactivated. Their students, appointments and '
+                  f'pending requests are being transferred in the background (job #{job_id}).', 'success')
         else:
-            flash(f'Counsellor {counsellor.first_name} {counsellor.last_name} has been activated.', 'success')
-        
-        # Commit all changes
-        db.session.commit()
+            counsellor.availability_status = True
+            db.session.commit()
+            flash(f'Counsellor {counsellor_name} has been activated.', 'success')
         
     except Exception as e:
         db.session.rollback()
@@ -538,52 +584,52 @@ def toggle_counsellor_status(counsellor_id):
 @admin_bp.route('/admin/student/<int:student_id>/reassign-counsellor', methods=['POST'])
 @login_required
 def reassign_student_counsellor(student_id):
-    print(f"[DEBUG] Starting counsellor reassignment for student_id: {student_id}")
+    current_app.logger.debug('Starting counsellor reassignment for student_id: %s', student_id)
     
-    if not isinstance(current_user, Administrator):
-        print("[DEBUG] Unauthorized access attempt - not an administrator")
+    if current_user.role != 'admin':
+        current_app.logger.warning('Unauthorized access attempt by %s', current_user.get_id())
         flash('Unauthorized access', 'danger')
         return redirect(url_for('admin.dashboard'))
     
     student = Student.query.get_or_404(student_id)
-    print(f"[DEBUG] Found student: {student.first_name} {student.last_name}")
+    current_app.logger.debug('Found student: %s %s', student.first_name, student.last_name)
     
     new_counsellor_id = request.form.get('new_counsellor_id')
-    print(f"[DEBUG] Requested new counsellor_id: {new_counsellor_id}")
+    current_app.logger.debug('Requested new counsellor_id: %s', new_counsellor_id)
     
     if not new_counsellor_id:
-        print("[DEBUG] Error: No new counsellor selected")
+        current_app.logger.debug('Error: No new counsellor selected')
         flash('Please select a new counsellor', 'danger')
         return redirect(url_for('admin.dashboard'))
     
     try:
         # Begin transaction
-        print("[DEBUG] Starting nested transaction")
+        current_app.logger.debug('Starting nested transaction')
         db.session.begin_nested()
         
         # Get the new counsellor
         new_counsellor = CareerCounsellor.query.get(new_counsellor_id)
         if not new_counsellor or not new_counsellor.availability_status:
-            print(f"[DEBUG] Error: Invalid counsellor or unavailable. Found: {new_counsellor}, Status: {new_counsellor.availability_status if new_counsellor else 'None'}")
+            current_app.logger.debug('Error: Invalid counsellor or unavailable. Found: %s, Status: %s', new_counsellor, new_counsellor.availability_status if new_counsellor else 'None')
             flash('Invalid counsellor selected', 'danger')
             return redirect(url_for('admin.dashboard'))
         
-        print(f"[DEBUG] New counsellor found: {new_counsellor.first_name} {new_counsellor.last_name}")
+        current_app.logger.debug('New counsellor found: %s %s', new_counsellor.first_name, new_counsellor.last_name)
         
         # Store old counsellor info for reference
         old_counsellor = student.counsellor
-        print(f"[DEBUG] Current counsellor: {old_counsellor.first_name} {old_counsellor.last_name if old_counsellor else 'None'}")
+        current_app.logger.debug('Current counsellor: %s', old_counsellor.id if old_counsellor else None)
         
         # Update student's counsellor
         student.counsellor_id = new_counsellor_id
-        print("[DEBUG] Updated student's counsellor_id")
+        current_app.logger.debug('Updated student\'s counsellor_id')
         
         try:
             # Create notifications - only for student since notifications table is linked to students
-            print("[DEBUG] Creating notifications")
+            current_app.logger.debug('Creating notifications')
             
             # For student - notifying about new counsellor
-            print(f"[DEBUG] Creating notification for student with ID: {student.id}")
+            current_app.logger.debug('Creating notification for student with ID: %s', student.id)
             student_notification = Notification(
                 user_id=int(student.id),
                 message=f'You have been assigned to a new counsellor: {new_counsellor.first_name} {new_counsellor.last_name}.',
@@ -591,28 +637,28 @@ def reassign_student_counsellor(student_id):
                 related_entity_id=new_counsellor.id
             )
             db.session.add(student_notification)
-            print("[DEBUG] Added notification for student about new counsellor")
+            current_app.logger.debug('Added notification for student about new counsellor')
             
             # Note: We'll handle counsellor notifications through a different mechanism
-            print("[DEBUG] Note: Counsellor notifications will be handled through email/dashboard updates")
+            current_app.logger.debug('Note: Counsellor notifications will be handled through email/dashboard updates')
             
         except Exception as notification_error:
-            print(f"[DEBUG] Error creating notifications: {str(notification_error)}")
+            current_app.logger.debug('Error creating notifications: %s', notification_error)
             raise
         
         try:
             # Reassign future appointments
-            print("[DEBUG] Processing future appointments")
+            current_app.logger.debug('Processing future appointments')
             future_appointments = Appointment.query.filter(
                 Appointment.student_id == student_id,
                 Appointment.appointment_date >= datetime.now().date(),
                 Appointment.status == 'scheduled'
             ).all()
             
-            print(f"[DEBUG] Found {len(future_appointments)} future appointments to reassign")
+            current_app.logger.debug('Found %s future appointments to reassign', len(future_appointments))
             
             for appointment in future_appointments:
-                print(f"[DEBUG] Processing appointment ID: {appointment.id} on {appointment.appointment_date}")
+                current_app.logger.debug('Processing appointment ID: %s on %s', appointment.id, appointment.appointment_date)
                 # Create notification for student about appointment reassignment
                 appointment_notification = Notification(
                     user_id=int(student.id),
@@ -624,28 +670,28 @@ def reassign_student_counsellor(student_id):
                 
                 # Update appointment
                 appointment.counsellor_id = new_counsellor_id
-                print(f"[DEBUG] Updated appointment ID: {appointment.id} to new counsellor")
+                current_app.logger.debug('Updated appointment ID: %s to new counsellor', appointment.id)
             
         except Exception as appointment_error:
-            print(f"[DEBUG] Error processing appointments: {str(appointment_error)}")
+            current_app.logger.debug('Error processing appointments: %s', appointment_error)
             raise
         
         try:
             # Reassign pending appointment requests
-            print("[DEBUG] Processing pending appointment requests")
+            current_app.logger.debug('Processing pending appointment requests')
             pending_requests = AppointmentRequest.query.filter_by(
                 student_id=student_id,
                 status='pending'
             ).update({'counsellor_id': new_counsellor_id})
-            print(f"[DEBUG] Updated {pending_requests} pending appointment requests")
+            current_app.logger.debug('Updated %s pending appointment requests', pending_requests)
             
         except Exception as request_error:
-            print(f"[DEBUG] Error updating appointment requests: {str(request_error)}")
+            current_app.logger.debug('Error updating appointment requests: %s', request_error)
             raise
         
-        print("[DEBUG] Committing all changes")
+        current_app.logger.debug('Committing all changes')
         db.session.commit()
-        print("[DEBUG] Successfully committed all changes")
+        current_app.logger.debug('Successfully committed all changes')
         
         flash(f'Successfully reassigned {student.first_name} {student.last_name} to counsellor {new_counsellor.first_name} {new_counsellor.last_name}', 'success')
         
@@ -654,98 +700,93 @@ def reassign_student_counsellor(student_id):
         # or by modifying the notifications table to support both user types
         
     except Exception as e:
-        print(f"[DEBUG] Error occurred: {str(e)}")
-        print("[DEBUG] Rolling back transaction")
+        current_app.logger.exception('Reassigning the counsellor of student %s failed', student_id)
         db.session.rollback()
         flash(f'Error reassigning counsellor: {str(e)}', 'danger')
     
-    print("[DEBUG] Redirecting to dashboard")
+    current_app.logger.debug('Redirecting to dashboard')
     return redirect(url_for('admin.dashboard'))
 
 @admin_bp.route('/admin/events/<int:event_id>/delete', methods=['POST'])
 @login_required
 def delete_event(event_id):
-    print(f"[DEBUG] Starting event deletion for event_id: {event_id}")
+    current_app.logger.debug('Starting event deletion for event_id: %s', event_id)
     
-    if not isinstance(current_user, Administrator):
-        print("[DEBUG] Unauthorized access attempt - not an administrator")
+    if current_user.role != 'admin':
+        current_app.logger.warning('Unauthorized access attempt by %s', current_user.get_id())
         flash('Unauthorized access', 'danger')
         return redirect(url_for('admin.dashboard'))
     
     try:
         # Begin transaction
-        print("[DEBUG] Starting nested transaction")
+        current_app.logger.debug('Starting nested transaction')
         db.session.begin_nested()
         
         # Get the event
         event = Event.query.get_or_404(event_id)
-        print(f"[DEBUG] Found event: {event.title} on {event.event_date}")
-        
-        # Get all registrations for this event
-        registrations = EventRegistration.query.filter_by(event_id=event_id).all()
-        registered_students = [reg.student_id for reg in registrations]
-        print(f"[DEBUG] Found {len(registrations)} registrations to process")
+        current_app.logger.debug('Found event: %s on %s', event.title, event.event_date)
         
         try:
-            # Delete all registrations first
-            if registered_students:
-                # Create notifications for registered students
-                for student_id in registered_students:
-                    notification = Notification(
-                        user_id=int(student_id),
-                        message=f'The event "{event.title}" scheduled for {event.event_date.strftime("%B %d, %Y")} has been cancelled.',
-                        notification_type='general',
-                        related_entity_id=event_id
-                    )
-                    db.session.add(notification)
-                print(f"[DEBUG] Created notifications for {len(registered_students)} students")
-                
-                # Delete registrations
-                deleted_registrations = EventRegistration.query.filter_by(event_id=event_id).delete()
-                print(f"[DEBUG] Deleted {deleted_registrations} event registrations")
+            # Registered and waitlisted students are notified by the outbox
+            # worker; the database copies their ids before the rows go
+            enqueue(
+                'event_cancelled',
+                recipients=union(
+                    select(EventRegistration.student_id).where(
+                        EventRegistration.event_id == event_id,
+                        EventRegistration.student_id.isnot(None)
+                    ),
+                    select(EventWaitlist.student_id).where(EventWaitlist.event_id == event_id)
+                ),
+                event_id=event_id,
+                title=event.title,
+                event_date=event.event_date.isoformat()
+            )
+            
+            # Delete registrations
+            deleted_registrations = EventRegistration.query.filter_by(event_id=event_id).delete()
+            EventWaitlist.query.filter_by(event_id=event_id).delete()
+            current_app.logger.debug('Deleted %s event registrations', deleted_registrations)
         
         except Exception as reg_error:
-            print(f"[DEBUG] Error processing registrations: {str(reg_error)}")
+            current_app.logger.debug('Error processing registrations: %s', reg_error)
             raise
         
         try:
             # Delete the event
             db.session.delete(event)
-            print("[DEBUG] Deleted event")
+            current_app.logger.debug('Deleted event')
             
         except Exception as event_error:
-            print(f"[DEBUG] Error deleting event: {str(event_error)}")
+            current_app.logger.debug('Error deleting event: %s', event_error)
             raise
         
         # Commit all changes
-        print("[DEBUG] Committing all changes")
+        current_app.logger.debug('Committing all changes')
         db.session.commit()
-        print("[DEBUG] Successfully committed all changes")
+        current_app.logger.debug('Successfully committed all changes')
         
         flash(f'Successfully deleted event "{event.title}" and all related registrations.', 'success')
         
     except Exception as e:
-        print(f"[DEBUG] Error occurred: {str(e)}")
-        print("[DEBUG] Rolling back transaction")
+        current_app.logger.exception('Deleting event %s failed', event_id)
         db.session.rollback()
         flash(f'Error deleting event: {str(e)}', 'danger')
     
-    print("[DEBUG] Redirecting to dashboard")
+    current_app.logger.debug('Redirecting to dashboard')
     return redirect(url_for('admin.dashboard'))
 
 @admin_bp.route('/admin/events/create', methods=['GET', 'POST'])
 @login_required
 @admin_required
 def create_event():
-    print("[DEBUG] Starting create_event route")
-    print(f"[DEBUG] Request method: {request.method}")
+    current_app.logger.debug('Starting create_event route')
+    current_app.logger.debug('Request method: %s', request.method)
     
     if request.method == 'POST':
         try:
             # Log form data
-            print("[DEBUG] Form data received:")
-            for key, value in request.form.items():
-                print(f"[DEBUG] {key}: {value}")
+            current_app.logger.debug('Form data received: %s', request.form)
             
             # Get form data
             title = request.form.get('title')
@@ -757,11 +798,7 @@ def create_event():
             event_type = request.form.get('event_type')
             max_participants = request.form.get('max_participants')
             
-            print(f"[DEBUG] Parsed values:")
-            print(f"[DEBUG] Title: {title}")
-            print(f"[DEBUG] Event date string: {event_date_str}")
-            print(f"[DEBUG] Start time string: {start_time_str}")
-            print(f"[DEBUG] End time string: {end_time_str}")
+            current_app.logger.debug('Creating event %r on %s from %s to %s', title, event_date_str, start_time_str, end_time_str)
             
             # Parse date and times
             try:
@@ -769,12 +806,9 @@ def create_event():
                 start_time = datetime.strptime(start_time_str, '%H:%M').time()
                 end_time = datetime.strptime(end_time_str, '%H:%M').time()
                 
-                print(f"[DEBUG] Parsed date/times:")
-                print(f"[DEBUG] Event date: {event_date}")
-                print(f"[DEBUG] Start time: {start_time}")
-                print(f"[DEBUG] End time: {end_time}")
+                current_app.logger.debug('Parsed event date %s, start %s, end %s', event_date, start_time, end_time)
             except ValueError as e:
-                print(f"[DEBUG] Error parsing date/time: {str(e)}")
+                current_app.logger.warning('Error parsing event date/time: %s', e)
                 raise
             
             # Convert max_participants to int if provided
@@ -782,11 +816,11 @@ def create_event():
             if max_participants:
                 try:
                     capacity = int(max_participants)
-                    print(f"[DEBUG] Capacity: {capacity}")
+                    current_app.logger.debug('Capacity: %s', capacity)
                 except ValueError:
-                    print("[DEBUG] Error converting max_participants to int")
+                    current_app.logger.warning('Ignoring invalid max_participants %r', max_participants)
             
-            print("[DEBUG] Creating new event object")
+            current_app.logger.debug('Creating new event object')
             # Create new event
             new_event = Event(
                 title=title,
@@ -801,29 +835,25 @@ def create_event():
                 counsellor_id=None  # Optional: Set this if you want to assign a counsellor
             )
             
-            print("[DEBUG] Adding event to session")
+            current_app.logger.debug('Adding event to session')
             db.session.add(new_event)
             
-            print("[DEBUG] Committing to database")
+            current_app.logger.debug('Committing to database')
             db.session.commit()
             
-            print("[DEBUG] Event created successfully")
+            current_app.logger.debug('Event created successfully')
             flash('Event created successfully!', 'success')
             return redirect(url_for('admin.dashboard'))
             
         except Exception as e:
-            print(f"[DEBUG] Error creating event: {str(e)}")
-            print(f"[DEBUG] Error type: {type(e)}")
-            import traceback
-            print("[DEBUG] Full traceback:")
-            print(traceback.format_exc())
+            current_app.logger.exception('Creating event failed')
             
             db.session.rollback()
             flash(f'Error creating event: {str(e)}', 'danger')
             return redirect(url_for('admin.create_event'))
     
     # GET request - render the create event form
-    print("[DEBUG] GET request - rendering form")
+    current_app.logger.debug('GET request - rendering form')
     today = datetime.now().strftime('%Y-%m-%d')
     return render_template('admin/create_event.html', today=today)
 
@@ -831,27 +861,30 @@ def create_event():
 @login_required
 @admin_required
 def handle_appointment_request(request_id, action):
-    print(f"[DEBUG] Handling appointment request {request_id} with action {action}")
+    current_app.logger.debug('Handling appointment request %s with action %s', request_id, action)
     
     if action not in ['approve', 'reject']:
-        print(f"[DEBUG] Invalid action: {action}")
+        current_app.logger.warning('Invalid appointment request action: %s', action)
         flash('Invalid action', 'danger')
         return redirect(url_for('admin.dashboard'))
     
     try:
         request = AppointmentRequest.query.get_or_404(request_id)
-        print(f"[DEBUG] Found request: {request}")
+        current_app.logger.debug('Found request: %s', request)
         
         if action == 'approve':
-            print("[DEBUG] Approving request")
+            current_app.logger.debug('Approving request')
+            end_time = reserve_slot(request.counsellor_id, request.preferred_date, request.preferred_time)
+            
             # Create new appointment
             appointment = Appointment(
                 student_id=request.student_id,
                 counsellor_id=request.counsellor_id,
                 appointment_date=request.preferred_date,
                 start_time=request.preferred_time,
-                end_time=(datetime.combine(request.preferred_date, request.preferred_time) + timedelta(hours=1)).time(),
+                end_time=end_time,
                 appointment_type=request.appointment_type,
+                mode=request.mode,
                 status='scheduled'
             )
             db.session.add(appointment)
@@ -876,7 +909,7 @@ def handle_appointment_request(request_id, action):
             
             flash('Appointment request approved and scheduled', 'success')
         else:
-            print("[DEBUG] Rejecting request")
+            current_app.logger.debug('Rejecting request')
             # Create rejection notification for student
             student_notification = Notification(
                 user_id=request.student_id,
@@ -891,10 +924,13 @@ def handle_appointment_request(request_id, action):
         # Delete the request
         db.session.delete(request)
         db.session.commit()
-        print("[DEBUG] Successfully processed request")
+        current_app.logger.debug('Successfully processed request')
         
+    except SlotUnavailable as e:
+        db.session.rollback()
+        flash(f'Cannot approve request: {str(e)}', 'danger')
     except Exception as e:
-        print(f"[DEBUG] Error processing request: {str(e)}")
+        current_app.logger.exception('Processing appointment request %s failed', request_id)
         db.session.rollback()
         flash(f'Error processing request: {str(e)}', 'danger')
     
@@ -1,11 +1,9 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_user, logout_user, login_required
-from models import Student, CareerCounsellor, Administrator
-from datetime import datetime
-from flask_sqlalchemy import SQLAlchemy
+from services.passwords import verify_password, needs_rehash, hash_password, HashingBusy
+from services.principal import find_account, record_login, principal_for_login
 
 auth_bp = Blueprint('auth', __name__)
-db = SQLAlchemy()
 
 @auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
@@ -13,39 +11,43 @@ def login():
         email = request.form.get('email', '').strip()
         password = request.form.get('password', '')
 
-        # Check if it's the admin email
-        if Administrator.is_admin_email(email):
-            user = Administrator.query.filter_by(email=email).first()
-            if user and user.check_password(password):
-                login_user(user)
-                user.last_login = datetime.utcnow()
-                db.session.commit()
-                return redirect(url_for('admin.dashboard'))
-            else:
+        # One query across the admin, student and counsellor tables
+        account = find_account(email)
+
+        if account is None:
+            flash('No account found with that email.', 'danger')
+            return render_template('auth/login.html')
+
+        role, user_id, password_hash, is_active = account
+
+        try:
+            verified = verify_password(password_hash, password)
+        except HashingBusy:
+            flash('Too many people are signing in right now. Please try again in a moment.', 'warning')
+            return render_template('auth/login.html'), 503
+
+        if not verified:
+            if role == 'admin':
                 flash('Invalid admin credentials.', 'danger')
-                return render_template('auth/login.html')
+            else:
+                flash('Incorrect password.', 'danger')
+            return render_template('auth/login.html')
 
-        # Try to find user in student or counsellor tables
-        user = Student.query.filter_by(email=email).first()
-        user_type = 'student'
-        
-        if not user:
-            user = CareerCounsellor.query.filter_by(email=email).first()
-            user_type = 'counsellor'
+        # Upgrade hashes made with an older algorithm or cost
+        try:
+            new_hash = hash_password(password) if needs_rehash(password_hash) else None
+        except HashingBusy:
+            # The upgrade is retried on the next sign in
+            new_hash = None
+        record_login(role, user_id, new_hash)
+        login_user(principal_for_login(role, user_id, is_active))
 
-        if user is None:
-            flash('No account found with that email.', 'danger')
-        elif not user.check_password(password):
-            flash('Incorrect password.', 'danger')
-        else:
-            user.last_login = datetime.utcnow()
-            db.session.commit()
-            
-            login_user(user)
-            if user_type == 'student':
-                return redirect(url_for('student.dashboard'))
-            elif user_type == 'counsellor':
-                return redirect(url_for('counsellor.dashboard'))
+        if role == 'admin':
+            return redirect(url_for('admin.dashboard'))
+        elif role == 'student':
+            return redirect(url_for('student.dashboard'))
+        elif role == 'counsellor':
+            return redirect(url_for('counsellor.dashboard'))
 
     return render_template('auth/login.html')
 
@@ -54,4 +56,4 @@ def login():
 def logout():
     logout_user()
     flash('Logged out successfully.', 'success')
-    return redirect(url_for('index')) 
\ No newline at end of file
+    return redirect(url_for('index')) 
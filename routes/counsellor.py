@@ -1,8 +1,10 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
-from models import CareerCounsellor, db, CounsellorSchedule, Student, Appointment, AppointmentRequest, CounsellingSession, Administrator, Notification
+from models import CareerCounsellor, db, CounsellorSchedule, Student, Appointment, AppointmentRequest, CounsellingSession, Administrator, Notification, StudentDocument
 from datetime import datetime, timedelta
 from functools import wraps
+from services.slots import reserve_slot, SlotUnavailable
+from services.thumbnails import has_preview, send_thumbnail
 from werkzeug.utils import secure_filename
 import os
 
@@ -11,7 +13,7 @@ counsellor_bp = Blueprint('counsellor', __name__, url_prefix='/counsellor')
 def counsellor_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if not current_user.is_authenticated or not current_user.get_id().startswith('counsellor-'):
+        if current_user.role != 'counsellor':
             flash('Access denied. Counsellor privileges required.', 'danger')
             return redirect(url_for('auth.login'))
         return f(*args, **kwargs)
@@ -96,40 +98,37 @@ def register():
 @counsellor_required
 def dashboard():
     # Get counsellor's ID from current_user
-    counsellor_id = int(current_user.get_id().split('-')[1])
+    counsellor_id = current_user.id
     
-    # Get statistics
-    stats = {
-        'total_students': len(current_user.students),
-        'upcoming_appointments': Appointment.query.filter(
-            Appointment.counsellor_id == counsellor_id,
-            Appointment.appointment_date >= datetime.now().date(),
-            Appointment.status == 'scheduled'
-        ).count(),
-        'pending_requests': AppointmentRequest.query.filter_by(
-            counsellor_id=counsellor_id,
-            status='pending'
-        ).count(),
-        'completed_sessions': CounsellingSession.query.join(Appointment).filter(
-            Appointment.counsellor_id == counsellor_id
-        ).count()
-    }
+    # Get assigned students
+    assigned_students = Student.query.filter_by(counsellor_id=counsellor_id).all()
     
     # Get upcoming appointments
-    upcoming_appointments = Appointment.query.filter(
+    upcoming_appointments = Appointment.query.options(
+        db.joinedload(Appointment.student)
+    ).filter(
         Appointment.counsellor_id == counsellor_id,
         Appointment.appointment_date >= datetime.now().date(),
         Appointment.status == 'scheduled'
     ).order_by(Appointment.appointment_date.asc(), Appointment.start_time.asc()).all()
     
     # Get pending appointment requests
-    appointment_requests = AppointmentRequest.query.filter_by(
+    appointment_requests = AppointmentRequest.query.options(
+        db.joinedload(AppointmentRequest.student)
+    ).filter_by(
         counsellor_id=counsellor_id,
         status='pending'
     ).order_by(AppointmentRequest.created_at.desc()).all()
     
-    # Get assigned students
-    assigned_students = Student.query.filter_by(counsellor_id=counsellor_id).all()
+    # Get statistics, counted from the lists above where possible
+    stats = {
+        'total_students': len(assigned_students),
+        'upcoming_appointments': len(upcoming_appointments),
+        'pending_requests': len(appointment_requests),
+        'completed_sessions': CounsellingSession.query.join(Appointment).filter(
+            Appointment.counsellor_id == counsellor_id
+        ).count()
+    }
     
     # Get counsellor's schedule
     schedule = CounsellorSchedule.query.filter_by(counsellor_id=counsellor_id).all()
@@ -152,13 +151,18 @@ def schedule_appointment():
         time = datetime.strptime(request.form.get('time'), '%H:%M').time()
         mode = request.form.get('mode')
         location = request.form.get('location')
+        counsellor_id = current_user.id
+        
+        # Holds the counsellor's lock until commit
+        end_time = reserve_slot(counsellor_id, date, time)
         
         # Create new appointment
         appointment = Appointment(
             student_id=student_id,
-            counsellor_id=int(current_user.get_id().split('-')[1]),
+            counsellor_id=counsellor_id,
             appointment_date=date,
             start_time=time,
+            end_time=end_time,
             mode=mode,
             status='scheduled'
         )
@@ -172,7 +176,11 @@ def schedule_appointment():
         db.session.commit()
         
         return jsonify({'success': True})
+    except SlotUnavailable as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 409
     except Exception as e:
+        db.session.rollback()
         return jsonify({'success': False, 'error': str(e)})
 
 @counsellor_bp.route('/appointments/<int:appointment_id>/cancel', methods=['POST'])
@@ -194,12 +202,16 @@ def approve_request(request_id):
     try:
         request = AppointmentRequest.query.get_or_404(request_id)
         
+        end_time = reserve_slot(request.counsellor_id, request.preferred_date, request.preferred_time)
+        
         # Create new appointment from request
         appointment = Appointment(
             student_id=request.student_id,
             counsellor_id=request.counsellor_id,
             appointment_date=request.preferred_date,
             start_time=request.preferred_time,
+            end_time=end_time,
+            appointment_type=request.appointment_type,
             mode=request.mode,
             status='scheduled'
         )
@@ -209,7 +221,11 @@ def approve_request(request_id):
         db.session.commit()
         
         return jsonify({'success': True})
+    except SlotUnavailable as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 409
     except Exception as e:
+        db.session.rollback()
         return jsonify({'success': False, 'error': str(e)})
 
 @counsellor_bp.route('/appointment-requests/<int:request_id>/reject', methods=['POST'])
@@ -229,16 +245,54 @@ def reject_request(request_id):
 @counsellor_required
 def view_student(student_id):
     student = Student.query.get_or_404(student_id)
-    if student.counsellor_id != int(current_user.get_id().split('-')[1]):
+    if student.counsellor_id != current_user.id:
         flash('Access denied. This student is not assigned to you.', 'danger')
         return redirect(url_for('counsellor.dashboard'))
     return render_template('counsellor/student_profile.html', student=student)
 
+def _assigned_student_or_404(student_id):
+    return Student.query.filter_by(
+        id=student_id,
+        counsellor_id=current_user.id
+    ).first_or_404()
+
+@counsellor_bp.route('/students/<int:student_id>/documents')
+@login_required
+@counsellor_required
+def student_documents(student_id):
+    student = _assigned_student_or_404(student_id)
+    documents = StudentDocument.query.filter_by(student_id=student.id).order_by(
+        StudentDocument.upload_date.desc()
+    ).all()
+    return jsonify({
+        'success': True,
+        'documents': [{
+            'id': doc.document_id,
+            'title': doc.title,
+            'document_type': doc.document_type,
+            'file_type': doc.file_type,
+            'upload_date': doc.upload_date.strftime('%Y-%m-%d %H:%M:%S'),
+            'thumbnail_url': url_for('counsellor.student_document_thumbnail',
+                                     student_id=student.id, doc_id=doc.document_id) if has_preview(doc) else None
+        } for doc in documents]
+    })
+
+@counsellor_bp.route('/students/<int:student_id>/documents/<int:doc_id>/thumbnail')
+@login_required
+@counsellor_required
+def student_document_thumbnail(student_id, doc_id):
+    student = _assigned_student_or_404(student_id)
+    document = StudentDocument.query.filter_by(
+        document_id=doc_id,
+        student_id=student.id
+    ).first_or_404()
+    return send_thumbnail(document) or ('', 404)
+
 @counsellor_bp.route('/schedule')
 @login_required
 @counsellor_required
 def edit_schedule():
-    counsellor_id = int(current_user.get_id().split('-')[1])
+    counsellor_id = current_user.id
     schedule = CounsellorSchedule.query.filter_by(counsellor_id=counsellor_id).all()
     return render_template('counsellor/schedule.html', schedule=schedule)
 
@@ -250,7 +304,7 @@ def complete_appointment(appointment_id):
         # Get the appointment
         appointment = Appointment.query.filter_by(
             id=appointment_id,
-            counsellor_id=int(current_user.get_id().split('-')[1]),
+            counsellor_id=current_user.id,
             status='scheduled'
         ).first_or_404()
         
@@ -284,7 +338,7 @@ def complete_appointment(appointment_id):
 @counsellor_required
 def update_schedule():
     try:
-        counsellor_id = int(current_user.get_id().split('-')[1])
+        counsellor_id = current_user.id
         
         # Delete existing schedule
         CounsellorSchedule.query.filter_by(counsellor_id=counsellor_id).delete()
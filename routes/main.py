@@ -1,5 +1,5 @@
 from flask import Blueprint, render_template
-from models import Event
+from services.event_listing import upcoming_events, conditional_response
 from datetime import datetime
 
 # Create Blueprint without a URL prefix
@@ -15,11 +15,10 @@ def about():
 
 @main_bp.route('/events')
 def events():
-    # Get all upcoming events ordered by date and time
-    upcoming_events = Event.query.filter(
-        Event.event_date >= datetime.now().date()
-    ).order_by(Event.event_date, Event.start_time).all()
-    
-    return render_template('events.html', 
-                         events=upcoming_events,
-                         now=datetime.now()) 
\ No newline at end of file
+    # Upcoming events come from the shared listing, unchanged pages are answered with 304
+    listing = upcoming_events.get()
+    return conditional_response(
+        listing.etag,
+        lambda: render_template('events.html', events=listing.events, now=datetime.now()),
+        last_modified=listing.last_modified
+    )
@@ -1,12 +1,23 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, send_from_directory
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, Response, make_response
 from flask_login import login_required, current_user
 from werkzeug.security import generate_password_hash
-from models import Student, db, Notification, CareerGoal, GoalMilestone, Task, StudentDocument, Grievance, Event, EventRegistration, Message, Appointment, CounsellorSchedule, CareerCounsellor, AppointmentRequest
+from models import Student, db, Notification, CareerGoal, GoalMilestone, Task, StudentDocument, DocumentUpload, Grievance, Event, EventRegistration, Message, Appointment, CounsellorSchedule, CareerCounsellor, AppointmentRequest
 from datetime import datetime, timedelta, time
 from sqlalchemy import desc, func
 from werkzeug.utils import secure_filename
-import os
-import uuid
+import hashlib
+from time import perf_counter
+from services.matching import matcher
+from services.notification_stream import broker, stream_events, publish_after_commit
+from services.unread_counters import get_unread_count, mark_all_read
+from services.slots import reserve_slot, SlotUnavailable
+from services.availability import find_available_slots
+from services.event_listing import upcoming_events as upcoming_event_listing, registration_flags, conditional_response
+from services.dashboard import load_student_dashboard, server_timing
+from services.registrations import register_student, cancel_registration, AlreadyRegistered
+from services.document_store import store_upload, blob_path, send_document, release_document, check_quota, StorageQuotaExceeded
+from services.thumbnails import schedule_thumbnail, send_thumbnail, has_preview
+from services.chunked_uploads import start_upload, lock_upload, upload_status, save_chunk, complete_upload, discard_chunks, expire_uploads, UploadError
 
 student_bp = Blueprint('student', __name__)
 
@@ -16,68 +27,16 @@ def assign_counsellor(student_interests):
     Args:
         student_interests: Comma-separated string of student interests
     Returns:
-        The counsellor_id of the best matching counsellor, or None if no match found
+        The counsellor_id of the best matching counsellor, or None if no counsellor is available
     """
-    # Get all active counsellors
-    available_counsellors = CareerCounsellor.query.filter_by(availability_status=True).all()
-    
-    if not available_counsellors:
-        return None
-        
-    # Convert student interests to a list and clean them
-    interests = [interest.strip().lower() for interest in student_interests.split(',')]
-    
-    # Find best matching counsellor based on specialization
-    best_match_score = 0
-    selected_counsellor = None
-    
-    # Define specialization categories and related keywords
-    specialization_keywords = {
-        'Technology': ['technology', 'computer', 'it', 'software', 'programming', 'tech'],
-        'Healthcare': ['healthcare', 'medical', 'medicine', 'health', 'nursing'],
-        'Business': ['business', 'finance', 'management', 'entrepreneurship', 'marketing'],
-        'Engineering': ['engineering', 'mechanical', 'civil', 'electrical', 'electronics'],
-        'Arts': ['arts', 'creative', 'design', 'music', 'fine arts', 'media'],
-        'Science': ['science', 'physics', 'chemistry', 'biology', 'research'],
-        'Education': ['education', 'teaching', 'training', 'academic'],
-        'Law': ['law', 'legal', 'justice', 'advocacy']
-    }
-    
-    for counsellor in available_counsellors:
-        match_score = 0
-        counsellor_specialization = counsellor.specialization.lower()
-        
-        # Check each student interest against counsellor's specialization and related keywords
-        for interest in interests:
-            # Direct match with specialization
-            if interest in counsellor_specialization:
-                match_score += 2  # Give higher weight to direct matches
-                continue
-            
-            # Check against specialization keywords
-            for spec, keywords in specialization_keywords.items():
-                if spec.lower() == counsellor_specialization:
-                    if any(keyword in interest for keyword in keywords):
-                        match_score += 1
-                        break
-        
-        # Update best match if this counsellor has a better score
-        if match_score > best_match_score:
-            best_match_score = match_score
-            selected_counsellor = counsellor
-    
-    # If no matches found, assign the counsellor with highest rating
-    if not selected_counsellor and available_counsellors:
-        selected_counsellor = max(available_counsellors, key=lambda c: c.rating)
-    
-    return selected_counsellor.id if selected_counsellor else None
+    return matcher.match(student_interests)
 
 @student_bp.route('/student/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         try:
             # Get form data with debug prints
-            print("Starting registration process...")
+            current_app.logger.debug('Starting registration process...')
             first_name = request.form.get('first_name')
             last_name = request.form.get('last_name')
             email = request.form.get('email')
@@ -88,7 +47,7 @@ def register():
             interests = request.form.getlist('interests')
             password = request.form.get('password')
 
-            print(f"Received data: {first_name=}, {last_name=}, {email=}, {interests=}")
+            current_app.logger.debug('Received data: first_name=%s, last_name=%s, email=%s, interests=%s', first_name, last_name, email, interests)
 
             # Validate required fields
             if not all([first_name, last_name, email, password, dob_str]):
@@ -99,7 +58,7 @@ def register():
             try:
                 dob = datetime.strptime(dob_str, '%Y-%m-%d').date()
             except ValueError as e:
-                print(f"DOB parsing error: {e}")
+                current_app.logger.warning('DOB parsing error: %s', e)
                 flash('Invalid date format for date of birth', 'danger')
                 return render_template('student/register.html')
 
@@ -111,11 +70,11 @@ def register():
 
             # Convert interests list to comma-separated string
             interests_str = ','.join(interests) if interests else ''
-            print(f"Interests string: {interests_str}")
+            current_app.logger.debug('Interests string: %s', interests_str)
             
             # Assign a counsellor based on interests
             counsellor_id = assign_counsellor(interests_str)
-            print(f"Assigned counsellor ID: {counsellor_id}")
+            current_app.logger.debug('Assigned counsellor ID: %s', counsellor_id)
 
             # Create new student
             student = Student(
@@ -133,12 +92,12 @@ def register():
             
             # Set password
             student.set_password(password)
-            print("Student object created, attempting database save...")
+            current_app.logger.debug('Student object created, attempting database save...')
 
             # Add to database
             db.session.add(student)
             db.session.commit()
-            print(f"Student saved to database with ID: {student.id}")
+            current_app.logger.debug('Student saved to database with ID: %s', student.id)
 
             # Create notification for assigned counsellor
             if counsellor_id:
@@ -151,9 +110,9 @@ def register():
                     )
                     db.session.add(notification)
                     db.session.commit()
-                    print("Counsellor notification created")
+                    current_app.logger.debug('Counsellor notification created')
                 except Exception as notif_error:
-                    print(f"Notification creation error: {notif_error}")
+                    current_app.logger.warning('Notification creation error: %s', notif_error)
                     # Continue even if notification fails
                     pass
 
@@ -165,10 +124,7 @@ def register():
 
         except Exception as e:
             db.session.rollback()
-            print(f"Registration error: {str(e)}")
-            print(f"Error type: {type(e)}")
-            import traceback
-            print(f"Traceback: {traceback.format_exc()}")
+            current_app.logger.exception('Student registration failed')
             flash('An error occurred during registration. Please try again.', 'danger')
             return render_template('student/register.html')
 
@@ -240,10 +196,7 @@ def manage_milestones(goal_id):
         return redirect(url_for('student.manage_milestones', goal_id=goal_id))
     
     # Get unread notifications count
-    unread_notifications = Notification.query.filter_by(
-        user_id=current_user.id,
-        read_status=False
-    ).count()
+    unread_notifications = get_unread_count(current_user.id)
     
     milestones = GoalMilestone.query.filter_by(goal_id=goal_id).order_by(GoalMilestone.due_date.asc()).all()
     return render_template('student/milestones.html', 
@@ -440,19 +393,19 @@ def manage_documents():
             return jsonify({'error': 'No file provided'}), 400
         
         try:
-            # Save file to appropriate location
-            filename = secure_filename(file.filename)
-            file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-            file.save(file_path)
-            
+            sha256, _ = store_upload(file.stream)
             document = StudentDocument(
                 student_id=current_user.id,
                 title=title,
                 document_type=document_type,
-                file_path=file_path
+                file_path=blob_path(sha256),
+                file_name=secure_filename(file.filename),
+                blob_sha256=sha256,
+                file_type=get_file_type(file.filename)
             )
             db.session.add(document)
             db.session.commit()
+            schedule_thumbnail(document)
             
             return jsonify({'message': 'Document uploaded successfully'}), 201
         except Exception as e:
@@ -463,10 +416,12 @@ def manage_documents():
     documents = StudentDocument.query.filter_by(student_id=current_user.id).all()
     return jsonify({
         'documents': [{
+            'id': doc.document_id,
             'title': doc.title,
             'document_type': doc.document_type,
             'upload_date': doc.upload_date.isoformat(),
-            'file_path': doc.file_path
+            'file_path': doc.file_path,
+            'thumbnail_url': url_for('student.document_thumbnail', doc_id=doc.document_id) if has_preview(doc) else None
         } for doc in documents]
     })
 
@@ -509,15 +464,13 @@ def manage_grievances():
 @student_bp.route('/student/events', methods=['GET'])
 @login_required
 def view_events():
-    # Get upcoming events
-    upcoming_events = Event.query.filter(
-        Event.event_date >= datetime.now().date()
-    ).order_by(Event.event_date.asc()).all()
+    listing = upcoming_event_listing.get()
     
-    # Get student's registrations
-    registrations = {r.event_id: r for r in EventRegistration.query.filter_by(student_id=current_user.id).all()}
+    # Only the student's own flags are looked up, the list itself is shared
+    registered, waitlisted = registration_flags(current_user.id, [event.event_id for event in listing.events])
+    etag = f'{listing.etag}-{hashlib.sha1(repr((sorted(registered), sorted(waitlisted))).encode()).hexdigest()}'
     
-    return jsonify({
+    return conditional_response(etag, lambda: jsonify({
         'events': [{
             'event_id': event.event_id,
             'title': event.title,
@@ -529,74 +482,44 @@ def view_events():
             'location': event.location,
             'is_online': event.is_online,
             'capacity': event.capacity,
-            'registration': bool(registrations.get(event.event_id))
-        } for event in upcoming_events]
-    })
+            'registered_count': event.registered_count,
+            'registration': event.event_id in registered,
+            'waitlisted': event.event_id in waitlisted
+        } for event in listing.events]
+    }), private=True)
 
 @student_bp.route('/student/events/<int:event_id>/register', methods=['POST'])
 @login_required
 def register_for_event(event_id):
-    print("\n=== Debug: Processing Event Registration ===")
-    print(f"Event ID: {event_id}")
-    print(f"Student ID: {current_user.id}")
-    
     event = Event.query.get_or_404(event_id)
-    print(f"Event found: {event.title}")
-    print(f"Event capacity: {event.capacity}")
     
     # Check if event date has passed
     if event.event_date < datetime.now().date():
-        print("Error: Cannot register for past events")
         return jsonify({'error': 'Cannot register for past events'}), 400
     
-    # Check if already registered
-    existing_registration = EventRegistration.query.filter_by(
-        event_id=event_id,
-        student_id=current_user.id
-    ).first()
-    
-    if existing_registration:
-        print("Error: Already registered for this event")
-        return jsonify({'error': 'Already registered for this event'}), 400
-    
-    # Check event capacity if it's set
-    if event.capacity is not None:
-        current_registrations = EventRegistration.query.filter_by(event_id=event_id).count()
-        print(f"Current registrations: {current_registrations}")
-        print(f"Event capacity: {event.capacity}")
-        
-        if current_registrations >= event.capacity:
-            print("Error: Event is at full capacity")
-            return jsonify({'error': 'Event is at full capacity'}), 400
-    else:
-        print("Note: Event has no capacity limit")
-    
     try:
-        # Create registration
-        registration = EventRegistration(
-            event_id=event_id,
-            student_id=current_user.id,
-            registered_at=datetime.now(),
-            attendance_status='registered'
-        )
-        db.session.add(registration)
+        # Seats are claimed atomically, a full event puts the student on the waitlist
+        status = register_student(event_id, current_user.id)
+        
+        if status == 'registered':
+            message = f'You have successfully registered for {event.title} on {event.event_date.strftime("%B %d, %Y")}.'
+        else:
+            message = f'{event.title} is full. You are on the waitlist and will be registered automatically if a seat opens up.'
         
         # Create notification for student
         notification = Notification(
             user_id=current_user.id,
-            message=f'You have successfully registered for {event.title} on {event.event_date.strftime("%B %d, %Y")}.',
+            message=message,
             notification_type='general',
             related_entity_id=event.event_id,
             created_at=datetime.now()
         )
         db.session.add(notification)
-        
-        print("Committing to database...")
         db.session.commit()
-        print("Successfully registered for event")
         
         return jsonify({
-            'message': 'Successfully registered for event',
+            'message': 'Successfully registered for event' if status == 'registered' else 'Event is full, you have been added to the waitlist',
+            'status': status,
             'event': {
                 'event_id': event.event_id,
                 'title': event.title,
@@ -605,11 +528,30 @@ def register_for_event(event_id):
             }
         }), 201
         
+    except AlreadyRegistered as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        print(f"Error during registration: {str(e)}")
+        current_app.logger.exception('Event registration failed')
         db.session.rollback()
         return jsonify({'error': 'Failed to register for event'}), 500
 
+@student_bp.route('/student/events/<int:event_id>/cancel', methods=['POST'])
+@login_required
+def cancel_event_registration(event_id):
+    Event.query.get_or_404(event_id)
+    
+    try:
+        # The freed seat goes to the first student on the waitlist
+        if not cancel_registration(event_id, current_user.id):
+            return jsonify({'error': 'You are not registered for this event'}), 404
+        db.session.commit()
+        return jsonify({'message': 'Your registration has been cancelled'})
+    except Exception as e:
+        current_app.logger.exception('Cancelling event registration failed')
+        db.session.rollback()
+        return jsonify({'error': 'Failed to cancel registration'}), 500
+
 @student_bp.route('/student/messages', methods=['GET', 'POST'])
 @login_required
 def messages():
@@ -710,9 +652,9 @@ def setup_counselor_schedule(counselor_id):
     
     try:
         db.session.commit()
-        print(f"Created default schedule for counselor {counselor_id}")
+        current_app.logger.debug('Created default schedule for counselor %s', counselor_id)
     except Exception as e:
-        print(f"Error creating schedule: {str(e)}")
+        current_app.logger.exception('Error creating schedule for counselor %s', counselor_id)
         db.session.rollback()
 
     # Delete existing schedule and create new one if needed
@@ -733,11 +675,36 @@ def setup_counselor_schedule(counselor_id):
     
     try:
         db.session.commit()
-        print(f"Updated schedule for counselor {counselor_id}")
+        current_app.logger.debug('Updated schedule for counselor %s', counselor_id)
     except Exception as e:
-        print(f"Error updating schedule: {str(e)}")
+        current_app.logger.exception('Error updating schedule for counselor %s', counselor_id)
         db.session.rollback()
 
+@student_bp.route('/student/appointments/availability', methods=['GET'])
+@login_required
+def appointment_availability():
+    if current_user.role != 'student':
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+
+    counsellor_id = request.args.get('counsellor_id', type=int)
+    specialization = request.args.get('specialization')
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    duration = min(max(request.args.get('duration', 60, type=int), 15), 240)
+
+    # Default to the student's own counsellor
+    if counsellor_id is None and not specialization:
+        counsellor_id = current_user.counsellor_id
+        if counsellor_id is None:
+            return jsonify({'success': False, 'message': 'Choose a counsellor or a specialization'}), 400
+
+    slots = find_available_slots(
+        counsellor_id=counsellor_id,
+        specialization=specialization,
+        limit=limit,
+        duration=timedelta(minutes=duration)
+    )
+    return jsonify({'success': True, 'slots': slots})
+
 @student_bp.route('/student/request_appointment', methods=['POST'])
 @login_required
 def request_appointment():
@@ -832,76 +799,23 @@ def view_appointment_requests():
 @student_bp.route('/student/dashboard')
 @login_required
 def dashboard():
-    if not current_user.get_id().startswith('student-'):
+    if current_user.role != 'student':
         flash('Access denied. This dashboard is for students only.', 'danger')
         return redirect(url_for('index'))
     
-    # Get unread notifications count
-    unread_notifications = Notification.query.filter_by(
-        user_id=current_user.id,
-        read_status=False
-    ).count()
-    
-    # Get career goals and their milestones
-    career_goals = CareerGoal.query.filter_by(
-        student_id=current_user.id
-    ).all()
-    
-    # Get upcoming milestones
-    upcoming_milestones = GoalMilestone.query.join(CareerGoal).filter(
-        CareerGoal.student_id == current_user.id,
-        GoalMilestone.status == 'pending'
-    ).order_by(GoalMilestone.due_date.asc()).limit(5).all()
-    
-    # Get recent grievances
-    recent_grievances = Grievance.query.filter_by(
-        student_id=current_user.id
-    ).order_by(Grievance.created_at.desc()).limit(5).all()
-    
-    # Get upcoming appointments
-    upcoming_appointments = Appointment.query.filter(
-        Appointment.student_id == current_user.id,
-        Appointment.appointment_date >= datetime.now().date(),
-        Appointment.status == 'scheduled'
-    ).order_by(Appointment.appointment_date.asc(), Appointment.start_time.asc()).all()
-    
-    # Get upcoming events
-    upcoming_events = Event.query.filter(
-        Event.event_date >= datetime.now().date()
-    ).order_by(Event.event_date.asc()).limit(5).all()
-    
-    # Get event registrations
-    event_registrations = {}
-    if upcoming_events:
-        event_ids = [event.event_id for event in upcoming_events]
-        registrations = EventRegistration.query.filter(
-            EventRegistration.student_id == current_user.id,
-            EventRegistration.event_id.in_(event_ids)
-        ).all()
-        event_registrations = {r.event_id: r for r in registrations}
-    
-    # Get student's appointment requests
-    appointment_requests = AppointmentRequest.query.filter_by(
-        student_id=current_user.id
-    ).order_by(AppointmentRequest.created_at.desc()).all()
-    
-    # Get student's counselor
-    counselor = None
-    if current_user.counsellor_id:
-        counselor = CareerCounsellor.query.get(current_user.counsellor_id)
-
-    return render_template('student/dashboard.html',
-                         student=current_user,
-                         unread_notifications=unread_notifications,
-                         career_goals=career_goals,
-                         upcoming_milestones=upcoming_milestones,
-                         recent_grievances=recent_grievances,
-                         upcoming_appointments=upcoming_appointments,
-                         upcoming_events=upcoming_events,
-                         event_registrations=event_registrations,
-                         appointment_requests=appointment_requests,
-                         counselor=counselor,
-                         today=datetime.now())
+    # All sections are loaded together, each on its own connection
+    started = perf_counter()
+    context, timings = load_student_dashboard(current_user)
+    timings['load'] = (perf_counter() - started) * 1000
+    
+    started = perf_counter()
+    response = make_response(render_template('student/dashboard.html',
+                                             student=current_user,
+                                             today=datetime.now(),
+                                             **context))
+    timings['render'] = (perf_counter() - started) * 1000
+    response.headers['Server-Timing'] = server_timing(timings)
+    return response
 
 @student_bp.route('/student/notifications')
 @login_required
@@ -915,6 +829,41 @@ def get_notifications():
         'notifications': [notification.to_dict() for notification in notifications]
     })
 
+@student_bp.route('/student/notifications/stream')
+@login_required
+def notification_stream():
+    user_id = current_user.id
+
+    # Replay what a reconnecting client missed, then push new events as they
+    # happen. Subscribing first means nothing committed meanwhile is lost;
+    # stream_events drops the live copies of backlog events.
+    subscription = broker.subscribe(user_id)
+    backlog = []
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    if last_event_id is not None:
+        try:
+            missed = Notification.query.filter(
+                Notification.user_id == user_id,
+                Notification.notification_id > last_event_id
+            ).order_by(Notification.notification_id.asc()).limit(50).all()
+        except Exception:
+            broker.unsubscribe(user_id, subscription)
+            raise
+        backlog = [('notification', {
+            'notification': notification.to_dict(),
+            'unread_delta': 0 if notification.read_status else 1
+        }, notification.notification_id) for notification in missed]
+
+    return Response(
+        stream_events(
+            user_id, subscription, backlog,
+            heartbeat=current_app.config.get('NOTIFICATION_STREAM_HEARTBEAT', 25),
+            max_duration=current_app.config.get('NOTIFICATION_STREAM_TIMEOUT', 300)
+        ),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @student_bp.route('/student/notifications/<int:notification_id>/read', methods=['POST'])
 @login_required
 def mark_notification_read(notification_id):
@@ -931,10 +880,8 @@ def mark_notification_read(notification_id):
 @student_bp.route('/student/notifications/mark-all-read', methods=['POST'])
 @login_required
 def mark_all_notifications_read():
-    Notification.query.filter_by(
-        user_id=current_user.id,
-        read_status=False
-    ).update({'read_status': True})
+    mark_all_read(current_user.id)
+    publish_after_commit(db.session, current_user.id, 'unread', {'count': 0})
     
     db.session.commit()
     
@@ -968,7 +915,7 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
 
 def get_file_type(filename):
-    ext = filename.rsplit('.', 1)[1].lower()
+    ext = filename.rsplit('.', 1)[-1].lower()
     if ext == 'pdf':
         return 'pdf'
     elif ext in ['doc', 'docx']:
@@ -980,6 +927,10 @@ def get_file_type(filename):
 @student_bp.route('/student/documents/upload', methods=['POST'])
 @login_required
 def upload_document():
+    # Without a length the file could not be checked before it is stored
+    if request.content_length is None:
+        return jsonify({'success': False, 'message': 'Content-Length is required'}), 411
+    
     if 'file' not in request.files:
         return jsonify({'success': False, 'message': 'No file provided'}), 400
         
@@ -991,46 +942,125 @@ def upload_document():
         return jsonify({'success': False, 'message': 'File type not allowed'}), 400
     
     try:
-        # Generate unique filename
-        original_filename = secure_filename(file.filename)
-        file_extension = original_filename.rsplit('.', 1)[1].lower()
-        unique_filename = f"{uuid.uuid4().hex}.{file_extension}"
-        
-        # Create upload folder if it doesn't exist
-        upload_folder = current_app.config['UPLOAD_FOLDER']
-        os.makedirs(upload_folder, exist_ok=True)
+        # The request length is an upper bound on the file size
+        check_quota(current_user.id, request.content_length)
         
-        # Save file
-        file_path = os.path.join(upload_folder, unique_filename)
-        file.save(file_path)
+        # Identical files share one stored copy
+        sha256, size = store_upload(file.stream)
+        # Checked again on what was actually stored, still under the student row lock
+        check_quota(current_user.id, size)
         
         # Create document record
         document = StudentDocument(
             student_id=current_user.id,
             title=request.form.get('title'),
             document_type=request.form.get('document_type'),
-            file_path=file_path,
+            file_path=blob_path(sha256),
+            file_name=secure_filename(file.filename),
+            blob_sha256=sha256,
             file_type=get_file_type(file.filename)
         )
         
         db.session.add(document)
         db.session.commit()
+        schedule_thumbnail(document)
         
         return jsonify({
             'success': True,
             'message': 'Document uploaded successfully',
-            'document': {
-                'id': document.document_id,
-                'title': document.title,
-                'document_type': document.document_type,
-                'file_type': document.file_type,
-                'upload_date': document.upload_date.strftime('%Y-%m-%d %H:%M:%S')
-            }
+            'document': document_json(document)
         }), 201
         
+    except StorageQuotaExceeded as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 413
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+def document_json(document):
+    return {
+        'id': document.document_id,
+        'title': document.title,
+        'document_type': document.document_type,
+        'file_type': document.file_type,
+        'upload_date': document.upload_date.strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+@student_bp.route('/student/documents/uploads', methods=['POST'])
+@login_required
+def start_document_upload():
+    data = request.get_json(silent=True) or {}
+    file_name = secure_filename(data.get('file_name') or '')
+    if not file_name or not allowed_file(file_name):
+        return jsonify({'success': False, 'message': 'File type not allowed'}), 400
+    if not data.get('title') or data.get('document_type') not in ('transcript', 'resume', 'certificate', 'other'):
+        return jsonify({'success': False, 'message': 'Title and document type are required'}), 400
+    try:
+        size = int(data.get('size'))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'File size is required'}), 400
+    
+    expire_uploads()
+    try:
+        upload = start_upload(current_user.id, data['title'], data['document_type'], file_name, size)
+        db.session.commit()
+    except StorageQuotaExceeded as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 413
+    except UploadError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'upload': upload_status(upload)}), 201
+
+@student_bp.route('/student/documents/uploads/<upload_id>', methods=['GET', 'DELETE'])
+@login_required
+def document_upload(upload_id):
+    upload = DocumentUpload.query.filter_by(id=upload_id, student_id=current_user.id).first_or_404()
+    if request.method == 'GET':
+        # What a client resuming the upload still has to send
+        return jsonify({'success': True, 'upload': upload_status(upload)})
+    db.session.delete(upload)
+    db.session.commit()
+    discard_chunks(upload_id)
+    return jsonify({'success': True})
+
+@student_bp.route('/student/documents/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+@login_required
+def put_document_chunk(upload_id, index):
+    upload = DocumentUpload.query.filter_by(id=upload_id, student_id=current_user.id).first_or_404()
+    try:
+        save_chunk(upload, index, request.stream, request.headers.get('X-Chunk-SHA256'))
+        db.session.commit()
+    except UploadError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'index': index})
+
+@student_bp.route('/student/documents/uploads/<upload_id>/complete', methods=['POST'])
+@login_required
+def complete_document_upload(upload_id):
+    upload = lock_upload(upload_id, current_user.id)
+    if upload is None:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': 'Upload not found or expired'}), 404
+    try:
+        document = complete_upload(upload, get_file_type(upload.file_name))
+        db.session.commit()
+    except UploadError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e), 'missing': e.missing}), 409
     except Exception as e:
         db.session.rollback()
+        current_app.logger.exception('Completing upload %s failed', upload_id)
         return jsonify({'success': False, 'message': str(e)}), 500
+    discard_chunks(upload_id)
+    schedule_thumbnail(document)
+    return jsonify({
+        'success': True,
+        'message': 'Document uploaded successfully',
+        'document': document_json(document)
+    }), 201
 
 @student_bp.route('/student/documents/<int:doc_id>/download')
 @login_required
@@ -1040,12 +1070,17 @@ def download_document(doc_id):
         student_id=current_user.id
     ).first_or_404()
     
-    return send_from_directory(
-        current_app.config['UPLOAD_FOLDER'],
-        document.file_path,
-        as_attachment=True,
-        download_name=f"{document.title}.{document.file_path.rsplit('.', 1)[1]}"
-    )
+    return send_document(document)
+
+@student_bp.route('/student/documents/<int:doc_id>/thumbnail')
+@login_required
+def document_thumbnail(doc_id):
+    document = StudentDocument.query.filter_by(
+        document_id=doc_id,
+        student_id=current_user.id
+    ).first_or_404()
+    
+    return send_thumbnail(document) or ('', 404)
 
 @student_bp.route('/student/documents/<int:doc_id>/delete', methods=['POST'])
 @login_required
@@ -1056,10 +1091,8 @@ def delete_document(doc_id):
     ).first_or_404()
     
     try:
-        # Delete file
-        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], document.file_path)
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        # Drop the reference on the stored file, other documents may share it
+        release_document(document)
         
         # Delete record
         db.session.delete(document)
@@ -1093,35 +1126,17 @@ def reschedule_appointment(appointment_id):
                 flash('Cannot schedule appointments in the past', 'danger')
                 return redirect(url_for('student.dashboard'))
             
-            # Calculate end time (1 hour duration)
-            new_end_time = (datetime.combine(datetime.min, new_time) + timedelta(hours=1)).time()
-            
-            # Check counselor availability
-            day_of_week = new_date.strftime('%A')
-            counselor_schedule = CounsellorSchedule.query.filter_by(
-                counselor_id=appointment.counselor_id,
-                day_of_week=day_of_week
-            ).first()
-            
-            if not counselor_schedule:
-                flash('Counselor is not available on this day.', 'danger')
-                return redirect(url_for('student.dashboard'))
-            
-            if (new_time < counselor_schedule.start_time or 
-                new_end_time > counselor_schedule.end_time):
-                flash('Selected time is outside counselor\'s working hours.', 'danger')
-                return redirect(url_for('student.dashboard'))
-            
-            # Check for existing appointments at the new time
-            existing_appointment = Appointment.query.filter_by(
-                counselor_id=appointment.counselor_id,
-                appointment_date=new_date,
-                start_time=new_time,
-                status='scheduled'
-            ).first()
-            
-            if existing_appointment and existing_appointment.id != appointment_id:
-                flash('This time slot is already booked. Please choose another time.', 'danger')
+            # Check the counselor's working hours and overlapping bookings,
+            # holding the counselor's lock until commit
+            try:
+                new_end_time = reserve_slot(
+                    appointment.counsellor_id, new_date, new_time,
+                    exclude_appointment_id=appointment.id,
+                    within_hours=True
+                )
+            except SlotUnavailable as e:
+                db.session.rollback()
+                flash(f'{e}. Please choose another time.', 'danger')
                 return redirect(url_for('student.dashboard'))
             
             # Update appointment
@@ -1130,7 +1145,8 @@ def reschedule_appointment(appointment_id):
             appointment.end_time = new_end_time
             appointment.status = 'rescheduled'
             
-            # Create notifications
+            # Notifications only reach students; the counsellor sees the new
+            # time on their dashboard
             student_notification = Notification(
                 user_id=current_user.id,
                 message=f'Your appointment has been rescheduled to {new_date.strftime("%B %d, %Y")} at {new_time.strftime("%I:%M %p")}',
@@ -1138,15 +1154,7 @@ def reschedule_appointment(appointment_id):
                 related_entity_id=appointment.id
             )
             
-            counselor_notification = Notification(
-                user_id=appointment.counselor_id,
-                message=f'Appointment with {current_user.first_name} {current_user.last_name} has been rescheduled to {new_date.strftime("%B %d, %Y")} at {new_time.strftime("%I:%M %p")}',
-                notification_type='appointment',
-                related_entity_id=appointment.id
-            )
-            
             db.session.add(student_notification)
-            db.session.add(counselor_notification)
             db.session.commit()
             
             flash('Appointment rescheduled successfully!', 'success')
@@ -1167,7 +1175,7 @@ def reschedule_appointment(appointment_id):
 @student_bp.route('/student/appointment_requests/<int:request_id>/cancel', methods=['POST'])
 @login_required
 def cancel_appointment_request(request_id):
-    print(f"\n=== Debug: Canceling Appointment Request {request_id} ===")
+    current_app.logger.debug('Canceling Appointment Request %s', request_id)
     try:
         # Find the appointment request
         appointment_request = AppointmentRequest.query.filter_by(
@@ -1177,14 +1185,14 @@ def cancel_appointment_request(request_id):
         ).first()
 
         if not appointment_request:
-            print("Error: Appointment request not found or not pending")
+            current_app.logger.debug('Appointment request %s not found or not pending', request_id)
             return jsonify({
                 'status': 'error',
                 'message': 'Appointment request not found or already processed'
             }), 404
         
-        print(f"Found appointment request: {appointment_request.id}")
-        print(f"Current status: {appointment_request.status}")
+        current_app.logger.debug('Found appointment request: %s', appointment_request.id)
+        current_app.logger.debug('Current status: %s', appointment_request.status)
         
         # Update the request status
         appointment_request.status = 'cancelled'
@@ -1209,9 +1217,9 @@ def cancel_appointment_request(request_id):
         )
         db.session.add(student_notification)
         
-        print("Committing changes to database...")
+        current_app.logger.debug('Committing changes to database...')
         db.session.commit()
-        print("Successfully cancelled appointment request")
+        current_app.logger.debug('Successfully cancelled appointment request')
         
         return jsonify({
             'status': 'success',
@@ -1219,7 +1227,7 @@ def cancel_appointment_request(request_id):
         })
         
     except Exception as e:
-        print(f"Error cancelling appointment request: {str(e)}")
+        current_app.logger.exception('Error cancelling appointment request %s', request_id)
         db.session.rollback()
         return jsonify({
             'status': 'error',
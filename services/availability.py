@@ -0,0 +1,247 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import partial
+
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from models import db, Appointment, CareerCounsellor, CounsellorSchedule
+from services.cache import invalidate_now_and_after_commit, is_bulk_write
+from services.slots import BUSY_STATUSES, DEFAULT_DURATION
+
+SLOT_MINUTES = 30
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+
+# Days of bookings fetched per query when the index has to load more
+LOAD_CHUNK_DAYS = 14
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def _mask(first, last):
+    """Bits first..last-1 set"""
+    return ((1 << (last - first)) - 1) << first if last > first else 0
+
+
+def working_mask(start_time, end_time):
+    """Grid slots lying completely inside the working window"""
+    first = -(-_minutes(start_time) // SLOT_MINUTES)
+    last = _minutes(end_time) // SLOT_MINUTES if _minutes(end_time) else SLOTS_PER_DAY
+    return _mask(first, last)
+
+
+def busy_mask(start_time, end_time):
+    """Grid slots touched by a booking"""
+    if end_time is None:
+        end_time = (datetime.combine(datetime.min, start_time) + DEFAULT_DURATION).time()
+    first = _minutes(start_time) // SLOT_MINUTES
+    last = -(-_minutes(end_time) // SLOT_MINUTES) if _minutes(end_time) else SLOTS_PER_DAY
+    return _mask(first, last)
+
+
+def free_starts(free, length):
+    """Yields the grid slots where ``length`` consecutive free slots begin"""
+    starts = free
+    for shift in range(1, length):
+        starts &= free >> shift
+    while starts:
+        low = starts & -starts
+        yield low.bit_length() - 1
+        starts ^= low
+
+
+class AvailabilityIndex:
+    """
+    Free/busy bitmaps on a SLOT_MINUTES grid: one weekly working mask per
+    counsellor, built from CounsellorSchedule, and one busy mask per
+    counsellor and day, built from Appointment. Days are loaded in chunks the
+    first time they are searched. Writes only drop the days and counsellors
+    they touch, so a search mostly ANDs integers already in memory. Everything
+    is dropped after AVAILABILITY_INDEX_TTL seconds, which bounds staleness
+    from bookings made by other processes. Each invalidation bumps the
+    version; masks read while it moved are used once but not kept, so a
+    slow reader cannot put back what a write just dropped.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._weekly = {}
+        self._busy = {}
+        self._version = 0
+        self._built_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+            self._weekly.clear()
+            self._busy.clear()
+            self._built_at = time.monotonic()
+
+    def invalidate_day(self, counsellor_id, day):
+        with self._lock:
+            self._version += 1
+            self._busy.pop((counsellor_id, day), None)
+
+    def invalidate_schedule(self, counsellor_id):
+        with self._lock:
+            self._version += 1
+            self._weekly.pop(counsellor_id, None)
+
+    def _expire(self):
+        ttl = current_app.config.get('AVAILABILITY_INDEX_TTL', 60)
+        if time.monotonic() - self._built_at > ttl:
+            self.invalidate()
+
+    def _weekly_masks(self, counsellor_ids):
+        weekly = {}
+        with self._lock:
+            version = self._version
+            missing = [cid for cid in counsellor_ids if cid not in self._weekly]
+        if missing:
+            weekly = {cid: {} for cid in missing}
+            rows = db.session.query(
+                CounsellorSchedule.counsellor_id, CounsellorSchedule.day_of_week,
+                CounsellorSchedule.start_time, CounsellorSchedule.end_time
+            ).filter(CounsellorSchedule.counsellor_id.in_(missing))
+            for counsellor_id, day_of_week, start_time, end_time in rows:
+                if day_of_week and start_time and end_time:
+                    days = weekly[counsellor_id]
+                    days[day_of_week] = days.get(day_of_week, 0) | working_mask(start_time, end_time)
+            with self._lock:
+                if self._version == version:
+                    self._weekly.update(weekly)
+        with self._lock:
+            return {cid: weekly[cid] if cid in weekly else self._weekly.get(cid, {}) for cid in counsellor_ids}
+
+    def _busy_masks(self, counsellor_ids, start_date, end_date):
+        busy = {}
+        with self._lock:
+            version = self._version
+            missing = [cid for cid in counsellor_ids
+                       if any((cid, start_date + timedelta(days=i)) not in self._busy
+                              for i in range((end_date - start_date).days + 1))]
+        if missing:
+            busy = {(cid, start_date + timedelta(days=i)): 0
+                    for cid in missing for i in range((end_date - start_date).days + 1)}
+            rows = db.session.query(
+                Appointment.counsellor_id, Appointment.appointment_date,
+                Appointment.start_time, Appointment.end_time
+            ).filter(
+                Appointment.counsellor_id.in_(missing),
+                Appointment.status.in_(BUSY_STATUSES),
+                Appointment.appointment_date.between(start_date, end_date)
+            )
+            for counsellor_id, day, start_time, end_time in rows:
+                busy[(counsellor_id, day)] |= busy_mask(start_time, end_time)
+            with self._lock:
+                if self._version == version:
+                    for key, mask in busy.items():
+                        self._busy.setdefault(key, mask)
+        with self._lock:
+            return {key: busy[key] if key in busy else self._busy.get(key, 0)
+                    for key in ((cid, start_date + timedelta(days=i))
+                                for cid in counsellor_ids
+                                for i in range((end_date - start_date).days + 1))}
+
+    def next_free_slots(self, counsellor_ids, limit=10, duration=DEFAULT_DURATION, now=None, horizon_days=90):
+        """
+        The earliest ``limit`` open slots of ``duration`` across
+        ``counsellor_ids``, as (counsellor_id, start datetime, end datetime)
+        ordered by start time. Starts are on the SLOT_MINUTES grid.
+        """
+        self._expire()
+        now = now or datetime.now()
+        length = max(1, -(-int(duration.total_seconds() // 60) // SLOT_MINUTES))
+        weekly = self._weekly_masks(counsellor_ids)
+        candidates = [cid for cid in counsellor_ids if weekly[cid]]
+
+        slots = []
+        first_day = now.date()
+        last_day = first_day + timedelta(days=horizon_days)
+        chunk_start = first_day
+        while candidates and chunk_start <= last_day and len(slots) < limit:
+            chunk_end = min(chunk_start + timedelta(days=LOAD_CHUNK_DAYS - 1), last_day)
+            busy = self._busy_masks(candidates, chunk_start, chunk_end)
+
+            day = chunk_start
+            while day <= chunk_end and len(slots) < limit:
+                day_name = day.strftime('%A')
+                midnight = datetime.combine(day, datetime.min.time())
+                day_slots = []
+                for cid in candidates:
+                    free = weekly[cid].get(day_name, 0) & ~busy[(cid, day)]
+                    if day == first_day:
+                        # Only slots that have not started yet
+                        free &= ~_mask(0, -(-_minutes(now.time()) // SLOT_MINUTES))
+                    for slot in free_starts(free, length):
+                        start = midnight + timedelta(minutes=slot * SLOT_MINUTES)
+                        day_slots.append((start, cid))
+                day_slots.sort()
+                for start, cid in day_slots[:limit - len(slots)]:
+                    slots.append((cid, start, start + timedelta(minutes=length * SLOT_MINUTES)))
+                day += timedelta(days=1)
+            chunk_start = chunk_end + timedelta(days=1)
+        return slots
+
+
+availability = AvailabilityIndex()
+
+
+def _history_values(obj, *attrs):
+    state = inspect(obj)
+    values = []
+    for attr in attrs:
+        history = state.attrs[attr].history
+        values.append(set(history.deleted or ()) | set(history.unchanged or ()) | set(history.added or ()))
+    return values
+
+
+@event.listens_for(Session, 'after_flush')
+def _invalidate_touched_days(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Appointment):
+            # Old and new day both change when a booking moves
+            counsellor_ids, days = _history_values(obj, 'counsellor_id', 'appointment_date')
+            for counsellor_id in counsellor_ids:
+                for day in days:
+                    invalidate_now_and_after_commit(session, partial(availability.invalidate_day, counsellor_id, day))
+        elif isinstance(obj, CounsellorSchedule):
+            for counsellor_id in _history_values(obj, 'counsellor_id')[0]:
+                invalidate_now_and_after_commit(session, partial(availability.invalidate_schedule, counsellor_id))
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _invalidate_on_bulk_write(orm_execute_state):
+    if is_bulk_write(orm_execute_state, (Appointment, CounsellorSchedule)):
+        invalidate_now_and_after_commit(orm_execute_state.session, availability.invalidate)
+
+
+def find_available_slots(counsellor_id=None, specialization=None, limit=10, duration=DEFAULT_DURATION):
+    """
+    Next open slots for one counsellor or for every available counsellor with
+    ``specialization``. Returns dicts ready to be serialized.
+    """
+    query = db.session.query(
+        CareerCounsellor.id, CareerCounsellor.first_name, CareerCounsellor.last_name
+    ).filter(CareerCounsellor.availability_status.is_(True))
+    if counsellor_id is not None:
+        query = query.filter(CareerCounsellor.id == counsellor_id)
+    if specialization:
+        query = query.filter(CareerCounsellor.specialization == specialization)
+    names = {cid: f"{first_name} {last_name or ''}".strip() for cid, first_name, last_name in query}
+
+    slots = availability.next_free_slots(
+        sorted(names), limit=limit, duration=duration,
+        horizon_days=current_app.config.get('AVAILABILITY_HORIZON_DAYS', 90)
+    )
+    return [{
+        'counsellor_id': cid,
+        'counsellor_name': names[cid],
+        'date': start.date().isoformat(),
+        'start_time': start.strftime('%H:%M'),
+        'end_time': end.strftime('%H:%M')
+    } for cid, start, end in slots]
@@ -0,0 +1,90 @@
+import threading
+import time
+from itertools import chain
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+class TTLCache:
+    """Small thread-safe in-process cache with a per-entry time to live."""
+
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+
+    def get_or_set(self, key, loader, ttl=None):
+        value = self.get(key)
+        if value is None:
+            value = loader()
+            self.set(key, value, ttl)
+        return value
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+
+def invalidate_on_write(callback, *models):
+    """
+    Calls ``callback`` whenever rows of one of ``models`` are written.
+    Covers unit-of-work flushes as well as bulk ``query.update()``/``delete()``
+    statements, and fires again after commit/rollback so a reader that
+    repopulated the cache mid-transaction does not keep stale data.
+    """
+    @event.listens_for(Session, 'after_flush')
+    def _after_flush(session, flush_context):
+        for obj in chain(session.new, session.dirty, session.deleted):
+            if isinstance(obj, models):
+                invalidate_now_and_after_commit(session, callback)
+                return
+
+    @event.listens_for(Session, 'do_orm_execute')
+    def _on_execute(state):
+        if is_bulk_write(state, models):
+            invalidate_now_and_after_commit(state.session, callback)
+
+    return callback
+
+
+def is_bulk_write(orm_execute_state, models):
+    """True if the statement is an INSERT/UPDATE/DELETE against one of ``models``"""
+    state = orm_execute_state
+    if not (state.is_update or state.is_delete or state.is_insert):
+        return False
+    mapper = state.bind_mapper
+    return mapper is not None and issubclass(mapper.class_, models)
+
+
+def invalidate_now_and_after_commit(session, callback):
+    session.info.setdefault('_pending_invalidations', set()).add(callback)
+    callback()
+
+
+def _run_pending(session):
+    for callback in session.info.pop('_pending_invalidations', ()):
+        callback()
+
+
+event.listen(Session, 'after_commit', _run_pending)
+event.listen(Session, 'after_soft_rollback', lambda session, previous_transaction: _run_pending(session))
@@ -0,0 +1,223 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, select, update
+
+from models import db, DocumentUpload, StudentDocument
+from services.document_store import CHUNK_SIZE, blob_path, check_quota, store_upload
+
+
+class UploadError(Exception):
+    """Raised for a chunk or an upload the protocol does not accept"""
+
+    def __init__(self, message, missing=None):
+        super().__init__(message)
+        self.missing = missing or []
+
+
+def _chunks_root():
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], 'chunks')
+
+
+def _upload_dir(upload_id):
+    return os.path.join(_chunks_root(), upload_id)
+
+
+def _chunk_path(upload_id, index):
+    return os.path.join(_upload_dir(upload_id), f'{index:06d}')
+
+
+def _expiry():
+    return datetime.utcnow() + timedelta(seconds=current_app.config.get('DOCUMENT_UPLOAD_TTL', 86400))
+
+
+def start_upload(student_id, title, document_type, file_name, size):
+    """
+    Opens a resumable upload of ``size`` bytes, in the caller's transaction.
+    The size counts against the student's quota until the upload completes
+    or expires.
+    """
+    if size <= 0:
+        raise UploadError('The file is empty')
+    check_quota(student_id, size)
+    upload = DocumentUpload(
+        id=uuid.uuid4().hex,
+        student_id=student_id,
+        title=title,
+        document_type=document_type,
+        file_name=file_name,
+        size=size,
+        chunk_size=current_app.config.get('DOCUMENT_UPLOAD_CHUNK_SIZE', 5 * 1024 * 1024),
+        expires_at=_expiry()
+    )
+    db.session.add(upload)
+    os.makedirs(_upload_dir(upload.id), exist_ok=True)
+    return upload
+
+
+def lock_upload(upload_id, student_id):
+    """The student's upload, locked until the transaction ends, or None"""
+    return db.session.execute(select(DocumentUpload).where(
+        DocumentUpload.id == upload_id,
+        DocumentUpload.student_id == student_id
+    ).with_for_update()).scalar_one_or_none()
+
+
+def received_chunks(upload):
+    """Indexes of the chunks stored so far"""
+    try:
+        names = os.listdir(_upload_dir(upload.id))
+    except FileNotFoundError:
+        return []
+    return sorted(int(name) for name in names if name.isdigit())
+
+
+def upload_status(upload):
+    return {
+        'upload_id': upload.id,
+        'size': upload.size,
+        'chunk_size': upload.chunk_size,
+        'total_chunks': upload.total_chunks,
+        'received': received_chunks(upload),
+        'expires_at': upload.expires_at.strftime('%Y-%m-%dT%H:%M:%SZ')
+    }
+
+
+def save_chunk(upload, index, stream, checksum):
+    """
+    Stores chunk ``index`` read from ``stream`` if its length and SHA-256
+    match. Sending a chunk again replaces it, so any chunk can be retried,
+    and chunks may arrive in parallel and in any order.
+    """
+    if not 0 <= index < upload.total_chunks:
+        raise UploadError(f'Chunk {index} is out of range')
+    if not checksum:
+        raise UploadError('Each chunk needs an X-Chunk-SHA256 header')
+    length = min(upload.chunk_size, upload.size - index * upload.chunk_size)
+
+    directory = _upload_dir(upload.id)
+    os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha256()
+    received = 0
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            # Reading one byte past the expected length is enough to reject a long chunk
+            while received <= length and (data := stream.read(min(CHUNK_SIZE, length + 1 - received))):
+                digest.update(data)
+                received += len(data)
+                out.write(data)
+        if received != length:
+            raise UploadError(f'Chunk {index} should be {length} bytes, received {received}')
+        if digest.hexdigest() != checksum.strip().lower():
+            raise UploadError(f'Chunk {index} does not match its checksum')
+        os.replace(tmp_path, _chunk_path(upload.id, index))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    db.session.execute(update(DocumentUpload).where(DocumentUpload.id == upload.id).values(
+        expires_at=_expiry()
+    ).execution_options(synchronize_session=False))
+
+
+class _ChunkReader:
+    """Reads the chunk files of an upload one after another, as a single stream"""
+
+    def __init__(self, paths):
+        self._paths = iter(paths)
+        self._current = None
+
+    def read(self, size):
+        while True:
+            if self._current is None:
+                path = next(self._paths, None)
+                if path is None:
+                    return b''
+                self._current = open(path, 'rb')
+            data = self._current.read(size)
+            if data:
+                return data
+            self._current.close()
+            self._current = None
+
+    def close(self):
+        if self._current is not None:
+            self._current.close()
+
+
+def complete_upload(upload, file_type):
+    """
+    Assembles the chunks into the document store and replaces the locked
+    upload with its StudentDocument, in the caller's transaction. The
+    chunks are removed with discard_chunks() once that has committed.
+    """
+    missing = sorted(set(range(upload.total_chunks)) - set(received_chunks(upload)))
+    if missing:
+        raise UploadError(f'{len(missing)} chunks have not been received', missing)
+
+    reader = _ChunkReader(_chunk_path(upload.id, index) for index in range(upload.total_chunks))
+    try:
+        sha256, size = store_upload(reader)
+    finally:
+        reader.close()
+    if size != upload.size:
+        raise UploadError(f'Received {size} bytes, expected {upload.size}')
+
+    document = StudentDocument(
+        student_id=upload.student_id,
+        title=upload.title,
+        document_type=upload.document_type,
+        file_path=blob_path(sha256),
+        file_name=upload.file_name,
+        blob_sha256=sha256,
+        file_type=file_type
+    )
+    db.session.add(document)
+    db.session.delete(upload)
+    return document
+
+
+def discard_chunks(upload_id):
+    shutil.rmtree(_upload_dir(upload_id), ignore_errors=True)
+
+
+def expire_uploads():
+    """
+    Deletes uploads with no chunk received for DOCUMENT_UPLOAD_TTL seconds
+    and commits, then removes chunk directories no upload owns any more.
+    Returns the number of uploads expired.
+    """
+    now = datetime.utcnow()
+    expired = db.session.execute(select(DocumentUpload.id).where(DocumentUpload.expires_at < now)).scalars().all()
+    if expired:
+        db.session.execute(delete(DocumentUpload).where(
+            DocumentUpload.id.in_(expired),
+            DocumentUpload.expires_at < now
+        ))
+    db.session.commit()
+
+    root = _chunks_root()
+    if not os.path.isdir(root):
+        return len(expired)
+    live = set(db.session.execute(select(DocumentUpload.id)).scalars())
+    cutoff = time.time() - current_app.config.get('DOCUMENT_UPLOAD_TTL', 86400)
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        # Left alone while fresh, its upload row may not be committed yet
+        if name not in live and (name in expired or os.path.getmtime(path) < cutoff):
+            shutil.rmtree(path, ignore_errors=True)
+    return len(expired)
+
+
+if __name__ == '__main__':
+    from app import app
+
+    with app.app_context():
+        print(f'{expire_uploads()} expired uploads removed')
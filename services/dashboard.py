@@ -0,0 +1,137 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+from flask import current_app, request
+from sqlalchemy.orm import selectinload
+
+from models import db, CareerGoal, Grievance, Appointment, AppointmentRequest, CareerCounsellor
+from services.event_listing import upcoming_events, registration_flags
+from services.sql_metrics import request_stats, track_worker_queries
+from services.unread_counters import get_unread_count
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=current_app.config.get('DASHBOARD_LOADER_WORKERS', 4),
+                    thread_name_prefix='dashboard-loader'
+                )
+    return _executor
+
+
+def _notifications(student_id, counsellor_id):
+    return {'unread_notifications': get_unread_count(student_id)}
+
+
+def _goals(student_id, counsellor_id):
+    # Goals and all their milestones in two queries; the upcoming list is
+    # picked from the same rows instead of a third query
+    goals = CareerGoal.query.options(selectinload(CareerGoal.milestones)).filter_by(student_id=student_id).all()
+    pending = [milestone for goal in goals for milestone in goal.milestones if milestone.status == 'pending']
+    # Undated milestones first, as MySQL sorts NULL
+    pending.sort(key=lambda m: (m.due_date is not None, m.due_date or date.min, m.milestone_id))
+    return {'career_goals': goals, 'upcoming_milestones': pending[:5]}
+
+
+def _grievances(student_id, counsellor_id):
+    return {'recent_grievances': Grievance.query.filter_by(
+        student_id=student_id
+    ).order_by(Grievance.created_at.desc()).limit(5).all()}
+
+
+def _appointments(student_id, counsellor_id):
+    return {'upcoming_appointments': Appointment.query.filter(
+        Appointment.student_id == student_id,
+        Appointment.appointment_date >= datetime.now().date(),
+        Appointment.status == 'scheduled'
+    ).order_by(Appointment.appointment_date.asc(), Appointment.start_time.asc()).all()}
+
+
+def _events(student_id, counsellor_id):
+    events = upcoming_events.get().events[:5]
+    registered, waitlisted = registration_flags(student_id, [event.event_id for event in events])
+    return {'upcoming_events': events, 'event_registrations': registered, 'waitlisted_events': waitlisted}
+
+
+def _requests(student_id, counsellor_id):
+    return {'appointment_requests': AppointmentRequest.query.filter_by(
+        student_id=student_id
+    ).order_by(AppointmentRequest.created_at.desc()).all()}
+
+
+def _counsellor(student_id, counsellor_id):
+    return {'counselor': db.session.get(CareerCounsellor, counsellor_id) if counsellor_id else None}
+
+
+# Independent sections of the dashboard, each filling some template variables
+SECTIONS = {
+    'notifications': _notifications,
+    'goals': _goals,
+    'grievances': _grievances,
+    'appointments': _appointments,
+    'events': _events,
+    'requests': _requests,
+    'counsellor': _counsellor,
+}
+
+
+def _timed(section, *args):
+    started = time.perf_counter()
+    values = section(*args)
+    return values, (time.perf_counter() - started) * 1000
+
+
+def _run_section(app, endpoint, keep_statements, section, *args):
+    # Own app context, so the section gets its own session and connection.
+    # Everything the template reads is loaded eagerly, the rows stay usable
+    # after that session is closed. Its queries are handed back to be
+    # counted with the request's.
+    with app.app_context():
+        stats = track_worker_queries(endpoint, keep_statements)
+        values, duration = _timed(section, *args)
+        return values, duration, stats
+
+
+def load_student_dashboard(student):
+    """
+    Loads every dashboard section for ``student``, in parallel on the
+    loader pool unless DASHBOARD_LOADER_WORKERS is 0. Returns the template
+    variables and the milliseconds each section took.
+    The pool is shared by the whole process: DASHBOARD_LOADER_WORKERS
+    sections run at once across all dashboard requests, and sections of
+    concurrent requests queue for a free thread. Each worker holds its own
+    database connection while it runs, so the bound also caps the
+    connections dashboards take from the engine's pool.
+    """
+    app = current_app._get_current_object()
+    args = (student.id, student.counsellor_id)
+    context = {}
+    timings = {}
+
+    if app.config.get('DASHBOARD_LOADER_WORKERS', 4):
+        stats = request_stats()
+        futures = {name: get_executor().submit(_run_section, app, request.endpoint,
+                                               stats.statements is not None, section, *args)
+                   for name, section in SECTIONS.items()}
+        for name, future in futures.items():
+            values, timings[name], section_stats = future.result()
+            context.update(values)
+            stats.merge(section_stats)
+    else:
+        for name, section in SECTIONS.items():
+            values, timings[name] = _timed(section, *args)
+            context.update(values)
+    return context, timings
+
+
+def server_timing(timings):
+    """Server-Timing header value, shown per section in the browser's network panel"""
+    return ', '.join(f'{name};dur={duration:.1f}' for name, duration in timings.items())
@@ -0,0 +1,192 @@
+import hashlib
+import mimetypes
+import os
+import tempfile
+
+from flask import current_app, request, send_file
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from werkzeug.http import is_resource_modified
+
+from models import db, DocumentBlob, DocumentUpload, Student, StudentDocument
+
+# Bytes read from an upload at a time while it is hashed and written out
+CHUNK_SIZE = 1024 * 1024
+
+
+class StorageQuotaExceeded(Exception):
+    """Raised when a file is over DOCUMENT_MAX_SIZE or would take a student past DOCUMENT_QUOTA_BYTES"""
+
+
+def blob_path(sha256):
+    """Path of a blob relative to UPLOAD_FOLDER, spread over 256 directories"""
+    return os.path.join('blobs', sha256[:2], sha256)
+
+
+def document_path(document):
+    # Files saved before the blob store have an absolute file_path, which join keeps
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], document.file_path)
+
+
+def download_name(document):
+    original = document.file_name or document.file_path
+    if '.' not in original:
+        return document.title
+    return f"{document.title}.{original.rsplit('.', 1)[1]}"
+
+
+def send_document(document):
+    """
+    Download response for a document, answering conditional and Range
+    requests. With DOCUMENT_ACCEL_REDIRECT set the body is left to the
+    front end server through X-Accel-Redirect; otherwise the file goes out
+    through the server's file wrapper (sendfile where available). Blobs use
+    their content hash as a strong ETag.
+    """
+    path = document_path(document)
+    etag = document.blob_sha256 or True
+    accel_prefix = current_app.config.get('DOCUMENT_ACCEL_REDIRECT')
+    relative = os.path.relpath(path, current_app.config['UPLOAD_FOLDER'])
+
+    if accel_prefix and not relative.startswith('..'):
+        name = download_name(document)
+        if document.blob_sha256 is not None and not is_resource_modified(request.environ, etag=document.blob_sha256):
+            response = current_app.response_class(status=304)
+        else:
+            # Ranges and the body are handled by the front end server
+            response = current_app.response_class(mimetype=mimetypes.guess_type(name)[0] or 'application/octet-stream')
+            response.headers['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + relative.replace(os.sep, '/')
+            response.headers.set('Content-Disposition', 'attachment', filename=name)
+        if document.blob_sha256 is not None:
+            response.set_etag(document.blob_sha256)
+    else:
+        response = send_file(path, as_attachment=True, download_name=download_name(document),
+                             conditional=True, etag=etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def storage_used(student_id):
+    """Bytes of the student's stored documents plus their uploads in progress"""
+    stored = select(func.coalesce(func.sum(DocumentBlob.size), 0)).join(
+        StudentDocument, StudentDocument.blob_sha256 == DocumentBlob.sha256
+    ).where(StudentDocument.student_id == student_id).scalar_subquery()
+    pending = select(func.coalesce(func.sum(DocumentUpload.size), 0)).where(
+        DocumentUpload.student_id == student_id
+    ).scalar_subquery()
+    return sum(int(value) for value in db.session.execute(select(stored, pending)).one())
+
+
+def check_quota(student_id, size):
+    """
+    Raises StorageQuotaExceeded unless the student can store ``size`` more
+    bytes. Locks the student row until the caller's transaction ends, so
+    two uploads cannot both take the last of the quota.
+    """
+    max_size = current_app.config.get('DOCUMENT_MAX_SIZE')
+    if max_size is not None and size > max_size:
+        raise StorageQuotaExceeded(f'Files can be at most {max_size // (1024 * 1024)} MB')
+    quota = current_app.config.get('DOCUMENT_QUOTA_BYTES')
+    if quota is None:
+        return
+    db.session.execute(select(Student.id).where(Student.id == student_id).with_for_update())
+    if storage_used(student_id) + size > quota:
+        raise StorageQuotaExceeded(f'This upload would exceed your {quota // (1024 * 1024)} MB document storage')
+
+
+def _spool(stream):
+    """
+    Copies ``stream`` into a temporary file next to the blobs, hashing it on
+    the way, so the upload is never held in memory. Returns (path, sha256, size).
+    """
+    tmp_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while chunk := stream.read(CHUNK_SIZE):
+                digest.update(chunk)
+                size += len(chunk)
+                out.write(chunk)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path, digest.hexdigest(), size
+
+
+def _add_reference(sha256):
+    return db.session.execute(update(DocumentBlob).where(DocumentBlob.sha256 == sha256).values(
+        ref_count=DocumentBlob.ref_count + 1
+    ).execution_options(synchronize_session=False)).rowcount == 1
+
+
+def store_upload(stream):
+    """
+    Stores an uploaded file once per content hash and takes a reference on
+    it in the caller's transaction, for the StudentDocument added with it.
+    Returns (sha256, size); the document's file_path is blob_path(sha256).
+    """
+    tmp_path, sha256, size = _spool(stream)
+    try:
+        # The reference is taken before the file is checked: the row lock it
+        # holds keeps services/storage_gc.py from removing the file meanwhile
+        if not _add_reference(sha256):
+            try:
+                with db.session.begin_nested():
+                    db.session.add(DocumentBlob(sha256=sha256, size=size, ref_count=1))
+            except IntegrityError:
+                # The same content was stored by a concurrent upload first
+                _add_reference(sha256)
+
+        path = os.path.join(current_app.config['UPLOAD_FOLDER'], blob_path(sha256))
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Atomic, and a concurrent upload of the same content writes the same bytes
+            os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return sha256, size
+
+
+def _release(sha256, references=1):
+    # A blob left without references stays on disk, for the next identical
+    # upload to reuse, until services/storage_gc.py collects it
+    db.session.execute(update(DocumentBlob).where(DocumentBlob.sha256 == sha256).values(
+        ref_count=DocumentBlob.ref_count - references
+    ).execution_options(synchronize_session=False))
+
+
+def release_document(document):
+    """
+    Drops the document's reference on its blob, in the caller's transaction,
+    ahead of the row being deleted. A file saved before the blob store is
+    removed once no other document names it.
+    """
+    if document.blob_sha256 is not None:
+        _release(document.blob_sha256)
+        return
+    shared = db.session.query(StudentDocument.document_id).filter(
+        StudentDocument.file_path == document.file_path,
+        StudentDocument.document_id != document.document_id
+    ).first()
+    path = document_path(document)
+    if shared is None and os.path.exists(path):
+        os.remove(path)
+
+
+def release_student_documents(student_id):
+    """
+    Drops the blob references of every document of the student, ahead of
+    their rows being deleted by services/purge.py.
+    """
+    rows = db.session.execute(select(StudentDocument.blob_sha256, func.count()).where(
+        StudentDocument.student_id == student_id,
+        StudentDocument.blob_sha256.isnot(None)
+    ).group_by(StudentDocument.blob_sha256)).all()
+    # Hash order, so two purges touching the same blobs cannot deadlock
+    for sha256, references in sorted(rows):
+        _release(sha256, references)
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from flask import current_app, make_response, request
+from sqlalchemy import literal, select, union_all
+from werkzeug.http import is_resource_modified
+
+from models import db, Event, EventRegistration, EventWaitlist
+from services.cache import invalidate_on_write
+
+# Plain copy of an Event row, safe to share between requests and threads
+EventSummary = namedtuple('EventSummary', [column.key for column in Event.__table__.columns])
+
+Listing = namedtuple('Listing', ['day', 'version', 'events', 'etag', 'last_modified', 'built_at'])
+
+
+def _jsonable(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+class UpcomingEvents:
+    """
+    The upcoming events list, loaded once and shared by every page that
+    shows it. Each write to events bumps the version; a list built while
+    the version moved is not kept, so a slow reader cannot put stale rows
+    back. The list is also rebuilt when the day changes and after
+    EVENT_LISTING_TTL seconds, which bounds staleness from writes made by
+    other processes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._listing = None
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+            self._listing = None
+
+    def get(self):
+        today = datetime.now().date()
+        ttl = current_app.config.get('EVENT_LISTING_TTL', 60)
+        with self._lock:
+            listing = self._listing
+            version = self._version
+        if listing is not None and listing.day == today and time.monotonic() - listing.built_at <= ttl:
+            return listing
+
+        events = [EventSummary(*row) for row in db.session.query(
+            *Event.__table__.columns
+        ).filter(Event.event_date >= today).order_by(Event.event_date, Event.start_time, Event.event_id)]
+        etag = hashlib.sha1(json.dumps(
+            [today.isoformat()] + [[_jsonable(value) for value in event] for event in events]
+        ).encode()).hexdigest()
+        # An unchanged rebuild keeps its Last-Modified, so If-Modified-Since keeps matching
+        last_modified = listing.last_modified if listing is not None and listing.etag == etag \
+            else datetime.utcnow().replace(microsecond=0)
+        listing = Listing(today, version, events, etag, last_modified, time.monotonic())
+
+        with self._lock:
+            if self._version == version:
+                self._listing = listing
+        return listing
+
+
+upcoming_events = UpcomingEvents()
+
+invalidate_on_write(upcoming_events.invalidate, Event)
+
+
+def registration_flags(student_id, event_ids):
+    """(registered, waitlisted) event id sets of one student, limited to ``event_ids``"""
+    registered, waitlisted = set(), set()
+    if not event_ids:
+        return registered, waitlisted
+    rows = db.session.execute(union_all(
+        select(EventRegistration.event_id, literal(True)).where(
+            EventRegistration.student_id == student_id,
+            EventRegistration.event_id.in_(event_ids)
+        ),
+        select(EventWaitlist.event_id, literal(False)).where(
+            EventWaitlist.student_id == student_id,
+            EventWaitlist.event_id.in_(event_ids)
+        )
+    ))
+    for event_id, is_registered in rows:
+        (registered if is_registered else waitlisted).add(event_id)
+    return registered, waitlisted
+
+
+def conditional_response(etag, render, last_modified=None, private=False):
+    """
+    Answers a conditional GET with 304 Not Modified before ``render`` is
+    called, otherwise returns what it renders. Either way the response
+    carries the validators and asks caches to revalidate before reuse.
+    """
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = make_response(render())
+    else:
+        response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    if private:
+        response.cache_control.private = True
+    else:
+        response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response
@@ -0,0 +1,71 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import update
+
+from models import db, BackgroundJob
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=current_app.config.get('BACKGROUND_JOB_WORKERS', 2),
+                    thread_name_prefix='background-job'
+                )
+    return _executor
+
+
+def submit_job(kind, func, *args, created_by_id=None, total=None):
+    """
+    Records a job and runs ``func(job_id, *args)`` on the job pool of this
+    process. ``func`` returns a JSON serializable result and may call
+    report_progress(). Returns the job id to poll.
+    A job whose process dies stays 'running'; the row keeps its last progress.
+    """
+    job = BackgroundJob(kind=kind, status='queued', total=total, created_by_id=created_by_id)
+    db.session.add(job)
+    db.session.commit()
+
+    app = current_app._get_current_object()
+    get_executor().submit(_run_job, app, job.id, func, args)
+    return job.id
+
+
+def _set_job(job_id, **values):
+    # Own short transaction, so progress is visible while the job's work is uncommitted
+    values['updated_at'] = datetime.utcnow()
+    with db.engine.begin() as connection:
+        connection.execute(update(BackgroundJob.__table__).where(
+            BackgroundJob.__table__.c.id == job_id
+        ).values(**values))
+
+
+def report_progress(job_id, progress, total=None):
+    values = {'progress': progress}
+    if total is not None:
+        values['total'] = total
+    _set_job(job_id, **values)
+
+
+def _run_job(app, job_id, func, args):
+    with app.app_context():
+        _set_job(job_id, status='running')
+        try:
+            result = func(job_id, *args)
+        except Exception as e:
+            db.session.rollback()
+            app.logger.exception('Background job %s failed', job_id)
+            _set_job(job_id, status='failed', error=str(e))
+        else:
+            _set_job(job_id, status='completed', result=json.dumps(result))
+        finally:
+            db.session.remove()
@@ -0,0 +1,159 @@
+import re
+import threading
+import time
+from collections import defaultdict
+
+from flask import current_app
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from models import db, Student, CareerCounsellor
+from services.cache import invalidate_on_write
+
+# Specialization categories and related keywords
+SPECIALIZATION_KEYWORDS = {
+    'Technology': ['technology', 'computer', 'it', 'software', 'programming', 'tech'],
+    'Healthcare': ['healthcare', 'medical', 'medicine', 'health', 'nursing'],
+    'Business': ['business', 'finance', 'management', 'entrepreneurship', 'marketing'],
+    'Engineering': ['engineering', 'mechanical', 'civil', 'electrical', 'electronics'],
+    'Arts': ['arts', 'creative', 'design', 'music', 'fine arts', 'media'],
+    'Science': ['science', 'physics', 'chemistry', 'biology', 'research'],
+    'Education': ['education', 'teaching', 'training', 'academic'],
+    'Law': ['law', 'legal', 'justice', 'advocacy']
+}
+
+DIRECT_MATCH_WEIGHT = 2  # Interest names the counsellor's specialization
+KEYWORD_MATCH_WEIGHT = 1  # Interest is a keyword of one of the counsellor's categories
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    return set(_TOKEN_RE.findall((text or '').lower()))
+
+
+def parse_interests(student_interests):
+    if isinstance(student_interests, str):
+        student_interests = student_interests.split(',')
+    return [interest.strip().lower() for interest in student_interests if interest and interest.strip()]
+
+
+class CounsellorMatcher:
+    """
+    Inverted index from interest token to the available counsellors it matches.
+    The index is built once from the counsellors table and rebuilt lazily after
+    a counsellor is written (registration, availability change) or after
+    MATCHING_INDEX_TTL seconds, so matching a student costs O(interests).
+    A match counts towards the counsellor's load straight away, so a batch
+    respects capacity before it commits; if the session rolls back instead,
+    the index is rebuilt.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = {}
+        self._counsellors = {}
+        self._loads = {}
+        self._built_at = None
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    def _build(self):
+        counsellors = db.session.query(
+            CareerCounsellor.id, CareerCounsellor.specialization, CareerCounsellor.rating
+        ).filter(CareerCounsellor.availability_status.is_(True)).all()
+
+        postings = defaultdict(dict)
+        for counsellor_id, specialization, _ in counsellors:
+            spec_tokens = tokenize(specialization)
+            for key in spec_tokens | {(specialization or '').strip().lower()}:
+                if key:
+                    postings[key][counsellor_id] = DIRECT_MATCH_WEIGHT
+            for category, keywords in SPECIALIZATION_KEYWORDS.items():
+                if category.lower() not in spec_tokens:
+                    continue
+                for keyword in keywords:
+                    postings[keyword].setdefault(counsellor_id, KEYWORD_MATCH_WEIGHT)
+
+        loads = dict(db.session.query(Student.counsellor_id, func.count(Student.id)).filter(
+            Student.counsellor_id.isnot(None)
+        ).group_by(Student.counsellor_id).all())
+
+        self._postings = dict(postings)
+        self._counsellors = {cid: float(rating or 0) for cid, _, rating in counsellors}
+        self._loads = {cid: loads.get(cid, 0) for cid in self._counsellors}
+        self._built_at = time.monotonic()
+
+    def _ensure_built(self):
+        ttl = current_app.config.get('MATCHING_INDEX_TTL', 300)
+        if self._built_at is None or time.monotonic() - self._built_at > ttl:
+            self._build()
+
+    def scores(self, interests):
+        """Returns {counsellor_id: match score} for the counsellors matching any interest"""
+        scores = defaultdict(int)
+        for interest in interests:
+            matched = {}
+            # Whole interest first (covers multi-word keywords such as 'fine arts'),
+            # then its individual words
+            for key in [interest, *tokenize(interest)]:
+                for counsellor_id, weight in self._postings.get(key, {}).items():
+                    if weight > matched.get(counsellor_id, 0):
+                        matched[counsellor_id] = weight
+            for counsellor_id, weight in matched.items():
+                scores[counsellor_id] += weight
+        return scores
+
+    def _pick(self, scores, capacity=None, exclude=()):
+        """Highest score wins; ties go to the least loaded, then best rated counsellor"""
+        best_key = None
+        best_id = None
+        candidates = scores if scores else self._counsellors
+        for counsellor_id in candidates:
+            if counsellor_id in exclude:
+                continue
+            load = self._loads.get(counsellor_id, 0)
+            if capacity is not None and load >= capacity:
+                continue
+            key = (scores.get(counsellor_id, 0), -load, self._counsellors.get(counsellor_id, 0))
+            if best_key is None or key > best_key:
+                best_key = key
+                best_id = counsellor_id
+        return best_id
+
+    def match(self, student_interests, capacity=None):
+        """
+        Picks a counsellor for the given interests and counts the student towards
+        their load. Falls back to the least loaded counsellor when nothing matches.
+        Returns the counsellor id, or None if no counsellor is available.
+        """
+        interests = parse_interests(student_interests)
+        with self._lock:
+            self._ensure_built()
+            scores = self.scores(interests)
+            counsellor_id = self._pick(scores, capacity)
+            if counsellor_id is None and scores:
+                # Every matching counsellor is full, spread over the rest
+                counsellor_id = self._pick({}, capacity)
+            if counsellor_id is not None:
+                self._loads[counsellor_id] = self._loads.get(counsellor_id, 0) + 1
+                db.session.info['_matcher_reserved'] = True
+            return counsellor_id
+
+
+matcher = CounsellorMatcher()
+invalidate_on_write(matcher.invalidate, CareerCounsellor)
+
+
+@event.listens_for(Session, 'after_commit')
+def _keep_reserved_loads(session):
+    session.info.pop('_matcher_reserved', None)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _drop_reserved_loads(session, previous_transaction):
+    # Loads counted for students that were never written are stale now
+    if session.info.pop('_matcher_reserved', False):
+        matcher.invalidate()
@@ -0,0 +1,152 @@
+import json
+import queue
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from models import Notification
+
+
+class NotificationBroker:
+    """
+    In-process publish/subscribe hub for notification events, keyed by user id.
+    Each open stream owns a bounded queue; a client too slow to drain it gets
+    a single 'resync' event instead of an ever growing backlog.
+    Only streams served by this process are reached, so multi-process
+    deployments need sticky sessions for the stream endpoint.
+    """
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        subscription = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, user_id, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def publish(self, user_id, event_name, data, event_id=None):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.put_nowait((event_name, data, event_id))
+            except queue.Full:
+                self._overflow(subscription)
+
+    @staticmethod
+    def _overflow(subscription):
+        try:
+            while True:
+                subscription.get_nowait()
+        except queue.Empty:
+            pass
+        subscription.put_nowait(('resync', {}, None))
+
+
+broker = NotificationBroker()
+
+
+def format_event(event_name, data, event_id=None):
+    """Encodes one Server-Sent Events frame"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event_name}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def stream_events(user_id, subscription, backlog=(), heartbeat=25, max_duration=300):
+    """
+    Generator for a text/event-stream response. Sends the ``backlog``
+    (event_name, data, event_id) events first, then whatever is published
+    for the user, with a comment line every ``heartbeat`` seconds to keep
+    proxies from closing the connection. Subscribe before reading the
+    backlog: events published in between arrive on both and are sent once.
+    Ends after ``max_duration`` seconds; EventSource reconnects on its own and
+    resumes from Last-Event-ID.
+    """
+    deadline = time.monotonic() + max_duration
+    try:
+        yield 'retry: 3000\n\n'
+        sent = set()
+        for event_name, data, event_id in backlog:
+            sent.add(event_id)
+            yield format_event(event_name, data, event_id)
+        while time.monotonic() < deadline:
+            try:
+                event_name, data, event_id = subscription.get(timeout=heartbeat)
+            except queue.Empty:
+                yield ': keepalive\n\n'
+                continue
+            if event_id is not None and event_id in sent:
+                continue
+            yield format_event(event_name, data, event_id)
+    finally:
+        broker.unsubscribe(user_id, subscription)
+
+
+def publish_after_commit(session, user_id, event_name, data, event_id=None):
+    """Queues an event that is only published once the current transaction commits"""
+    session.info.setdefault('_notification_events', []).append((user_id, event_name, data, event_id))
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_notification_changes(session, flush_context):
+    for obj in session.new:
+        if isinstance(obj, Notification) and obj.user_id is not None:
+            unread = not obj.read_status
+            publish_after_commit(session, obj.user_id, 'notification', {
+                'notification': obj.to_dict(),
+                'unread_delta': 1 if unread else 0
+            }, obj.notification_id)
+
+    for obj in session.dirty:
+        if not isinstance(obj, Notification) or obj.user_id is None:
+            continue
+        history = inspect(obj).attrs.read_status.history
+        if history.has_changes():
+            was_read = bool(history.deleted and history.deleted[0])
+            if bool(obj.read_status) != was_read:
+                publish_after_commit(session, obj.user_id, 'unread', {
+                    'delta': -1 if obj.read_status else 1,
+                    'notification_id': obj.notification_id
+                })
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk_inserts(orm_execute_state):
+    state = orm_execute_state
+    if not state.is_insert or state.bind_mapper is None or state.bind_mapper.class_ is not Notification:
+        return
+    params = state.parameters
+    if isinstance(params, dict):
+        params = [params]
+    # Bulk inserts do not return the new rows, let those clients refetch
+    for user_id in {p.get('user_id') for p in params or () if p.get('user_id') is not None}:
+        publish_after_commit(state.session, user_id, 'resync', {})
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_committed(session):
+    for user_id, event_name, data, event_id in session.info.pop('_notification_events', ()):
+        broker.publish(user_id, event_name, data, event_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back(session):
+    session.info.pop('_notification_events', None)
@@ -0,0 +1,198 @@
+import heapq
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import func, select, update
+
+from models import db, Student, CareerCounsellor, Appointment, AppointmentRequest
+from services.jobs import report_progress
+from services.outbox import enqueue
+from services.slots import BUSY_STATUSES, appointment_interval, load_calendar, lock_counsellor
+
+# Rows moved per transaction
+OFFBOARD_BATCH_SIZE = 500
+
+
+class LoadBalancer:
+    """Hands out the least loaded target counsellor that is still under capacity"""
+
+    def __init__(self, loads, capacity):
+        self.capacity = capacity
+        self.loads = dict(loads)
+        self._heap = [(load, cid) for cid, load in self.loads.items()]
+        heapq.heapify(self._heap)
+
+    def next(self):
+        while self._heap:
+            load, cid = self._heap[0]
+            if load != self.loads[cid]:
+                # Outdated entry, the counsellor has been picked since
+                heapq.heapreplace(self._heap, (self.loads[cid], cid))
+                continue
+            if self.capacity is not None and load >= self.capacity:
+                return None
+            self._take(cid)
+            return cid
+        return None
+
+    def ranked(self):
+        return sorted(self.loads, key=lambda cid: (self.loads[cid], cid))
+
+    def _take(self, cid):
+        self.loads[cid] += 1
+        heapq.heappush(self._heap, (self.loads[cid], cid))
+
+
+def _locked_batch(columns, criteria, order_by, batch_size):
+    # MySQL has no UPDATE ... RETURNING, so a batch is claimed with a locking
+    # read and then updated by primary key
+    return db.session.execute(
+        select(*columns).where(*criteria).order_by(*order_by).limit(batch_size).with_for_update()
+    ).all()
+
+
+def offboard_counsellor_job(job_id, counsellor_id, target_ids, capacity=None, batch_size=OFFBOARD_BATCH_SIZE):
+    """
+    Moves every student, upcoming appointment and pending request of
+    ``counsellor_id`` to the least loaded of ``target_ids``, respecting
+    ``capacity`` students per counsellor. Works in committed batches, so a
+    failed run can simply be started again. Appointments that clash with
+    every target's calendar are cancelled. Students and appointments are
+    notified through the outbox.
+    """
+    targets = {cid: f"{first_name} {last_name or ''}".strip() for cid, first_name, last_name in db.session.query(
+        CareerCounsellor.id, CareerCounsellor.first_name, CareerCounsellor.last_name
+    ).filter(
+        CareerCounsellor.id.in_(target_ids),
+        CareerCounsellor.id != counsellor_id,
+        CareerCounsellor.availability_status.is_(True)
+    )}
+    if not targets:
+        raise ValueError('No available counsellor to take over')
+
+    loads = dict.fromkeys(targets, 0)
+    loads.update(db.session.query(Student.counsellor_id, func.count(Student.id)).filter(
+        Student.counsellor_id.in_(targets)
+    ).group_by(Student.counsellor_id).all())
+    balancer = LoadBalancer(loads, capacity)
+
+    student_filter = (Student.counsellor_id == counsellor_id,)
+    appointment_filter = (
+        Appointment.counsellor_id == counsellor_id,
+        Appointment.status.in_(BUSY_STATUSES),
+        Appointment.appointment_date >= datetime.now().date()
+    )
+    request_filter = (AppointmentRequest.counsellor_id == counsellor_id, AppointmentRequest.status == 'pending')
+    total = db.session.execute(select(
+        select(func.count()).select_from(Student).where(*student_filter).scalar_subquery(),
+        select(func.count()).select_from(Appointment).where(*appointment_filter).scalar_subquery(),
+        select(func.count()).select_from(AppointmentRequest).where(*request_filter).scalar_subquery()
+    )).one()
+    report_progress(job_id, 0, sum(total))
+
+    summary = {
+        'students': 0,
+        'students_unassigned': 0,
+        'appointments': 0,
+        'appointments_cancelled': 0,
+        'requests': 0,
+        'by_counsellor': defaultdict(int)
+    }
+    new_counsellor = {}
+    done = 0
+
+    # Students
+    while True:
+        rows = _locked_batch([Student.id], student_filter, [Student.id], batch_size)
+        if not rows:
+            break
+        groups = defaultdict(list)
+        for (student_id,) in rows:
+            target = balancer.next()
+            new_counsellor[student_id] = target
+            groups[target].append(student_id)
+        for target, student_ids in groups.items():
+            db.session.execute(update(Student).where(Student.id.in_(student_ids)).values(
+                counsellor_id=target
+            ).execution_options(synchronize_session=False))
+            if target is None:
+                summary['students_unassigned'] += len(student_ids)
+                continue
+            summary['by_counsellor'][target] += len(student_ids)
+            enqueue('counsellor_reassigned', new_counsellor_id=target, new_counsellor_name=targets[target],
+                    student_ids=student_ids, appointments=[])
+        db.session.commit()
+        summary['students'] += len(rows)
+        done += len(rows)
+        report_progress(job_id, done)
+
+    # Upcoming appointments, kept with the student's new counsellor when free
+    while True:
+        rows = _locked_batch(
+            [Appointment.id, Appointment.student_id, Appointment.appointment_date,
+             Appointment.start_time, Appointment.end_time],
+            appointment_filter, [Appointment.appointment_date, Appointment.id], batch_size
+        )
+        if not rows:
+            break
+        first_day = min(row.appointment_date for row in rows)
+        last_day = max(row.appointment_date for row in rows)
+        calendars = {}
+        for target in sorted(targets):
+            lock_counsellor(target)
+            calendars[target] = load_calendar(target, first_day, last_day, lock=True)
+
+        moves = defaultdict(list)
+        cancelled = []
+        for row in rows:
+            start, end = appointment_interval(row.appointment_date, row.start_time, row.end_time)
+            preferred = new_counsellor.get(row.student_id)
+            candidates = ([preferred] if preferred in calendars else []) + balancer.ranked()
+            target = next((cid for cid in candidates if calendars[cid].is_free(start, end)), None)
+            if target is None:
+                cancelled.append(row)
+                continue
+            calendars[target].busy.add(start, end)
+            moves[target].append(row)
+
+        for target, moved in moves.items():
+            db.session.execute(update(Appointment).where(Appointment.id.in_([row.id for row in moved])).values(
+                counsellor_id=target
+            ).execution_options(synchronize_session=False))
+            enqueue('counsellor_reassigned', new_counsellor_id=target, new_counsellor_name=targets[target],
+                    student_ids=[], appointments=[[row.id, row.student_id, str(row.appointment_date)] for row in moved])
+            summary['appointments'] += len(moved)
+        if cancelled:
+            db.session.execute(update(Appointment).where(Appointment.id.in_([row.id for row in cancelled])).values(
+                status='cancelled'
+            ).execution_options(synchronize_session=False))
+            enqueue('appointments_cancelled',
+                    appointments=[[row.id, row.student_id, str(row.appointment_date)] for row in cancelled])
+            summary['appointments_cancelled'] += len(cancelled)
+        db.session.commit()
+        done += len(rows)
+        report_progress(job_id, done)
+
+    # Pending requests follow the student
+    while True:
+        rows = _locked_batch([AppointmentRequest.id, AppointmentRequest.student_id],
+                             request_filter, [AppointmentRequest.id], batch_size)
+        if not rows:
+            break
+        groups = defaultdict(list)
+        for row in rows:
+            target = new_counsellor.get(row.student_id)
+            if target not in targets:
+                target = balancer.ranked()[0]
+            groups[target].append(row.id)
+        for target, request_ids in groups.items():
+            db.session.execute(update(AppointmentRequest).where(AppointmentRequest.id.in_(request_ids)).values(
+                counsellor_id=target
+            ).execution_options(synchronize_session=False))
+        db.session.commit()
+        summary['requests'] += len(rows)
+        done += len(rows)
+        report_progress(job_id, done)
+
+    summary['by_counsellor'] = {targets[cid]: count for cid, count in summary['by_counsellor'].items()}
+    return summary
@@ -0,0 +1,206 @@
+import json
+import threading
+from datetime import datetime
+
+from sqlalchemy import delete, event, insert, literal, select
+from sqlalchemy.orm import Session
+
+from models import db, Notification, NotificationOutbox, NotificationOutboxRecipient
+
+# Notification rows per INSERT statement
+INSERT_BATCH_SIZE = 1000
+
+# Messages that keep failing are left for an operator after this many tries
+MAX_ATTEMPTS = 5
+
+_handlers = {}
+_wakeup = threading.Event()
+
+
+def outbox_handler(kind):
+    """
+    Registers a function expanding a ``kind`` message into notification
+    rows. It is called with the payload and the message's recipient ids.
+    """
+    def decorator(func):
+        _handlers[kind] = func
+        return func
+    return decorator
+
+
+def enqueue(kind, recipients=None, **payload):
+    """
+    Records a notification fan-out in the current transaction. Nothing is
+    sent unless the surrounding business write commits. ``recipients`` is
+    an optional SELECT of distinct user ids, copied by the database into
+    notification_outbox_recipients so they are never loaded here.
+    """
+    if kind not in _handlers:
+        raise ValueError(f'No outbox handler for {kind!r}')
+    message = NotificationOutbox(kind=kind, payload=json.dumps(payload))
+    db.session.add(message)
+    if recipients is not None:
+        db.session.flush()
+        recipients = recipients.subquery()
+        db.session.execute(insert(NotificationOutboxRecipient).from_select(
+            ['outbox_id', 'user_id'],
+            select(literal(message.id), recipients.c[0])
+        ))
+    return message
+
+
+@event.listens_for(Session, 'after_flush')
+def _note_enqueued(session, flush_context):
+    if any(isinstance(obj, NotificationOutbox) for obj in session.new):
+        session.info['_outbox_enqueued'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _wake_worker(session):
+    if session.info.pop('_outbox_enqueued', False):
+        _wakeup.set()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_enqueued(session):
+    session.info.pop('_outbox_enqueued', None)
+
+
+def process_message(message):
+    """Bulk inserts the notifications for one outbox message and marks it done"""
+    recipients = NotificationOutboxRecipient.__table__
+    user_ids = db.session.execute(
+        select(recipients.c.user_id).where(recipients.c.outbox_id == message.id)
+    ).scalars().all()
+    rows = list(_handlers[message.kind](json.loads(message.payload), user_ids))
+    now = datetime.now()
+    for row in rows:
+        row.setdefault('created_at', now)
+        row.setdefault('read_status', False)
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        db.session.execute(insert(Notification), rows[start:start + INSERT_BATCH_SIZE])
+    if user_ids:
+        db.session.execute(delete(recipients).where(recipients.c.outbox_id == message.id))
+    message.processed_at = datetime.utcnow()
+    return len(rows)
+
+
+def process_pending(limit=20):
+    """
+    Expands up to ``limit`` pending messages, one transaction each, and
+    returns how many were handled. Rows are claimed with SKIP LOCKED where
+    the database supports it, so several workers can run.
+    """
+    handled = 0
+    for _ in range(limit):
+        message = NotificationOutbox.query.filter(
+            NotificationOutbox.processed_at.is_(None),
+            NotificationOutbox.attempts < MAX_ATTEMPTS
+        ).order_by(NotificationOutbox.id).with_for_update(skip_locked=True).first()
+        if message is None:
+            db.session.rollback()
+            break
+        message_id = message.id
+        handled += 1
+        try:
+            process_message(message)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            failed = db.session.get(NotificationOutbox, message_id)
+            failed.attempts += 1
+            failed.last_error = str(e)
+            db.session.commit()
+    return handled
+
+
+def run_worker(app, poll_interval=5, stop=None):
+    """Processes the outbox until ``stop`` is set, waking early after each enqueue"""
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        _wakeup.clear()
+        with app.app_context():
+            try:
+                # Keep going while there is a backlog
+                while process_pending() and not stop.is_set():
+                    pass
+            except Exception as e:
+                app.logger.exception('Outbox worker failed: %s', e)
+            finally:
+                db.session.remove()
+        _wakeup.wait(poll_interval)
+
+
+_worker_lock = threading.Lock()
+_worker = None
+
+
+def ensure_worker(app):
+    """Starts the outbox worker on a daemon thread, once per process"""
+    global _worker
+    if _worker is not None:
+        return _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = threading.Thread(
+                target=run_worker,
+                args=(app, app.config.get('OUTBOX_POLL_INTERVAL', 5)),
+                name='notification-outbox',
+                daemon=True
+            )
+            _worker.start()
+    return _worker
+
+
+@outbox_handler('event_cancelled')
+def _event_cancelled(payload, recipients):
+    event_date = datetime.strptime(payload['event_date'], '%Y-%m-%d')
+    message = f'The event "{payload["title"]}" scheduled for {event_date.strftime("%B %d, %Y")} has been cancelled.'
+    # Messages queued before recipients were stored carry them in the payload
+    for student_id in recipients or payload.get('student_ids', ()):
+        yield {
+            'user_id': student_id,
+            'message': message,
+            'notification_type': 'general',
+            'related_entity_id': payload['event_id']
+        }
+
+
+@outbox_handler('counsellor_reassigned')
+def _counsellor_reassigned(payload, recipients):
+    name = payload['new_counsellor_name']
+    for student_id in payload['student_ids']:
+        yield {
+            'user_id': student_id,
+            'message': f'Your counsellor has been changed to {name} as your previous counsellor is no longer available.',
+            'notification_type': 'general',
+            'related_entity_id': payload['new_counsellor_id']
+        }
+    for appointment_id, student_id, appointment_date in payload['appointments']:
+        yield {
+            'user_id': student_id,
+            'message': f'Your appointment on {appointment_date} has been reassigned to {name} due to counsellor unavailability.',
+            'notification_type': 'appointment',
+            'related_entity_id': appointment_id
+        }
+
+
+@outbox_handler('appointments_cancelled')
+def _appointments_cancelled(payload, recipients):
+    for appointment_id, student_id, appointment_date in payload['appointments']:
+        yield {
+            'user_id': student_id,
+            'message': f'Your appointment on {appointment_date} has been cancelled because your counsellor is no longer available. Please request a new time.',
+            'notification_type': 'appointment',
+            'related_entity_id': appointment_id
+        }
+
+
+if __name__ == '__main__':
+    from app import app
+
+    print('Processing notification outbox, Ctrl+C to stop')
+    try:
+        run_worker(app, app.config.get('OUTBOX_POLL_INTERVAL', 5))
+    except KeyboardInterrupt:
+        pass
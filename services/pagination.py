@@ -0,0 +1,76 @@
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(sort_value, row_id):
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort_column):
+    """Decodes a cursor produced by encode_cursor, raising ValueError if it is malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if isinstance(sort_value, (list, dict, bool)):
+            raise TypeError(sort_value)
+        if sort_value is not None and sort_column.type.python_type is datetime:
+            sort_value = datetime.fromisoformat(sort_value)
+        return sort_value, int(row_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def _after(sort_column, id_column, value, last_id, descending):
+    """
+    Rows strictly after (value, last_id). NULL sort values come first in
+    ascending order and last in descending order, as on MySQL and SQLite,
+    and need their own branches since no comparison with NULL is true.
+    """
+    if descending:
+        if value is None:
+            return and_(sort_column.is_(None), id_column < last_id)
+        return or_(
+            sort_column < value,
+            and_(sort_column == value, id_column < last_id),
+            sort_column.is_(None)
+        )
+    if value is None:
+        return or_(
+            and_(sort_column.is_(None), id_column > last_id),
+            sort_column.isnot(None)
+        )
+    return or_(
+        sort_column > value,
+        and_(sort_column == value, id_column > last_id)
+    )
+
+
+def keyset_page(query, sort_column, id_column, descending=False, cursor=None, limit=50):
+    """
+    Returns one page of ``query`` ordered by (sort_column, id_column).
+    Instead of OFFSET, the page continues strictly after the row the cursor
+    points at, so fetching page N costs the same as fetching page 1.
+    Returns a tuple of (rows, next_cursor); next_cursor is None on the last page.
+    """
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort_column)
+        query = query.filter(_after(sort_column, id_column, value, last_id, descending))
+
+    if descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+    return rows, next_cursor
@@ -0,0 +1,179 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULT_METHOD = 'pbkdf2:sha256:600000'
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing pool queue stays full for longer than the wait timeout"""
+
+
+class PasswordHasher:
+    """
+    Runs password hashing and verification on a bounded worker pool so that a
+    login storm is limited to ``workers`` concurrent key derivations instead of
+    one per request thread.
+
+    ``pool='thread'`` is the default: hashlib's pbkdf2 and scrypt release the
+    GIL, so threads already use every core. ``pool='process'`` isolates the
+    work in spawned processes; the entry module must then be safe to import
+    (guarded by ``if __name__ == '__main__'``).
+    With ``workers=0`` everything runs inline in the calling thread.
+    At most ``workers * queue_factor`` jobs may be pending; further callers wait
+    up to ``timeout`` seconds for a slot and then get HashingBusy.
+    """
+
+    def __init__(self, method=DEFAULT_METHOD, workers=None, pool='thread', queue_factor=4, timeout=10):
+        if pool not in ('thread', 'process'):
+            raise ValueError(f'Unknown hashing pool type: {pool}')
+        self.method = method
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.pool = pool
+        self.timeout = timeout
+        self._prefix = None
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max(self.workers, 1) * queue_factor)
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None and self.pool == 'thread':
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+                elif self._pool is None:
+                    # spawn: forking a multi-threaded server process is unsafe
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context('spawn')
+                    )
+        return self._pool
+
+    def _submit(self, fn, *args):
+        # Every job holds a queue slot until it finishes, batches included
+        if not self._slots.acquire(timeout=self.timeout):
+            raise HashingBusy('Too many password hashing requests in flight')
+        try:
+            future = self._get_pool().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _run(self, fn, *args):
+        if self.workers == 0:
+            return fn(*args)
+        return self._submit(fn, *args).result()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def hash_many(self, passwords):
+        """Hashes a batch of passwords, spread over every worker at once"""
+        if self.workers == 0:
+            return [generate_password_hash(password, self.method) for password in passwords]
+        futures = [self._submit(generate_password_hash, password, self.method) for password in passwords]
+        return [future.result() for future in futures]
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    @property
+    def prefix(self):
+        """
+        The method as Werkzeug writes it into hashes, 'pbkdf2' expands to
+        'pbkdf2:sha256:1000000' for example. Found once from a probe hash.
+        """
+        if self._prefix is None:
+            self._prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return self._prefix
+
+    def needs_rehash(self, password_hash):
+        """True if the hash was made with a different algorithm or cost than configured"""
+        return password_hash.split('$', 1)[0] != self.prefix
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+def get_hasher():
+    """The PasswordHasher configured for the current app, created on first use"""
+    hasher = current_app.extensions.get('password_hasher')
+    if hasher is None:
+        hasher = PasswordHasher(
+            method=current_app.config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD),
+            workers=current_app.config.get('PASSWORD_HASH_WORKERS'),
+            pool=current_app.config.get('PASSWORD_HASH_POOL', 'thread'),
+            timeout=current_app.config.get('PASSWORD_HASH_TIMEOUT', 10)
+        )
+        current_app.extensions['password_hasher'] = hasher
+    return hasher
+
+
+def hash_password(password):
+    return get_hasher().hash(password)
+
+
+def hash_passwords(passwords):
+    return get_hasher().hash_many(passwords)
+
+
+def verify_password(password_hash, password):
+    return get_hasher().verify(password_hash, password)
+
+
+def needs_rehash(password_hash):
+    return get_hasher().needs_rehash(password_hash)
+
+
+def benchmark(method=DEFAULT_METHOD, workers=None, pool='thread', seconds=5.0, clients=None):
+    """
+    Runs simulated logins (one verify each) from ``clients`` threads for
+    ``seconds`` and returns (logins per second, logins per second per core).
+    """
+    hasher = PasswordHasher(method=method, workers=workers, pool=pool)
+    clients = clients or max(hasher.workers, 1) * 2
+    password_hash = generate_password_hash('benchmark-password', method)
+    hasher.verify(password_hash, 'benchmark-password')  # Warm up the pool
+
+    done = [0] * clients
+    deadline = time.monotonic() + seconds
+
+    def client(index):
+        while time.monotonic() < deadline:
+            hasher.verify(password_hash, 'benchmark-password')
+            done[index] += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    hasher.shutdown()
+
+    rate = sum(done) / elapsed
+    return rate, rate / max(hasher.workers, 1)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Measure password verification throughput')
+    parser.add_argument('--method', default=DEFAULT_METHOD)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--pool', choices=['thread', 'process'], default='thread')
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    rate, per_core = benchmark(args.method, args.workers, args.pool, args.seconds)
+    print(f'{args.method} ({args.pool} pool): {rate:.1f} logins/sec total, {per_core:.1f} logins/sec per core')
@@ -0,0 +1,172 @@
+import functools
+from datetime import datetime
+from types import MappingProxyType
+
+from flask import current_app
+from flask_login import AnonymousUserMixin
+from sqlalchemy import event, inspect, literal, select, union_all, update
+from sqlalchemy.orm import Session
+
+from models import db, Student, CareerCounsellor, Administrator
+from services.cache import TTLCache, is_bulk_write, invalidate_now_and_after_commit
+
+USER_MODELS = {
+    'student': Student,
+    'counsellor': CareerCounsellor,
+    'admin': Administrator
+}
+
+# Never kept in the cache
+_EXCLUDED_COLUMNS = {'password_hash'}
+
+_principal_cache = TTLCache()
+
+
+class Principal:
+    """
+    Compact read-only stand-in for the logged in user.
+    Built from a cached snapshot of the user's columns, so most requests never
+    touch the user tables. Anything that is not a column (relationships such as
+    ``students``) is read from the real model, loaded on first access.
+    """
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, role, snapshot):
+        object.__setattr__(self, 'role', role)
+        object.__setattr__(self, '_snapshot', snapshot)
+        object.__setattr__(self, '_model', None)
+
+    def get_id(self):
+        return f"{self.role}-{self._snapshot['id']}"
+
+    @property
+    def is_active(self):
+        active = self._snapshot.get('is_active', True)
+        return True if active is None else active
+
+    @property
+    def model(self):
+        """The ORM instance behind this principal, loaded once per request"""
+        if self._model is None:
+            object.__setattr__(self, '_model', db.session.get(USER_MODELS[self.role], self._snapshot['id']))
+        return self._model
+
+    def __getattr__(self, name):
+        snapshot = object.__getattribute__(self, '_snapshot')
+        if name in snapshot:
+            return snapshot[name]
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Principal is read-only, update the model instead')
+
+    def __repr__(self):
+        return f'<Principal {self.get_id()}>'
+
+
+class AnonymousPrincipal(AnonymousUserMixin):
+    role = None
+
+
+def _snapshot(user):
+    columns = inspect(type(user)).columns
+    return MappingProxyType({
+        column.key: getattr(user, column.key)
+        for column in columns if column.key not in _EXCLUDED_COLUMNS
+    })
+
+
+def load_principal(user_id):
+    """
+    Resolves a ``student-/counsellor-/admin-<id>`` session id to a Principal.
+    Returns None if the id is malformed or the account no longer exists.
+    """
+    if not user_id or '-' not in user_id:
+        return None
+    role, id = user_id.split('-', 1)
+    if role not in USER_MODELS or not id.isdigit():
+        return None
+
+    snapshot = _principal_cache.get(user_id)
+    if snapshot is None:
+        user = db.session.get(USER_MODELS[role], int(id))
+        if user is None:
+            return None
+        snapshot = _snapshot(user)
+        _principal_cache.set(user_id, snapshot, current_app.config.get('USER_CACHE_TTL', 60))
+    return Principal(role, snapshot)
+
+
+def invalidate_principal(user_id=None):
+    """Drops one cached principal, or all of them when no id is given"""
+    _principal_cache.invalidate(user_id)
+
+
+_user_model_classes = tuple(USER_MODELS.values())
+
+
+@event.listens_for(Session, 'after_flush')
+def _invalidate_flushed_users(session, flush_context):
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, _user_model_classes):
+            invalidate_now_and_after_commit(session, functools.partial(invalidate_principal, obj.get_id()))
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _invalidate_bulk_users(orm_execute_state):
+    # Bulk UPDATE/DELETE does not say which rows changed
+    if not orm_execute_state.is_insert and is_bulk_write(orm_execute_state, _user_model_classes):
+        invalidate_now_and_after_commit(orm_execute_state.session, invalidate_principal)
+
+
+def find_account(email):
+    """
+    Looks an email up in all three account tables with a single UNION ALL
+    query, each branch using the table's unique email index.
+    Returns (role, id, password_hash, is_active) or None. Should the same email
+    exist in several tables, admin wins over student over counsellor.
+    """
+    # (role, model, is_active column); counsellors have no is_active column
+    accounts = [
+        ('admin', Administrator, Administrator.is_active),
+        ('student', Student, Student.is_active),
+        ('counsellor', CareerCounsellor, literal(True))
+    ]
+    branches = [
+        select(
+            literal(priority).label('priority'),
+            literal(role).label('role'),
+            model.id,
+            model.password_hash,
+            is_active.label('is_active')
+        ).where(model.email == email)
+        for priority, (role, model, is_active) in enumerate(accounts)
+    ]
+    rows = db.session.execute(union_all(*branches)).all()
+    if not rows:
+        return None
+    _, role, id, password_hash, is_active = min(rows, key=lambda row: row[0])
+    return role, id, password_hash, is_active
+
+
+def record_login(role, id, new_password_hash=None):
+    """
+    Stamps last_login (and stores a rehashed password, if given) without
+    loading the user or evicting other cached principals.
+    """
+    table = USER_MODELS[role].__table__
+    values = {'last_login': datetime.utcnow()}
+    if new_password_hash:
+        values['password_hash'] = new_password_hash
+    db.session.execute(update(table).where(table.c.id == id).values(**values))
+    db.session.commit()
+    invalidate_principal(f'{role}-{id}')
+
+
+def principal_for_login(role, id, is_active):
+    """Minimal principal for login_user(); the full snapshot is loaded on the next request"""
+    return Principal(role, MappingProxyType({'id': id, 'is_active': is_active}))
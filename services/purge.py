@@ -0,0 +1,122 @@
+from sqlalchemy import delete, func, or_, select
+
+from models import (
+    db, Student, Appointment, AppointmentRequest, CounsellingSession, Feedback, Grievance,
+    EventRegistration, EventWaitlist, CareerGoal, GoalMilestone, StudentDocument, DocumentUpload, StudentStorage, Notification, Message,
+    Task, StudentResourceAccess, CounsellorAssignmentLog
+)
+from services.jobs import report_progress
+from services.document_store import release_student_documents
+from services.registrations import release_student_seats
+from services.unread_counters import SKIP_COUNTERS, counters
+
+# Rows deleted per statement when purging in the background
+PURGE_BATCH_SIZE = 1000
+
+
+def _purge_steps(student_id, delete_account):
+    """
+    (name, model, criteria) for everything hanging off a student, children
+    before parents so foreign keys without ON DELETE CASCADE are satisfied.
+    Deactivation keeps the account's tasks, resource history and
+    assignment log; deleting the account removes those as well.
+    """
+    appointment_ids = select(Appointment.id).where(Appointment.student_id == student_id)
+    session_ids = select(CounsellingSession.session_id).where(CounsellingSession.appointment_id.in_(appointment_ids))
+    goal_ids = select(CareerGoal.goal_id).where(CareerGoal.student_id == student_id)
+
+    steps = [
+        ('feedback', Feedback, or_(Feedback.session_id.in_(session_ids), Feedback.student_id == student_id)),
+        ('counselling_sessions', CounsellingSession, CounsellingSession.appointment_id.in_(appointment_ids)),
+        ('appointments', Appointment, Appointment.student_id == student_id),
+        ('appointment_requests', AppointmentRequest, AppointmentRequest.student_id == student_id),
+        ('grievances', Grievance, Grievance.student_id == student_id),
+        ('event_registrations', EventRegistration, EventRegistration.student_id == student_id),
+        ('event_waitlist', EventWaitlist, EventWaitlist.student_id == student_id),
+        ('goal_milestones', GoalMilestone, GoalMilestone.goal_id.in_(goal_ids)),
+        ('career_goals', CareerGoal, CareerGoal.student_id == student_id),
+        ('student_documents', StudentDocument, StudentDocument.student_id == student_id),
+        ('document_uploads', DocumentUpload, DocumentUpload.student_id == student_id),
+        ('student_storage', StudentStorage, StudentStorage.student_id == student_id),
+        ('notifications', Notification, Notification.user_id == student_id),
+        ('messages', Message, or_(Message.sender_id == student_id, Message.recipient_id == student_id)),
+    ]
+    if delete_account:
+        steps += [
+            ('tasks', Task, Task.student_id == student_id),
+            ('student_resource_access', StudentResourceAccess, StudentResourceAccess.student_id == student_id),
+            ('counsellor_assignment_logs', CounsellorAssignmentLog, CounsellorAssignmentLog.student_id == student_id),
+        ]
+    return steps
+
+
+def count_student_history(student_id, delete_account=False):
+    """Rows a purge would delete, per table, counted in one round trip"""
+    steps = _purge_steps(student_id, delete_account)
+    row = db.session.execute(select(*[
+        select(func.count()).select_from(model).where(criteria).scalar_subquery()
+        for _, model, criteria in steps
+    ])).one()
+    return {name: count for (name, _, _), count in zip(steps, row)}
+
+
+def _delete(model, criteria):
+    # The unread counter row is removed with the student's notifications
+    statement = delete(model).where(criteria).execution_options(
+        synchronize_session=False, **{SKIP_COUNTERS: True}
+    )
+    return db.session.execute(statement).rowcount
+
+
+def _finish(student_id, delete_account, counts):
+    db.session.execute(counters.delete().where(counters.c.user_id == student_id))
+    if delete_account:
+        counts['student'] = _delete(Student, Student.id == student_id)
+    return counts
+
+
+def purge_student(student_id, delete_account=False):
+    """
+    Removes the student's dependent rows with one DELETE per table and,
+    with ``delete_account``, the student itself. Runs in the caller's
+    transaction and returns the deleted row count per table.
+    """
+    release_student_seats(student_id)
+    release_student_documents(student_id)
+    counts = {}
+    for name, model, criteria in _purge_steps(student_id, delete_account):
+        counts[name] = _delete(model, criteria)
+    return _finish(student_id, delete_account, counts)
+
+
+def purge_student_job(job_id, student_id, delete_account=False, batch_size=PURGE_BATCH_SIZE):
+    """
+    Background variant of purge_student() for large histories. Deletes
+    ``batch_size`` rows per statement and commits after each batch so no
+    lock is held for long, reporting progress to the job as it goes.
+    """
+    steps = _purge_steps(student_id, delete_account)
+    report_progress(job_id, 0, sum(count_student_history(student_id, delete_account).values()))
+    # Seats are handed to the waitlists and blob references dropped before the rows go
+    release_student_seats(student_id)
+    release_student_documents(student_id)
+    db.session.commit()
+
+    counts = {}
+    done = 0
+    for name, model, criteria in steps:
+        pk = model.__mapper__.primary_key[0]
+        counts[name] = 0
+        while True:
+            ids = db.session.execute(select(pk).where(criteria).limit(batch_size)).scalars().all()
+            if not ids:
+                break
+            deleted = _delete(model, pk.in_(ids))
+            db.session.commit()
+            counts[name] += deleted
+            done += deleted
+            report_progress(job_id, done)
+
+    counts = _finish(student_id, delete_account, counts)
+    db.session.commit()
+    return counts
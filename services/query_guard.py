@@ -0,0 +1,25 @@
+from flask import g, request
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised in testing when a request runs more than MAX_QUERIES_PER_REQUEST queries"""
+
+
+def init_query_guard(app):
+    """
+    Fails any request that runs more than MAX_QUERIES_PER_REQUEST queries
+    while the app is in testing mode, listing the statements, so an N+1
+    introduced in a template or route shows up as an error in the tests.
+    Queries are counted by services/sql_metrics.py, including those of the
+    sections the student dashboard loads on its worker pool.
+    """
+    @app.after_request
+    def check_query_budget(response):
+        limit = app.config.get('MAX_QUERIES_PER_REQUEST')
+        stats = g.get('sql_stats')
+        if app.testing and limit is not None and stats is not None and stats.count > limit:
+            raise QueryBudgetExceeded(
+                f'{request.method} {request.path} ran {stats.count} queries, the limit is {limit}:\n'
+                + '\n'.join(stats.statements)
+            )
+        return response
@@ -0,0 +1,212 @@
+import threading
+from collections import Counter
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import delete, exists, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Event, EventRegistration, EventWaitlist, Notification
+
+
+class AlreadyRegistered(Exception):
+    """Raised when a student already holds a seat or a waitlist place"""
+
+
+def _claim_seat(event_id):
+    """
+    Takes a seat with one conditional UPDATE, so concurrent registrations
+    can never push registered_count past capacity. False when full.
+    """
+    result = db.session.execute(update(Event).where(
+        Event.event_id == event_id,
+        or_(Event.capacity.is_(None), Event.registered_count < Event.capacity)
+    ).values(registered_count=Event.registered_count + 1).execution_options(synchronize_session=False))
+    return result.rowcount == 1
+
+
+def _lock_event(event_id):
+    # The event row is always locked before registration rows, in every path,
+    # so registering and cancelling cannot deadlock each other
+    return db.session.execute(
+        select(Event).where(Event.event_id == event_id).with_for_update()
+    ).scalar_one()
+
+
+def register_student(event_id, student_id):
+    """
+    Gives the student a seat, or a place on the waitlist when the event is
+    full. Runs in the caller's transaction. Returns 'registered' or
+    'waitlisted' and raises AlreadyRegistered for a second attempt.
+    """
+    taken = db.session.query(
+        exists().where(EventRegistration.event_id == event_id, EventRegistration.student_id == student_id)
+    ).scalar() or db.session.query(
+        exists().where(EventWaitlist.event_id == event_id, EventWaitlist.student_id == student_id)
+    ).scalar()
+    if taken:
+        raise AlreadyRegistered('Already registered for this event')
+
+    try:
+        # The unique constraints settle concurrent attempts by the same student
+        with db.session.begin_nested():
+            if _claim_seat(event_id):
+                status = 'registered'
+                db.session.add(EventRegistration(
+                    event_id=event_id,
+                    student_id=student_id,
+                    registered_at=datetime.now(),
+                    attendance_status='registered'
+                ))
+            else:
+                status = 'waitlisted'
+                db.session.add(EventWaitlist(event_id=event_id, student_id=student_id))
+    except IntegrityError:
+        raise AlreadyRegistered('Already registered for this event')
+    return status
+
+
+def _release_seats(event, seats):
+    db.session.execute(update(Event).where(Event.event_id == event.event_id).values(
+        registered_count=Event.registered_count - seats
+    ).execution_options(synchronize_session=False))
+    return promote_waitlist(event)
+
+
+def promote_waitlist(event):
+    """
+    Moves waitlisted students, oldest first, into seats that are free and
+    notifies them. The event row must be locked. Returns their ids.
+    """
+    promoted = []
+    while True:
+        entry = db.session.execute(select(EventWaitlist.id, EventWaitlist.student_id).where(
+            EventWaitlist.event_id == event.event_id,
+            ~exists().where(
+                EventRegistration.event_id == EventWaitlist.event_id,
+                EventRegistration.student_id == EventWaitlist.student_id
+            )
+        ).order_by(EventWaitlist.id).limit(1)).first()
+        if entry is None or not _claim_seat(event.event_id):
+            break
+        db.session.execute(delete(EventWaitlist).where(EventWaitlist.id == entry.id))
+        db.session.add(EventRegistration(
+            event_id=event.event_id,
+            student_id=entry.student_id,
+            registered_at=datetime.now(),
+            attendance_status='registered'
+        ))
+        db.session.add(Notification(
+            user_id=entry.student_id,
+            message=f'A seat has opened up and you are now registered for {event.title} on {event.event_date.strftime("%B %d, %Y")}.',
+            notification_type='general',
+            related_entity_id=event.event_id,
+            created_at=datetime.now()
+        ))
+        promoted.append(entry.student_id)
+    return promoted
+
+
+def cancel_registration(event_id, student_id):
+    """
+    Frees the student's seat, or their waitlist place, and promotes the
+    waitlist into the seat. Runs in the caller's transaction. Returns
+    False if the student held neither.
+    """
+    event = _lock_event(event_id)
+    cancelled = db.session.execute(delete(EventRegistration).where(
+        EventRegistration.event_id == event_id,
+        EventRegistration.student_id == student_id
+    )).rowcount
+    if cancelled:
+        _release_seats(event, cancelled)
+        return True
+    return db.session.execute(delete(EventWaitlist).where(
+        EventWaitlist.event_id == event_id,
+        EventWaitlist.student_id == student_id
+    )).rowcount > 0
+
+
+def release_student_seats(student_id):
+    """
+    Gives back every seat the student holds and promotes those waitlists,
+    ahead of their registrations being deleted by services/purge.py.
+    """
+    event_ids = db.session.execute(select(EventRegistration.event_id).where(
+        EventRegistration.student_id == student_id
+    )).scalars().all()
+    for event_id, seats in sorted(Counter(event_ids).items()):
+        _release_seats(_lock_event(event_id), seats)
+
+
+def benchmark(event_id, student_ids, clients=8):
+    """
+    Has ``clients`` threads register ``student_ids`` for one event at the
+    same time, then cancels a few seats. Returns (registered, waitlisted,
+    seats taken, capacity). The registrations are removed afterwards.
+    """
+    app = current_app._get_current_object()
+    outcomes = Counter()
+    lock = threading.Lock()
+
+    def client(index):
+        with app.app_context():
+            for student_id in student_ids[index::clients]:
+                try:
+                    status = register_student(event_id, student_id)
+                    db.session.commit()
+                except AlreadyRegistered:
+                    db.session.rollback()
+                    status = 'duplicate'
+                with lock:
+                    outcomes[status] += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Cancellations must hand their seats to the waitlist
+    for student_id in db.session.execute(select(EventRegistration.student_id).where(
+        EventRegistration.event_id == event_id
+    ).limit(clients)).scalars().all():
+        cancel_registration(event_id, student_id)
+    db.session.commit()
+
+    event = db.session.get(Event, event_id, populate_existing=True)
+    seats = db.session.query(EventRegistration).filter_by(event_id=event_id).count()
+    if seats != event.registered_count:
+        raise AssertionError(f'{seats} registrations but registered_count is {event.registered_count}')
+
+    EventWaitlist.query.filter_by(event_id=event_id).delete()
+    EventRegistration.query.filter_by(event_id=event_id).delete()
+    event.registered_count = 0
+    db.session.commit()
+    return outcomes['registered'], outcomes['waitlisted'], seats, event.capacity
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    from app import app
+    from models import Student
+
+    parser = argparse.ArgumentParser(description='Race concurrent registrations for one event')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--students', type=int, default=200)
+    args = parser.parse_args()
+
+    with app.app_context():
+        event = Event.query.filter(Event.capacity.isnot(None), Event.registered_count == 0).first()
+        student_ids = [student_id for (student_id,) in db.session.query(Student.id).limit(args.students)]
+        if event is None or not student_ids:
+            raise SystemExit('Needs an event with a capacity and no registrations, and some students')
+        started = time.monotonic()
+        registered, waitlisted, seats, capacity = benchmark(event.event_id, student_ids, args.clients)
+        elapsed = time.monotonic() - started
+    print(f'{registered} registered, {waitlisted} waitlisted, {seats} of {capacity} seats taken '
+          f'after cancellations in {elapsed:.2f}s')
+    if registered > capacity or seats > capacity:
+        raise SystemExit('Capacity exceeded')
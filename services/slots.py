@@ -0,0 +1,228 @@
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import update
+
+from models import db, Appointment, CareerCounsellor, CounsellorSchedule
+
+DEFAULT_DURATION = timedelta(hours=1)
+
+# Appointments in these states occupy the counsellor's time
+BUSY_STATUSES = ('scheduled', 'rescheduled')
+
+
+class SlotUnavailable(Exception):
+    """Raised when a requested appointment slot cannot be booked"""
+
+
+class IntervalSet:
+    """
+    Sorted, non-overlapping half open [start, end) intervals.
+    Overlapping or touching intervals are merged on insert, so both the
+    starts and the ends stay sorted and lookups are a single bisect.
+    """
+
+    def __init__(self, intervals=()):
+        self._starts = []
+        self._ends = []
+        for start, end in sorted(intervals):
+            self.add(start, end)
+
+    def __iter__(self):
+        return iter(zip(self._starts, self._ends))
+
+    def __len__(self):
+        return len(self._starts)
+
+    def add(self, start, end):
+        if end <= start:
+            return
+        # Every interval touching [start, end] is absorbed into the new one
+        lo = bisect_left(self._ends, start)
+        hi = bisect_right(self._starts, end)
+        if lo < hi:
+            start = min(start, self._starts[lo])
+            end = max(end, self._ends[hi - 1])
+            del self._starts[lo:hi]
+            del self._ends[lo:hi]
+        i = bisect_left(self._starts, start)
+        self._starts.insert(i, start)
+        self._ends.insert(i, end)
+
+    def overlaps(self, start, end):
+        """True if any interval intersects [start, end)"""
+        i = bisect_left(self._starts, end) - 1
+        return i >= 0 and self._ends[i] > start
+
+    def covers(self, start, end):
+        """True if [start, end) lies inside a single interval"""
+        i = bisect_right(self._starts, start) - 1
+        return i >= 0 and self._ends[i] >= end
+
+
+class CounsellorCalendar:
+    """Working hours and booked appointments of one counsellor over a date range"""
+
+    def __init__(self, counsellor_id, working, busy):
+        self.counsellor_id = counsellor_id
+        self.working = working
+        self.busy = busy
+
+    def is_free(self, start, end, within_hours=False):
+        if within_hours and not self.working.covers(start, end):
+            return False
+        return not self.busy.overlaps(start, end)
+
+
+def appointment_interval(appointment_date, start_time, end_time=None):
+    start = datetime.combine(appointment_date, start_time)
+    end = datetime.combine(appointment_date, end_time) if end_time else start + DEFAULT_DURATION
+    return start, end
+
+
+def load_calendar(counsellor_id, start_date, end_date, exclude_appointment_id=None, lock=False):
+    """
+    Builds the free/busy picture for ``counsellor_id`` between ``start_date``
+    and ``end_date`` inclusive. With ``lock`` the appointments are read with a
+    locking read, which on InnoDB sees the latest committed bookings instead
+    of the transaction's snapshot.
+    """
+    schedules = CounsellorSchedule.query.filter_by(counsellor_id=counsellor_id).all()
+    hours_by_day = {}
+    for schedule in schedules:
+        if schedule.start_time and schedule.end_time:
+            hours_by_day.setdefault(schedule.day_of_week, []).append((schedule.start_time, schedule.end_time))
+
+    working = IntervalSet()
+    day = start_date
+    while day <= end_date:
+        for start_time, end_time in hours_by_day.get(day.strftime('%A'), ()):
+            working.add(*appointment_interval(day, start_time, end_time))
+        day += timedelta(days=1)
+
+    query = db.session.query(
+        Appointment.appointment_date, Appointment.start_time, Appointment.end_time
+    ).filter(
+        Appointment.counsellor_id == counsellor_id,
+        Appointment.status.in_(BUSY_STATUSES),
+        Appointment.appointment_date.between(start_date, end_date)
+    )
+    if exclude_appointment_id is not None:
+        query = query.filter(Appointment.id != exclude_appointment_id)
+    if lock:
+        query = query.with_for_update(read=True)
+
+    busy = IntervalSet(appointment_interval(*row) for row in query)
+    return CounsellorCalendar(counsellor_id, working, busy)
+
+
+def lock_counsellor(counsellor_id):
+    """
+    Takes the counsellor's row lock until the transaction ends, so bookings
+    for one counsellor are serialized. A no-op UPDATE is used rather than
+    SELECT ... FOR UPDATE because it also takes the write lock on SQLite.
+    It runs on the connection to stay clear of the session's cache hooks.
+    """
+    table = CareerCounsellor.__table__
+    result = db.session.connection().execute(
+        update(table).where(table.c.id == counsellor_id).values(id=table.c.id)
+    )
+    if result.rowcount == 0:
+        raise SlotUnavailable('Counsellor not found')
+
+
+def reserve_slot(counsellor_id, appointment_date, start_time, end_time=None,
+                 exclude_appointment_id=None, within_hours=False):
+    """
+    Checks that [start_time, end_time) on ``appointment_date`` is free for
+    the counsellor and keeps it that way until the caller commits.
+    Returns the end time to store, defaulting to a one hour appointment.
+    Raises SlotUnavailable if the slot is taken or outside working hours.
+    """
+    start, end = appointment_interval(appointment_date, start_time, end_time)
+    if end.date() != appointment_date or end <= start:
+        raise SlotUnavailable('Appointments must start and end on the same day')
+
+    lock_counsellor(counsellor_id)
+    calendar = load_calendar(counsellor_id, appointment_date, appointment_date,
+                             exclude_appointment_id=exclude_appointment_id, lock=True)
+
+    if within_hours and not calendar.working.covers(start, end):
+        raise SlotUnavailable("Selected time is outside counsellor's working hours")
+    if calendar.busy.overlaps(start, end):
+        raise SlotUnavailable('This time slot is already booked')
+    return end.time()
+
+
+def benchmark(counsellor_id, student_id, clients=8, attempts=20):
+    """
+    Has ``clients`` threads race to book overlapping slots for one counsellor
+    and returns (booked, rejected, double bookings). The appointments created
+    are removed again afterwards.
+    """
+    app = current_app._get_current_object()
+    day = datetime.now().date() + timedelta(days=3650)
+    # Half hour steps with one hour appointments, so neighbours overlap
+    starts = [(datetime.combine(day, datetime.min.time()) + timedelta(hours=8, minutes=30 * i)).time()
+              for i in range(attempts)]
+    booked = [0] * clients
+    rejected = [0] * clients
+
+    def client(index):
+        with app.app_context():
+            for start_time in starts[index % 2::2] + starts[(index + 1) % 2::2]:
+                try:
+                    end_time = reserve_slot(counsellor_id, day, start_time)
+                    db.session.add(Appointment(
+                        student_id=student_id,
+                        counsellor_id=counsellor_id,
+                        appointment_date=day,
+                        start_time=start_time,
+                        end_time=end_time,
+                        mode='online',
+                        status='scheduled'
+                    ))
+                    db.session.commit()
+                    booked[index] += 1
+                except SlotUnavailable:
+                    db.session.rollback()
+                    rejected[index] += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    rows = Appointment.query.filter_by(counsellor_id=counsellor_id, appointment_date=day).all()
+    intervals = sorted(appointment_interval(a.appointment_date, a.start_time, a.end_time) for a in rows)
+    double_bookings = sum(1 for (_, end), (start, _) in zip(intervals, intervals[1:]) if start < end)
+
+    Appointment.query.filter_by(counsellor_id=counsellor_id, appointment_date=day).delete()
+    db.session.commit()
+    return sum(booked), sum(rejected), double_bookings
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    from app import app
+    from models import Student
+
+    parser = argparse.ArgumentParser(description='Race concurrent bookings against one counsellor')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--attempts', type=int, default=20)
+    args = parser.parse_args()
+
+    with app.app_context():
+        counsellor = CareerCounsellor.query.first()
+        student = Student.query.first()
+        if counsellor is None or student is None:
+            raise SystemExit('Needs at least one counsellor and one student in the database')
+        started = time.monotonic()
+        booked, rejected, double_bookings = benchmark(counsellor.id, student.id, args.clients, args.attempts)
+        elapsed = time.monotonic() - started
+    print(f'{booked} booked, {rejected} rejected, {double_bookings} double bookings in {elapsed:.2f}s')
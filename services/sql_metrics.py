@@ -0,0 +1,178 @@
+import heapq
+import json
+import logging
+import threading
+import time
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Statements slower than SLOW_QUERY_THRESHOLD_MS, one JSON object per line
+slow_query_log = logging.getLogger('sql.slow')
+
+# Slowest statements kept per request and per endpoint
+TOP_STATEMENTS = 5
+
+
+def _normalize(statement, limit=500):
+    return ' '.join(statement.split())[:limit]
+
+
+def _keep_slowest(slowest, duration_ms, statement):
+    # Min-heap of (ms, statement), the fastest of the kept ones on top
+    if len(slowest) < TOP_STATEMENTS:
+        heapq.heappush(slowest, (duration_ms, statement))
+    elif duration_ms > slowest[0][0]:
+        heapq.heapreplace(slowest, (duration_ms, statement))
+
+
+class RequestStats:
+    """Queries run while handling one request"""
+
+    __slots__ = ('count', 'total_ms', 'slowest', 'statements')
+
+    def __init__(self, keep_statements=False):
+        self.count = 0
+        self.total_ms = 0.0
+        self.slowest = []
+        # Every statement, only kept for the query guard in testing
+        self.statements = [] if keep_statements else None
+
+    def record(self, statement, duration_ms):
+        self.count += 1
+        self.total_ms += duration_ms
+        _keep_slowest(self.slowest, duration_ms, statement)
+        if self.statements is not None:
+            self.statements.append(statement)
+
+    def merge(self, other):
+        """Adds queries run for the request on another thread"""
+        self.count += other.count
+        self.total_ms += other.total_ms
+        for duration_ms, statement in other.slowest:
+            _keep_slowest(self.slowest, duration_ms, statement)
+        if self.statements is not None and other.statements is not None:
+            self.statements.extend(other.statements)
+
+
+class EndpointMetrics:
+    """
+    Query count, database time and slowest statements per endpoint,
+    accumulated since the process started or the last reset().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def add(self, endpoint, stats, request_ms):
+        with self._lock:
+            metrics = self._endpoints.get(endpoint)
+            if metrics is None:
+                metrics = self._endpoints[endpoint] = {
+                    'requests': 0, 'queries': 0, 'max_queries': 0,
+                    'db_ms': 0.0, 'max_db_ms': 0.0, 'request_ms': 0.0, 'slowest': []
+                }
+            metrics['requests'] += 1
+            metrics['request_ms'] += request_ms
+            if stats is None:
+                return
+            metrics['queries'] += stats.count
+            metrics['max_queries'] = max(metrics['max_queries'], stats.count)
+            metrics['db_ms'] += stats.total_ms
+            metrics['max_db_ms'] = max(metrics['max_db_ms'], stats.total_ms)
+            for duration_ms, statement in stats.slowest:
+                if all(statement != kept for _, kept in metrics['slowest']):
+                    _keep_slowest(metrics['slowest'], duration_ms, statement)
+
+    def snapshot(self):
+        """One dict per endpoint, the most database time first"""
+        with self._lock:
+            rows = [dict(metrics, endpoint=endpoint, slowest=sorted(metrics['slowest'], reverse=True))
+                    for endpoint, metrics in self._endpoints.items()]
+        for row in rows:
+            requests = row['requests']
+            row['avg_queries'] = row['queries'] / requests
+            row['avg_db_ms'] = row['db_ms'] / requests
+            row['avg_request_ms'] = row['request_ms'] / requests
+        return sorted(rows, key=lambda row: row['db_ms'], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+endpoint_metrics = EndpointMetrics()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'handle_error')
+def _drop_timer(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('query_started'):
+        connection.info['query_started'].pop()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    duration_ms = (time.perf_counter() - conn.info['query_started'].pop()) * 1000
+    if not has_app_context():
+        return
+    # Worker threads loading part of a request get their own stats from
+    # track_worker_queries(), merged into the request's afterwards
+    stats = g.get('sql_stats')
+    if stats is None and has_request_context():
+        stats = g.sql_stats = RequestStats(keep_statements=current_app.testing)
+    if stats is not None:
+        stats.record(_normalize(statement), duration_ms)
+
+    threshold = current_app.config.get('SLOW_QUERY_THRESHOLD_MS')
+    if threshold is not None and duration_ms >= threshold and slow_query_log.isEnabledFor(logging.WARNING):
+        slow_query_log.warning(json.dumps({
+            'endpoint': request.endpoint if has_request_context() else g.get('sql_endpoint'),
+            'duration_ms': round(duration_ms, 2),
+            'executemany': executemany,
+            'statement': _normalize(statement, 2000)
+        }))
+
+
+def track_worker_queries(endpoint, keep_statements):
+    """
+    Collects the queries of a worker thread's app context into a fresh
+    RequestStats, returned for the request thread to merge() back
+    """
+    g.sql_endpoint = endpoint
+    g.sql_stats = RequestStats(keep_statements=keep_statements)
+    return g.sql_stats
+
+
+def request_stats():
+    """The current request's RequestStats, created if it ran no query yet"""
+    stats = g.get('sql_stats')
+    if stats is None:
+        stats = g.sql_stats = RequestStats(keep_statements=current_app.testing)
+    return stats
+
+
+def init_sql_metrics(app):
+    """Adds every request's query statistics to endpoint_metrics"""
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.teardown_request
+    def record_request_metrics(exc):
+        started = g.get('request_started')
+        if started is None:
+            return
+        # Popped, as requests served inside one outer app context share g
+        endpoint_metrics.add(
+            request.endpoint or 'unmatched',
+            g.pop('sql_stats', None),
+            (time.perf_counter() - started) * 1000
+        )
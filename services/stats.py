@@ -0,0 +1,73 @@
+from flask import current_app
+from sqlalchemy import case, func, select, true
+
+from models import db, Student, CareerCounsellor, Appointment, Grievance
+from services.cache import TTLCache, invalidate_on_write
+
+_stats_cache = TTLCache()
+
+
+def _count_where(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def compute_dashboard_stats():
+    """
+    Computes the admin dashboard counters in a single round trip.
+    Each table is scanned once using conditional aggregation and the
+    one-row aggregates are cross joined together.
+    """
+    students = select(
+        func.count(Student.id).label('total'),
+        _count_where(Student.is_active.is_(True)).label('active'),
+        _count_where(Student.is_active.is_(False)).label('inactive')
+    ).subquery()
+
+    counsellors = select(
+        func.count(CareerCounsellor.id).label('total'),
+        _count_where(CareerCounsellor.availability_status.is_(True)).label('active'),
+        _count_where(CareerCounsellor.availability_status.is_(False)).label('inactive')
+    ).subquery()
+
+    appointments = select(
+        func.count(Appointment.id).label('scheduled')
+    ).where(Appointment.status == 'scheduled').subquery()
+
+    grievances = select(
+        func.count(Grievance.id).label('pending')
+    ).where(Grievance.status == 'Pending').subquery()
+
+    stmt = select(
+        students.c.total, students.c.active, students.c.inactive,
+        counsellors.c.total, counsellors.c.active, counsellors.c.inactive,
+        appointments.c.scheduled, grievances.c.pending
+    ).select_from(
+        students.join(counsellors, true())
+        .join(appointments, true())
+        .join(grievances, true())
+    )
+    row = db.session.execute(stmt).one()
+
+    return {
+        'total_students': int(row[0]),
+        'active_students': int(row[1]),
+        'inactive_students': int(row[2]),
+        'total_counsellors': int(row[3]),
+        'active_counsellors': int(row[4]),
+        'inactive_counsellors': int(row[5]),
+        'active_sessions': int(row[6]),
+        'pending_grievances': int(row[7])
+    }
+
+
+def get_dashboard_stats():
+    """Returns the cached dashboard counters, recomputing them once the TTL expires"""
+    ttl = current_app.config.get('ADMIN_STATS_CACHE_TTL', 30)
+    return _stats_cache.get_or_set('dashboard', compute_dashboard_stats, ttl)
+
+
+def invalidate_dashboard_stats():
+    _stats_cache.invalidate()
+
+
+invalidate_on_write(invalidate_dashboard_stats, Student, CareerCounsellor, Appointment, Grievance)
@@ -0,0 +1,205 @@
+import os
+import re
+import shutil
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, func, insert, select
+
+from models import db, DocumentBlob, StudentDocument, StudentStorage
+from services.document_store import blob_path
+from services.jobs import report_progress
+from services.thumbnails import thumbnail_path
+
+# Top level directories the collector does not sweep; unfinished uploads in
+# chunks/ are expired by services/chunked_uploads.py
+SKIP_DIRS = {'chunks', 'quarantine'}
+
+BLOB_FILE = re.compile(r'^blobs/[0-9a-f]{2}/([0-9a-f]{64})$')
+
+# Files scanned between progress reports
+PROGRESS_EVERY = 1000
+
+
+def _scan(root, relative=''):
+    """Yields (path relative to root, DirEntry) of every file, one directory at a time"""
+    with os.scandir(os.path.join(root, relative)) as entries:
+        for entry in entries:
+            path = os.path.join(relative, entry.name)
+            if entry.is_dir(follow_symlinks=False):
+                if relative or entry.name not in SKIP_DIRS:
+                    yield from _scan(root, path)
+            elif entry.is_file(follow_symlinks=False):
+                yield path.replace(os.sep, '/'), entry
+
+
+def _referenced_paths(upload_folder):
+    """
+    Paths that must be kept, relative to UPLOAD_FOLDER: every blob with
+    references and its thumbnail, and the files of documents saved before
+    the blob store (found through ix_student_documents_blob_sha256).
+    Also returns the students owning each of those older files.
+    """
+    referenced = set()
+    for sha256 in db.session.execute(select(DocumentBlob.sha256).where(DocumentBlob.ref_count > 0)).scalars():
+        referenced.add(blob_path(sha256).replace(os.sep, '/'))
+        referenced.add(thumbnail_path(sha256).replace(os.sep, '/'))
+
+    legacy_owners = defaultdict(list)
+    for student_id, file_path in db.session.execute(select(
+        StudentDocument.student_id, StudentDocument.file_path
+    ).where(StudentDocument.blob_sha256.is_(None))):
+        path = os.path.relpath(os.path.join(upload_folder, file_path), upload_folder).replace(os.sep, '/')
+        referenced.add(path)
+        legacy_owners[path].append(student_id)
+    return referenced, legacy_owners
+
+
+def _dispose(upload_folder, path, quarantine_dir):
+    source = os.path.join(upload_folder, path)
+    if quarantine_dir is None:
+        os.remove(source)
+        return
+    target = os.path.join(quarantine_dir, path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    shutil.move(source, target)
+
+
+def _collect_blob(upload_folder, sha256, path, quarantine_dir):
+    """
+    Removes an unreferenced blob and its row, holding the row lock while
+    the file goes so an upload of the same content waits and then puts the
+    file back. False when the blob gained a reference since the scan began.
+    """
+    ref_count = db.session.execute(select(DocumentBlob.ref_count).where(
+        DocumentBlob.sha256 == sha256
+    ).with_for_update()).scalar()
+    if ref_count is not None and ref_count > 0:
+        db.session.rollback()
+        return False
+    db.session.execute(delete(DocumentBlob).where(DocumentBlob.sha256 == sha256))
+    _dispose(upload_folder, path, quarantine_dir)
+    db.session.commit()
+    return True
+
+
+def _expire_quarantine(upload_folder, keep_days):
+    # Quarantine directories are named by the day their files were moved there
+    root = os.path.join(upload_folder, 'quarantine')
+    if not os.path.isdir(root):
+        return 0
+    cutoff = (datetime.utcnow() - timedelta(days=keep_days)).strftime('%Y%m%d')
+    removed = 0
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False) and entry.name.isdigit() and entry.name < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+    return removed
+
+
+def refresh_student_storage(legacy_bytes=None):
+    """
+    Recounts every student's documents and bytes into student_storage, in
+    one transaction so the dashboard never reads a half written table.
+    Blob sizes come from document_blobs. Files saved before the blob store
+    only count with ``legacy_bytes``, per student, gathered from the disk.
+    """
+    totals = defaultdict(lambda: [0, 0])
+    for student_id, documents, stored in db.session.execute(select(
+        StudentDocument.student_id,
+        func.count(StudentDocument.document_id),
+        func.coalesce(func.sum(DocumentBlob.size), 0)
+    ).outerjoin(
+        DocumentBlob, DocumentBlob.sha256 == StudentDocument.blob_sha256
+    ).where(StudentDocument.student_id.isnot(None)).group_by(StudentDocument.student_id)):
+        totals[student_id][0] += documents
+        totals[student_id][1] += int(stored)
+    for student_id, size in (legacy_bytes or {}).items():
+        totals[student_id][1] += size
+
+    now = datetime.utcnow()
+    db.session.execute(delete(StudentStorage))
+    if totals:
+        db.session.execute(insert(StudentStorage), [
+            {'student_id': student_id, 'document_count': documents, 'bytes': size, 'updated_at': now}
+            for student_id, (documents, size) in totals.items()
+        ])
+    db.session.commit()
+    return len(totals)
+
+
+def collect_storage_garbage(job_id=None, dry_run=False):
+    """
+    Streams UPLOAD_FOLDER with os.scandir and removes every file no document
+    refers to: blobs without references, their thumbnails, stranded
+    temporary files and files of deleted documents. Orphans are moved to
+    quarantine/<day>/ for STORAGE_GC_QUARANTINE_DAYS, or deleted when that
+    is 0. Files newer than STORAGE_GC_GRACE_SECONDS are left alone, as
+    their upload may not have committed yet. Finishes by refreshing
+    student_storage. Runs as a background job or from the command line.
+    """
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    keep_days = current_app.config.get('STORAGE_GC_QUARANTINE_DAYS', 7)
+    cutoff = time.time() - current_app.config.get('STORAGE_GC_GRACE_SECONDS', 3600)
+    quarantine_dir = os.path.join(upload_folder, 'quarantine', datetime.utcnow().strftime('%Y%m%d')) if keep_days else None
+
+    referenced, legacy_owners = _referenced_paths(upload_folder)
+    # The snapshot above is all the scan needs, no transaction stays open during it
+    db.session.commit()
+
+    result = {'scanned': 0, 'kept_bytes': 0, 'orphans': 0, 'orphan_bytes': 0, 'skipped_recent': 0}
+    legacy_bytes = defaultdict(int)
+    if os.path.isdir(upload_folder):
+        for path, entry in _scan(upload_folder):
+            result['scanned'] += 1
+            if job_id is not None and result['scanned'] % PROGRESS_EVERY == 0:
+                report_progress(job_id, result['scanned'])
+            stat = entry.stat(follow_symlinks=False)
+            if path in referenced:
+                result['kept_bytes'] += stat.st_size
+                for student_id in legacy_owners.get(path, ()):
+                    legacy_bytes[student_id] += stat.st_size
+                continue
+            if stat.st_mtime > cutoff:
+                result['skipped_recent'] += 1
+                continue
+            if not dry_run:
+                blob = BLOB_FILE.match(path)
+                if blob:
+                    if not _collect_blob(upload_folder, blob.group(1), path, quarantine_dir):
+                        result['kept_bytes'] += stat.st_size
+                        continue
+                else:
+                    _dispose(upload_folder, path, quarantine_dir)
+            result['orphans'] += 1
+            result['orphan_bytes'] += stat.st_size
+
+    if not dry_run:
+        # Rows of blobs whose file is gone altogether
+        db.session.execute(delete(DocumentBlob).where(
+            DocumentBlob.ref_count <= 0,
+            DocumentBlob.created_at < datetime.utcfromtimestamp(cutoff)
+        ))
+        db.session.commit()
+        result['quarantine_days_removed'] = _expire_quarantine(upload_folder, keep_days)
+        result['students'] = refresh_student_storage(legacy_bytes)
+    if job_id is not None:
+        report_progress(job_id, result['scanned'], result['scanned'])
+    return result
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from app import app
+
+    parser = argparse.ArgumentParser(description='Remove uploaded files no document refers to')
+    parser.add_argument('--dry-run', action='store_true', help='only report what would be removed')
+    args = parser.parse_args()
+
+    with app.app_context():
+        result = collect_storage_garbage(dry_run=args.dry_run)
+    print(', '.join(f'{key}={value}' for key, value in result.items()))
@@ -0,0 +1,155 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from models import db, CareerCounsellor, Notification, Student
+from services.matching import matcher, parse_interests
+from services.passwords import hash_passwords
+from services.unread_counters import SKIP_COUNTERS
+
+CHUNK_SIZE = 1000
+
+
+def parse_import_file(file_storage):
+    """Reads an uploaded CSV or JSON file into a list of dicts"""
+    filename = (file_storage.filename or '').lower()
+    raw = file_storage.read().decode('utf-8-sig')
+    if filename.endswith('.json'):
+        records = json.loads(raw)
+        if isinstance(records, dict):
+            records = records.get('students', [])
+        if not isinstance(records, list):
+            raise ValueError('JSON import must be a list of students')
+        return records
+    if filename.endswith('.csv'):
+        return list(csv.DictReader(io.StringIO(raw)))
+    raise ValueError('Unsupported file type, expected .csv or .json')
+
+
+def _clean(record):
+    if not isinstance(record, dict):
+        raise ValueError('each record must be an object')
+    return {key.strip(): value.strip() if isinstance(value, str) else value
+            for key, value in record.items() if key}
+
+
+def _student_row(record, now):
+    """Validates one import record and turns it into a row for the student table"""
+    first_name = record.get('first_name')
+    email = (record.get('email') or '').lower()
+    if not first_name or not email:
+        raise ValueError('first_name and email are required')
+
+    # Plain passwords are hashed for the whole batch at once in import_students
+    password_hash = record.get('password_hash')
+    if not password_hash and not record.get('password'):
+        raise ValueError('password or password_hash is required')
+
+    dob = None
+    if record.get('dob'):
+        dob = datetime.strptime(record['dob'], '%Y-%m-%d').date()
+
+    interests = record.get('interests') or ''
+    if isinstance(interests, list):
+        interests = ','.join(interests)
+
+    return {
+        'email': email,
+        'password_hash': password_hash or None,
+        '_password': None if password_hash else record['password'],
+        'first_name': first_name,
+        'last_name': record.get('last_name'),
+        'phone': record.get('phone'),
+        'dob': dob,
+        'address': record.get('address'),
+        'education_level': record.get('education_level'),
+        'interests': ','.join(parse_interests(interests)),
+        'course': record.get('course'),
+        'is_active': True,
+        'date_registered': now
+    }
+
+
+def import_students(records, capacity=None):
+    """
+    Creates Student rows for a whole cohort in one pass.
+    Counsellors are picked from the matching index without reloading the
+    counsellors table per student and never above ``capacity`` students each.
+    Students, and a notification naming the counsellor of each assigned
+    student, are written with one bulk INSERT per chunk and committed together.
+    Returns a summary dict with created/skipped/unassigned counts and row errors.
+    """
+    now = datetime.utcnow()
+    summary = {'created': 0, 'skipped': 0, 'unassigned': 0, 'errors': []}
+
+    rows = []
+    seen_emails = set()
+    for line, record in enumerate(records, start=1):
+        try:
+            row = _student_row(_clean(record), now)
+        except (ValueError, TypeError) as e:
+            summary['errors'].append({'row': line, 'error': str(e)})
+            continue
+        if row['email'] in seen_emails:
+            summary['skipped'] += 1
+            continue
+        seen_emails.add(row['email'])
+        rows.append(row)
+
+    pending = [row for row in rows if row['password_hash'] is None]
+    for row, password_hash in zip(pending, hash_passwords([row['_password'] for row in pending])):
+        row['password_hash'] = password_hash
+    for row in rows:
+        del row['_password']
+
+    try:
+        for start in range(0, len(rows), CHUNK_SIZE):
+            chunk = rows[start:start + CHUNK_SIZE]
+
+            existing = {email for (email,) in db.session.query(Student.email).filter(
+                Student.email.in_([row['email'] for row in chunk])
+            )}
+            chunk = [row for row in chunk if row['email'] not in existing]
+            summary['skipped'] += len(existing)
+            if not chunk:
+                continue
+
+            for row in chunk:
+                row['counsellor_id'] = matcher.match(row['interests'], capacity=capacity)
+                if row['counsellor_id'] is None:
+                    summary['unassigned'] += 1
+
+            db.session.execute(insert(Student), chunk)
+            summary['created'] += len(chunk)
+
+            assigned = [row for row in chunk if row['counsellor_id']]
+            if not assigned:
+                continue
+            # Bulk executemany inserts do not hand back ids on every backend
+            ids = dict(db.session.query(Student.email, Student.id).filter(
+                Student.email.in_([row['email'] for row in assigned])
+            ).all())
+            created_at = datetime.now()
+            names = {cid: f"{first_name} {last_name or ''}".strip() for cid, first_name, last_name in db.session.query(
+                CareerCounsellor.id, CareerCounsellor.first_name, CareerCounsellor.last_name
+            ).filter(CareerCounsellor.id.in_({row['counsellor_id'] for row in assigned}))}
+            # New students have no unread counter yet, it is built on first read
+            db.session.execute(insert(Notification).execution_options(**{SKIP_COUNTERS: True}), [{
+                'user_id': ids[row['email']],
+                'message': f"Welcome! {names.get(row['counsellor_id'], 'A counsellor')} has been assigned as your counsellor based on your interests.",
+                'notification_type': 'general',
+                'related_entity_id': row['counsellor_id'],
+                'created_at': created_at,
+                'read_status': False
+            } for row in assigned])
+
+        db.session.commit()
+    except Exception:
+        # Rolling back also drops the loads counted for these students
+        db.session.rollback()
+        raise
+
+    return summary
@@ -0,0 +1,138 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, send_file
+
+from services.document_store import blob_path
+
+# Pillow renders image thumbnails and pdftoppm (poppler-utils) the first
+# page of PDFs; without them those documents simply have no preview
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Blobs queued or being rendered, and blobs that could not be rendered, by this process
+_pending = set()
+_failed = set()
+_state_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=current_app.config.get('THUMBNAIL_WORKERS', 2),
+                    thread_name_prefix='thumbnail'
+                )
+    return _executor
+
+
+def thumbnail_path(sha256):
+    """Thumbnail of a blob relative to UPLOAD_FOLDER, stored next to the blob"""
+    return blob_path(sha256) + '.thumb.jpg'
+
+
+def _render_image(source, target, size, timeout):
+    with Image.open(source) as image:
+        # Lets JPEG decode straight at a reduced scale instead of full size
+        image.draft('RGB', (size, size))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size))
+        image.convert('RGB').save(target, 'JPEG', quality=80, optimize=True)
+
+
+def _render_pdf(source, target, size, timeout):
+    # pdftoppm appends the extension itself when given -singlefile
+    subprocess.run(
+        [shutil.which('pdftoppm'), '-jpeg', '-f', '1', '-l', '1', '-singlefile',
+         '-scale-to', str(size), source, target[:-len('.jpg')]],
+        check=True, capture_output=True, timeout=timeout
+    )
+
+
+def _renderer(file_type):
+    if file_type == 'image' and Image is not None:
+        return _render_image
+    if file_type == 'pdf' and shutil.which('pdftoppm'):
+        return _render_pdf
+    return None
+
+
+def has_preview(document):
+    """Whether a thumbnail can be made for the document"""
+    return document.blob_sha256 is not None and _renderer(document.file_type) is not None
+
+
+def _generate(upload_folder, sha256, render, size, timeout, logger):
+    source = os.path.join(upload_folder, blob_path(sha256))
+    target = os.path.join(upload_folder, thumbnail_path(sha256))
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.jpg')
+    os.close(fd)
+    try:
+        render(source, tmp_path, size, timeout)
+        # Readers only ever see a complete thumbnail
+        os.replace(tmp_path, target)
+    except Exception:
+        logger.warning('Rendering the thumbnail of blob %s failed', sha256, exc_info=True)
+        with _state_lock:
+            _failed.add(sha256)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        with _state_lock:
+            _pending.discard(sha256)
+
+
+def schedule_thumbnail(document):
+    """
+    Queues the document's thumbnail on the bounded thumbnail pool unless it
+    exists, is already queued or failed before. Call after the document is
+    committed. Documents sharing a blob share one thumbnail.
+    """
+    render = _renderer(document.file_type)
+    sha256 = document.blob_sha256
+    if render is None or sha256 is None:
+        return
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    if os.path.exists(os.path.join(upload_folder, thumbnail_path(sha256))):
+        return
+    with _state_lock:
+        if sha256 in _pending or sha256 in _failed:
+            return
+        _pending.add(sha256)
+    get_executor().submit(
+        _generate, upload_folder, sha256, render,
+        current_app.config.get('THUMBNAIL_SIZE', 320),
+        current_app.config.get('THUMBNAIL_TIMEOUT', 30),
+        current_app.logger
+    )
+
+
+def send_thumbnail(document):
+    """
+    The document's thumbnail, cacheable for a year as a blob never changes.
+    None while it is still being made, or when the document has no preview.
+    """
+    if document.blob_sha256 is None:
+        return None
+    path = os.path.join(current_app.config['UPLOAD_FOLDER'], thumbnail_path(document.blob_sha256))
+    if not os.path.exists(path):
+        # Documents uploaded before thumbnails existed get theirs on first request
+        schedule_thumbnail(document)
+        return None
+    response = send_file(path, mimetype='image/jpeg', conditional=True,
+                         etag=f'{document.blob_sha256}-thumb', max_age=365 * 24 * 60 * 60)
+    response.cache_control.private = True
+    response.cache_control.public = False
+    response.cache_control.immutable = True
+    return response
@@ -0,0 +1,130 @@
+from collections import Counter
+
+from sqlalchemy import event, func, insert, inspect, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import db, Notification, NotificationCounter
+
+counters = NotificationCounter.__table__
+
+# Bulk statements that keep the counters up to date themselves
+SKIP_COUNTERS = 'skip_unread_counters'
+
+
+def get_unread_count(user_id):
+    """
+    Unread notifications for ``user_id``, read from the counter table.
+    A missing counter is built from the notifications table on first use.
+    """
+    count = db.session.execute(
+        select(counters.c.unread_count).where(counters.c.user_id == user_id)
+    ).scalar()
+    if count is None:
+        count = rebuild_unread_count(user_id)
+    return count
+
+
+def rebuild_unread_count(user_id):
+    """
+    Creates the counter row with a single INSERT ... SELECT on its own
+    transaction. On InnoDB the SELECT takes locking reads, so it waits for
+    writers that are adding notifications for the same user and counts them.
+    The count is read back on that connection: the session's snapshot may
+    predate the new row.
+    """
+    unread = select(
+        func.count(Notification.notification_id)
+    ).where(
+        Notification.user_id == user_id,
+        Notification.read_status.is_(False)
+    ).scalar_subquery()
+    count = select(counters.c.unread_count).where(counters.c.user_id == user_id)
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(insert(counters).from_select(
+                ['user_id', 'unread_count'], select(user_id, unread)
+            ))
+            return connection.execute(count).scalar()
+    except IntegrityError:
+        # Another request created it first, a new transaction sees its row
+        with db.engine.connect() as connection:
+            return connection.execute(count).scalar() or 0
+
+
+def mark_all_read(user_id):
+    """Marks every notification of ``user_id`` as read and zeroes the counter"""
+    db.session.query(Notification).filter_by(
+        user_id=user_id,
+        read_status=False
+    ).execution_options(**{SKIP_COUNTERS: True}).update({'read_status': True})
+    db.session.connection().execute(
+        update(counters).where(counters.c.user_id == user_id).values(unread_count=0)
+    )
+
+
+def _apply_deltas(connection, deltas):
+    # Counters that do not exist yet are left alone, they get built when read
+    for user_id, delta in deltas.items():
+        if delta:
+            connection.execute(
+                update(counters).where(counters.c.user_id == user_id)
+                .values(unread_count=counters.c.unread_count + delta)
+            )
+
+
+@event.listens_for(Session, 'after_flush')
+def _count_flushed_notifications(session, flush_context):
+    deltas = Counter()
+    for obj in session.new:
+        if isinstance(obj, Notification) and obj.user_id is not None and not obj.read_status:
+            deltas[obj.user_id] += 1
+    for obj in session.deleted:
+        if isinstance(obj, Notification) and obj.user_id is not None and not obj.read_status:
+            deltas[obj.user_id] -= 1
+    for obj in session.dirty:
+        if not isinstance(obj, Notification) or obj.user_id is None:
+            continue
+        history = inspect(obj).attrs.read_status.history
+        if history.has_changes():
+            was_read = bool(history.deleted and history.deleted[0])
+            if bool(obj.read_status) != was_read:
+                deltas[obj.user_id] += -1 if obj.read_status else 1
+    if deltas:
+        _apply_deltas(session.connection(), deltas)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _count_bulk_notifications(orm_execute_state):
+    state = orm_execute_state
+    mapper = state.bind_mapper
+    if mapper is None or mapper.class_ is not Notification:
+        return
+    if state.execution_options.get(SKIP_COUNTERS):
+        return
+
+    if state.is_insert:
+        params = state.parameters
+        if isinstance(params, dict):
+            params = [params]
+        deltas = Counter(
+            p['user_id'] for p in params or ()
+            if p.get('user_id') is not None and not p.get('read_status')
+        )
+        _apply_deltas(state.session.connection(), deltas)
+    elif state.is_update or state.is_delete:
+        criteria = state.statement.whereclause
+        if criteria is None:
+            raise ValueError(
+                'Bulk notification writes without a filter must pass the '
+                f'{SKIP_COUNTERS} execution option and fix the counters themselves'
+            )
+        # Drop only the counters of the users the statement touches, to be
+        # rebuilt lazily. The rows are locked first, so a rebuild waits for
+        # this transaction instead of counting the old values.
+        connection = state.session.connection()
+        user_ids = connection.execute(
+            select(Notification.user_id).distinct().where(criteria).with_for_update()
+        ).scalars().all()
+        if user_ids:
+            connection.execute(counters.delete().where(counters.c.user_id.in_(user_ids)))
@@ -5,32 +5,130 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 });
 
+// Chunks of a resumable upload sent at the same time, and attempts per chunk
+const UPLOAD_CONCURRENCY = 4;
+const CHUNK_ATTEMPTS = 5;
+
 async function handleDocumentUpload(event) {
     event.preventDefault();
-    const formData = new FormData(event.target);
+    const form = event.target;
+    const file = form.querySelector('input[type="file"]').files[0];
+    if (!file) {
+        showToast('Please choose a file', 'error');
+        return;
+    }
 
+    const submitButton = form.querySelector('[type="submit"]');
+    if (submitButton) submitButton.disabled = true;
     try {
-        const response = await fetch('/student/documents', {
-            method: 'POST',
-            body: formData
-        });
-
-        if (!response.ok) throw new Error('Failed to upload document');
-        
-        const result = await response.json();
+        await uploadInChunks(file, {
+            title: form.querySelector('[name="title"]').value,
+            document_type: form.querySelector('[name="document_type"]').value
+        }, progress => updateUploadProgress(form, progress));
         showToast('Document uploaded successfully', 'success');
         
         // Close modal and refresh document list
         const modal = bootstrap.Modal.getInstance(document.getElementById('documentModal'));
         modal.hide();
-        event.target.reset();
+        form.reset();
         loadDocuments();
     } catch (error) {
         console.error('Error:', error);
-        showToast('Failed to upload document', 'error');
+        showToast(error.message || 'Failed to upload document', 'error');
+    } finally {
+        if (submitButton) submitButton.disabled = false;
+        updateUploadProgress(form, null);
+    }
+}
+
+// Uploads a file in checksummed chunks, several at a time. The upload id is
+// kept per file, so choosing the same file again after a failure or a reload
+// only sends the chunks the server does not have yet.
+async function uploadInChunks(file, details, onProgress) {
+    const resumeKey = `document-upload:${file.name}:${file.size}:${file.lastModified}`;
+    let upload = await resumeUpload(localStorage.getItem(resumeKey));
+    if (!upload) {
+        upload = await uploadRequest('/student/documents/uploads', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({...details, file_name: file.name, size: file.size})
+        }).then(data => data.upload);
+        localStorage.setItem(resumeKey, upload.upload_id);
+    }
+
+    const received = new Set(upload.received);
+    const pending = [];
+    for (let index = 0; index < upload.total_chunks; index++) {
+        if (!received.has(index)) pending.push(index);
+    }
+    let done = received.size;
+    onProgress(done / upload.total_chunks);
+
+    const worker = async () => {
+        while (pending.length) {
+            const index = pending.shift();
+            const start = index * upload.chunk_size;
+            await putChunk(upload.upload_id, index, file.slice(start, start + upload.chunk_size));
+            onProgress(++done / upload.total_chunks);
+        }
+    };
+    await Promise.all(Array.from({length: Math.min(UPLOAD_CONCURRENCY, pending.length)}, worker));
+
+    const result = await uploadRequest(`/student/documents/uploads/${upload.upload_id}/complete`, {method: 'POST'});
+    localStorage.removeItem(resumeKey);
+    return result.document;
+}
+
+async function resumeUpload(uploadId) {
+    if (!uploadId) return null;
+    const response = await fetch(`/student/documents/uploads/${uploadId}`);
+    // Expired or already completed, start over
+    if (!response.ok) return null;
+    return (await response.json()).upload;
+}
+
+async function putChunk(uploadId, index, blob) {
+    const checksum = await sha256Hex(blob);
+    for (let attempt = 1; ; attempt++) {
+        try {
+            return await uploadRequest(`/student/documents/uploads/${uploadId}/chunks/${index}`, {
+                method: 'PUT',
+                headers: {'Content-Type': 'application/octet-stream', 'X-Chunk-SHA256': checksum},
+                body: blob
+            });
+        } catch (error) {
+            if (attempt >= CHUNK_ATTEMPTS || [401, 403, 404, 413].includes(error.status)) throw error;
+            // Back off before retrying a dropped connection, a corrupted chunk or a server error
+            await new Promise(resolve => setTimeout(resolve, 500 * 2 ** attempt));
+        }
     }
 }
 
+async function sha256Hex(blob) {
+    const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+    return Array.from(new Uint8Array(digest), byte => byte.toString(16).padStart(2, '0')).join('');
+}
+
+async function uploadRequest(url, options) {
+    const response = await fetch(url, options);
+    const data = await response.json().catch(() => ({}));
+    if (!response.ok) {
+        const error = new Error(data.message || 'Failed to upload document');
+        error.status = response.status;
+        throw error;
+    }
+    return data;
+}
+
+function updateUploadProgress(form, progress) {
+    const bar = form.querySelector('.upload-progress .progress-bar');
+    if (!bar) return;
+    bar.parentElement.hidden = progress === null;
+    const percent = Math.round((progress || 0) * 100);
+    bar.style.width = `${percent}%`;
+    bar.textContent = `${percent}%`;
+}
+
 async function loadDocuments() {
     try {
         const response = await fetch('/student/documents');
@@ -56,7 +154,10 @@ function updateDocumentList(documents) {
     documentList.innerHTML = documents.map(doc => `
         <div class="document-item">
             <div class="document-info">
-                <i class="fas fa-file"></i>
+                ${doc.thumbnail_url
+                    ? `<img src="${doc.thumbnail_url}" alt="" class="document-thumbnail" loading="lazy"
+                            onerror="this.replaceWith(Object.assign(document.createElement('i'), {className: 'fas fa-file'}))">`
+                    : '<i class="fas fa-file"></i>'}
                 <span>${doc.title}</span>
             </div>
             <div class="document-meta">
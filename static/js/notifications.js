@@ -1,110 +1,61 @@
-document.addEventListener('DOMContentLoaded', function() {
-    // Initialize notifications
-    loadNotifications();
-    initializeNotificationPolling();
-    initializeMarkAllRead();
-});
+// Keeps the notification badge and dropdown in sync through a Server-Sent Events
+// stream instead of polling. Pages provide renderNotification(notification),
+// which returns the markup for one dropdown item, and loadNotifications(),
+// which refetches the whole list.
+
+function connectNotificationStream(url) {
+    if (!window.EventSource) {
+        return null;
+    }
 
-function loadNotifications() {
-    fetch('/api/notifications')
-        .then(response => response.json())
-        .then(notifications => {
-            displayNotifications(notifications);
-            updateNotificationBadge(notifications.filter(n => !n.read).length);
-        })
-        .catch(error => console.error('Error loading notifications:', error));
-}
+    const source = new EventSource(url);
 
-function displayNotifications(notifications) {
-    const notificationList = document.getElementById('notificationList');
-    notificationList.innerHTML = notifications.length ? '' : '<div class="p-3 text-center text-muted">No notifications</div>';
+    source.addEventListener('notification', function(e) {
+        const data = JSON.parse(e.data);
+        prependNotification(data.notification);
+        adjustNotificationBadge({ delta: data.unread_delta });
+    });
 
-    notifications.forEach(notification => {
-        const notificationElement = createNotificationElement(notification);
-        notificationList.appendChild(notificationElement);
+    source.addEventListener('unread', function(e) {
+        const data = JSON.parse(e.data);
+        adjustNotificationBadge(data);
+        if ('count' in data && data.count === 0) {
+            document.querySelectorAll('#notificationList .notification-item.unread')
+                .forEach(item => item.classList.remove('unread'));
+        } else if (data.notification_id && data.delta < 0) {
+            const item = document.querySelector(`#notificationList [data-id="${data.notification_id}"]`);
+            if (item) {
+                item.classList.remove('unread');
+            }
+        }
     });
-}
 
-function createNotificationElement(notification) {
-    const div = document.createElement('div');
-    div.className = `notification-item ${notification.read ? '' : 'unread'}`;
-    div.setAttribute('data-id', notification.id);
-    div.innerHTML = `
-        <div class="notification-content">${notification.message}</div>
-        <div class="notification-meta">${formatNotificationDate(notification.created_at)}</div>
-    `;
-    
-    div.addEventListener('click', () => markNotificationAsRead(notification.id));
-    return div;
-}
+    source.addEventListener('resync', function() {
+        loadNotifications();
+    });
 
-function markNotificationAsRead(notificationId) {
-    fetch(`/api/notifications/${notificationId}/read`, {
-        method: 'PUT'
-    })
-    .then(response => response.json())
-    .then(result => {
-        if (result.success) {
-            loadNotifications();
-        }
-    })
-    .catch(error => console.error('Error marking notification as read:', error));
+    return source;
 }
 
-function markAllNotificationsAsRead() {
-    fetch('/api/notifications/mark-all-read', {
-        method: 'PUT'
-    })
-    .then(response => response.json())
-    .then(result => {
-        if (result.success) {
-            loadNotifications();
-        }
-    })
-    .catch(error => console.error('Error marking all notifications as read:', error));
+function prependNotification(notification) {
+    const notificationList = document.getElementById('notificationList');
+    if (!notificationList || notificationList.querySelector(`[data-id="${notification.id}"]`)) {
+        return;
+    }
+    if (!notificationList.querySelector('.notification-item')) {
+        notificationList.innerHTML = '';
+    }
+    notificationList.insertAdjacentHTML('afterbegin', renderNotification(notification));
 }
 
-function updateNotificationBadge(count) {
+// update is either { count: n } or { delta: +/-n }
+function adjustNotificationBadge(update) {
     const badge = document.getElementById('notificationBadge');
-    if (count > 0) {
-        badge.textContent = count;
-        badge.style.display = 'block';
-    } else {
-        badge.style.display = 'none';
+    if (!badge) {
+        return;
     }
+    const current = parseInt(badge.textContent, 10) || 0;
+    const count = 'count' in update ? update.count : Math.max(current + (update.delta || 0), 0);
+    badge.textContent = count;
+    badge.style.display = count > 0 ? 'block' : 'none';
 }
-
-function initializeNotificationPolling() {
-    // Poll for new notifications every minute
-    setInterval(loadNotifications, 60000);
-}
-
-function initializeMarkAllRead() {
-    document.getElementById('markAllReadBtn').addEventListener('click', function(e) {
-        e.preventDefault();
-        e.stopPropagation();
-        markAllNotificationsAsRead();
-    });
-}
-
-function formatNotificationDate(dateString) {
-    const date = new Date(dateString);
-    const now = new Date();
-    const diffTime = Math.abs(now - date);
-    const diffDays = Math.floor(diffTime / (1000 * 60 * 60 * 24));
-    
-    if (diffDays === 0) {
-        const hours = Math.floor(diffTime / (1000 * 60 * 60));
-        if (hours === 0) {
-            const minutes = Math.floor(diffTime / (1000 * 60));
-            return `${minutes} minute${minutes !== 1 ? 's' : ''} ago`;
-        }
-        return `${hours} hour${hours !== 1 ? 's' : ''} ago`;
-    } else if (diffDays === 1) {
-        return 'Yesterday';
-    } else if (diffDays < 7) {
-        return `${diffDays} days ago`;
-    } else {
-        return date.toLocaleDateString();
-    }
-} 
\ No newline at end of file